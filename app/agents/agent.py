@@ -1,63 +1,253 @@
+import asyncio
+import time
 from datetime import datetime, timezone
 from typing import Any
 from uuid import uuid4
 
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.config import config
+from app.database import core_data
 from app.database.db import Database
-from app.models.agent import ExpenseExtraction, ExpenseResponse, ExpenseValidation
+from app.models.agent import (
+    ExpenseExtraction,
+    ExpenseExtractionBatch,
+    ExpenseExtractionList,
+    ExpenseResponse,
+    ExpenseValidation,
+)
 from app.models.collections import Expenses
+from app.services.expense_validator import ExpenseValidator
+from app.services import analytics, budgets, currency, dedup, merchants, rollups
 from app.services.llm_services import LLMService
+from app.services.prompts import prompt_registry
+from app.services.user_cache import get_preferences
+from app.services.write_behind import WriteBehindBuffer
+from app.utils.enums import LLMProfile, ParseMode, RequestPriority
 from app.utils.log import logger
+from app.utils.metrics import AGENT_STAGE_SECONDS
+from app.utils.nlp_parser import count_amounts, extract_expense
 
 
 class Agent:
-    def __init__(self):
+    def __init__(self, write_buffer: WriteBehindBuffer | None = None):
         self.llm_service = LLMService()
+        self.validator = ExpenseValidator()
+        # When set, expenses are queued and acknowledged before Mongo stores them
+        self.write_buffer = write_buffer
 
-    async def parse_expense(self, user_prompt: str) -> dict[str, Any]:
-        #  Will later store it in prompt_registry within DB
-        system_prompt = self._parse_expense_prompt()
-        response = await self.llm_service.parse_structured(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            output_schema=ExpenseExtraction,
-        )
+    async def parse_expense(
+        self,
+        user_prompt: str,
+        mode: ParseMode | None = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+    ) -> ExpenseExtraction | dict[str, Any]:
+        mode = mode or ParseMode(config.EXPENSE_PARSE_MODE)
+        if mode is ParseMode.HYBRID:
+            extraction = self.parse_expense_locally(user_prompt)
+            if extraction is not None:
+                return extraction
+        system_prompt = prompt_registry.system_prompt("parse_expense")
+        with AGENT_STAGE_SECONDS.time(stage="parse_llm"):
+            response = await self.llm_service.parse_structured(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                output_schema=ExpenseExtraction,
+                priority=priority,
+                profile=LLMProfile.PARSE,
+            )
         return response
 
-    async def process_expense(self, parsed_data: ExpenseExtraction) -> ExpenseResponse:
-        system_prompt = self._validation_prompt()
-        user_prompt = parsed_data.model_dump_json()
-        result = await self.llm_service.parse_structured(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            output_schema=ExpenseValidation,
+    def parse_expense_locally(self, user_prompt: str) -> ExpenseExtraction | None:
+        """Local parse result, or None if it is not confident enough to skip the LLM."""
+        with AGENT_STAGE_SECONDS.time(stage="parse_local"):
+            extraction, confidence = extract_expense(
+                user_prompt, known_category=merchants.merchant_index.category
+            )
+        if (
+            extraction is not None
+            and confidence >= config.LOCAL_PARSE_CONFIDENCE_THRESHOLD
+        ):
+            logger.debug(f"Parsed expense locally (confidence {confidence})")
+            return extraction
+        return None
+
+    async def parse_expenses(
+        self,
+        user_prompt: str,
+        mode: ParseMode | None = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+    ) -> list[ExpenseExtraction]:
+        """Every expense in one message, with a single LLM call at most."""
+        mode = mode or ParseMode(config.EXPENSE_PARSE_MODE)
+        # The local parser reads one expense per message
+        if mode is ParseMode.HYBRID and count_amounts(user_prompt) <= 1:
+            extraction = self.parse_expense_locally(user_prompt)
+            if extraction is not None:
+                return [extraction]
+        with AGENT_STAGE_SECONDS.time(stage="parse_split"):
+            response = await self.llm_service.parse_structured(
+                system_prompt=prompt_registry.system_prompt(
+                    "parse_expense", "parse_expense_split"
+                ),
+                user_prompt=user_prompt,
+                output_schema=ExpenseExtractionList,
+                priority=priority,
+                profile=LLMProfile.PARSE,
+            )
+        return ExpenseExtractionList.model_validate(response).expenses
+
+    async def parse_expense_batch(
+        self,
+        user_prompts: list[str],
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+    ) -> list[ExpenseExtraction | None]:
+        """Parse several independent messages with a single LLM call.
+
+        Returns one result per message, in order; None where the model
+        returned nothing for that message.
+        """
+        numbered = "\n".join(
+            f"{index}. {' '.join(prompt.split())}"
+            for index, prompt in enumerate(user_prompts, start=1)
         )
+        with AGENT_STAGE_SECONDS.time(stage="parse_batch"):
+            response = await self.llm_service.parse_structured(
+                system_prompt=prompt_registry.system_prompt(
+                    "parse_expense", "parse_expense_batch"
+                ),
+                user_prompt=numbered,
+                output_schema=ExpenseExtractionBatch,
+                priority=priority,
+                profile=LLMProfile.PARSE_BATCH,
+            )
+        response = ExpenseExtractionBatch.model_validate(response)
+        results: list[ExpenseExtraction | None] = [None] * len(user_prompts)
+        for item in response.expenses:
+            position = item.index - 1
+            if 0 <= position < len(results) and results[position] is None:
+                results[position] = ExpenseExtraction.model_validate(
+                    item.model_dump(exclude={"index"})
+                )
+        return results
+
+    async def validate_expense(
+        self,
+        parsed_data: ExpenseExtraction,
+        llm_fallback: bool | None = None,
+        user_id: str | None = None,
+    ) -> ExpenseValidation:
+        if user_id is not None and Database.get_database() is not None:
+            preferences = await get_preferences(user_id)
+            # Custom categories may have changed since the index last saw them
+            merchants.merchant_index.set_user_categories(
+                user_id, preferences.get("categories_list") or []
+            )
+        with AGENT_STAGE_SECONDS.time(stage="validate_rules"):
+            result = self.validator.validate(parsed_data, user_id=user_id)
+        if llm_fallback is None:
+            llm_fallback = config.VALIDATION_LLM_FALLBACK
+        # Only the merchant/category fit is fuzzy; everything else is rule based
+        if (
+            result.is_valid
+            and llm_fallback
+            and self.validator.needs_category_review(parsed_data, user_id)
+        ):
+            with AGENT_STAGE_SECONDS.time(stage="validate_llm"):
+                review = await self.llm_service.parse_structured(
+                    system_prompt=prompt_registry.system_prompt("process_expense"),
+                    user_prompt=parsed_data.model_dump_json(),
+                    output_schema=ExpenseValidation,
+                    profile=LLMProfile.VALIDATE,
+                )
+            review = ExpenseValidation.model_validate(review)
+            result.warnings.extend(
+                warning
+                for warning in review.warnings or []
+                if warning.startswith("Category") and warning not in result.warnings
+            )
+        return result
+
+    def build_expense(
+        self, parsed_data: ExpenseExtraction, user_id: str | None = None
+    ) -> Expenses:
+        # Random user_id for now : Will be integrated in workflow laater on
+        # user_id, amount, currency, merchant, category, date, description, notes, tags
+        return Expenses(
+            user_id=user_id or str(uuid4()),
+            amount=parsed_data.amount,
+            currency=parsed_data.currency,
+            merchant=parsed_data.merchant,
+            merchant_key=merchants.normalize_merchant(parsed_data.merchant),
+            category=parsed_data.category,
+            date=_as_datetime(parsed_data.date),
+            description=parsed_data.description or None,
+            notes=parsed_data.note or None,
+        )
+
+    async def process_expense(
+        self,
+        parsed_data: ExpenseExtraction,
+        llm_fallback: bool | None = None,
+        user_id: str | None = None,
+    ) -> ExpenseResponse:
+        started = time.perf_counter()
         try:
-            result = ExpenseValidation.model_validate(result)
+            result = await self.validate_expense(parsed_data, llm_fallback, user_id)
             if result.is_valid:
-                db = Database.get_database()
-                if db is None:
+                if Database.get_database() is None:
                     return ExpenseResponse(
                         success=False,
                         message="Expense Insertion Failed due to Lack of DB Connection",
                         expense_id=None,
                     )
-                # Random user_id for now : Will be integrated in workflow laater on
-                # user_id, amount, currency, merchant, category, date, description, notes, tags
-                expense = Expenses(
-                    user_id=str(uuid4()),
-                    amount=parsed_data.amount,
-                    currency=parsed_data.currency,
-                    merchant=parsed_data.merchant,
-                    category=parsed_data.category,
-                    date=datetime.now(timezone.utc),
-                )
-                res = await db["expenses"].insert_one(expense.model_dump())
+                with AGENT_STAGE_SECONDS.time(stage="build"):
+                    expense = self.build_expense(parsed_data, user_id)
+                    document = expense.model_dump()
+                    document["_id"] = ObjectId()
+                # Without a user_id the expense gets a random one: nothing to match
+                if user_id is not None:
+                    with AGENT_STAGE_SECONDS.time(stage="dedup"):
+                        (duplicate_id,) = await dedup.deduplicator.claim([document])
+                    if duplicate_id is not None:
+                        return self._duplicate_response(duplicate_id, result)
+                else:
+                    dedup.apply_fingerprints([document])
+                with AGENT_STAGE_SECONDS.time(stage="convert"):
+                    currency.apply_usd_conversion([document])
+                if self.write_buffer is not None:
+                    expense_id = self.write_buffer.submit(document)
+                    return ExpenseResponse(
+                        success=True,
+                        message="Insertion queued",
+                        errors=result.errors,
+                        warnings=result.warnings,
+                        expense_id=str(expense_id),
+                    )
+                while True:
+                    try:
+                        with AGENT_STAGE_SECONDS.time(stage="insert"):
+                            await core_data.insert_one(document, "expenses")
+                        break
+                    except DuplicateKeyError as e:
+                        if not dedup.is_fingerprint_conflict(e.details or {}):
+                            dedup.deduplicator.release([document])
+                            raise
+                        # Another process stored an identical expense first
+                        duplicate_id = await dedup.deduplicator.reclaim(document)
+                        if duplicate_id is not None:
+                            return self._duplicate_response(duplicate_id, result)
+                    except Exception:
+                        dedup.deduplicator.release([document])
+                        raise
+                await self.after_insert([document])
                 return ExpenseResponse(
                     success=True,
                     message="Insertion successful",
                     errors=result.errors,
                     warnings=result.warnings,
-                    expense_id=res.inserted_id,
+                    expense_id=str(document["_id"]),
                 )
             else:
                 logger.warning(
@@ -77,144 +267,219 @@ class Agent:
                 message=f"Expense Insertion Failed with error : {e}",
                 expense_id=None,
             )
+        finally:
+            AGENT_STAGE_SECONDS.observe(time.perf_counter() - started, stage="process")
         # Secondary retyr logic maybe?
 
-    def _validation_prompt(self) -> str:
-        return """
-                    You are a data sanity checker for expense entries.
-                    The assistant will receive a JSON object that follows the **ExpenseExtraction** schema:
-                        {
-                        "amount": <number>,
-                        "currency": "<ISO 4217 code>",
-                        "merchant": "<string>",
-                        "category": "<string>",
-                        "date": "<YYYY‑MM‑DD or ISO string>"
-                        }
-
-            The assistant must evaluate the data against the following rules:
-
-            1. **Amount**
-            - Alert if the amount is suspiciously high (e.g., > $10 000).
-            - A warning should be added to the `warnings` array if the amount exceeds $10 000.
-
-            2. **Currency**
-            - Must be a valid ISO 4217 code.
-            - If the currency is missing or not recognized, report an error in the `errors` array.
-
-            3. **Category & Merchant**
-            - The category should logically match the merchant.
-            - If there is a mismatch or the category seems unrelated to the merchant, add a warning stating:
-                `"Category '{category}' does not fit typical merchants like '{merchant}'."`
-
-            4. **Date**
-            - Must be a valid date string in YYYY‑MM‑DD format.
-            - The date cannot be in the future relative to the current date.
-            - If the date is missing, malformed, or in the future, add an error to `errors`.
-
-            **Response Format**
-            Return a JSON object that satisfies our internal **ExpenseValidation** schema as following:
-
-            ```json
-            {
-            "is_valid": true|false,
-            "errors": [ ... ], // array of error messages
-            "warnings": [ ... ], // array of warning messages
-            "data": { ... }// the original parsed data
-            }
-            The assistant must output **only** this JSON object—no additional text, comments, or formatting.
-            """
-
-    def _parse_expense_prompt(self) -> str:
-        return """
-        ## System Prompt for Expense Data Extraction
-
-        You are a powerful language model tasked with extracting structured expense data from informal text.
-        Provide a **JSON object** that follows the schema below.  If a field is not present in the input, use the default values specified.
-
-        ### Extraction Schema
-
-        | Field    | Description                                                        | Default                |
-        |----------|--------------------------------------------------------------------|------------------------|
-        | `amount` | Numeric amount spent (float).                                      | —                      |
-        | `currency` | Currency code (ISO 4217). Example: `USD`, `EUR`, `GBP`.         | `USD` if omitted.      |
-        | `merchant` | Business or store name.                                           | —                      |
-        | `category` | High‑level category of the expense. Use the mappings provided.  | `Uncategorized` if no match. |
-        | `date`   | Date of purchase in ISO 8601 format (`YYYY-MM-DD`). If the text contains relative dates such as `yesterday`, `today`, or days of the week, convert them to the correct ISO date.  | Date of extraction (`YYYY-MM-DD`). |
-
-        ### Category Mappings
-
-        | Category          | Keywords (case‑insensitive)                                  |
-        |-------------------|--------------------------------------------------------------|
-        | `Food & Dining`   | restaurant, cafe, coffee, snack, lunch, dinner              |
-        | `Transportation` | taxi, uber, bus, train, flight, parking, toll               |
-        | `Shopping`        | mall, supermarket, clothing, electronics, online shop      |
-        | `Entertainment`  | movie, concert, theater, streaming, tickets                 |
-        | `Utilities`       | electricity, water, internet, cable                        |
-        | `Health & Wellness` | pharmacy, medicine, gym, doctor, dental                 |
-        | `Professional Services` | lawyer, accountant, consultant, freelancer      |
-        | `Travel`          | hotel, flight, accommodation, itinerary                    |
-        | `Other`           | Miscellaneous items not fitting above categories             |
-
-        ### Handling Dates
-
-        - Recognize relative expressions:
-          - `yesterday` → previous calendar day
-          - `today` → current day
-          - `last <weekday>` (e.g., `last Thursday`) → most recent occurrence before today
-          - `<ordinal> <weekday>` (e.g., `on the 5th Monday`) → the date corresponding to that week in the current month (use current month unless the date is already past, then assume next month)
-        - Convert all dates to `YYYY-MM-DD`.
-        - If no date can be determined, use the extraction date as the default.
-
-        ### Example Prompt
-
-         **Input**
-         `"I paid $12.50 at Starbucks for a latte yesterday."`
-         **Output**
-         ```json
-         {
-           "amount": 12.5,
-           "currency": "USD",
-           "merchant": "Starbucks",
-           "category": "Food & Dining",
-           "date": "2024-03-13"
-         }
-         ```
-
-         **Input**
-         `"Booked a flight on March 15th for €350."`
-         **Output**
-         ```json
-         {
-           "amount": 350,
-           "currency": "EUR",
-           "merchant": "Airline",
-           "category": "Travel",
-           "date": "2024-03-15"
-         }
-         ```
-
-         **Input**
-         `"Paid the electric bill of $200 last Thursday."`
-         **Output**
-         ```json
-         {
-           "amount": 200,
-           "currency": "USD",
-           "merchant": "Electric Company",
-           "category": "Utilities",
-           "date": "2024-03-14"
-         }
-         ```
-
-        ### Instructions for the Language Model
-
-        1. **Identify and extract** each field listed in the schema; cast numeric values to float.
-        2. **Normalize currency**: if the currency symbol ($, €, £) is present, map to `USD`, `EUR`, `GBP` respectively; otherwise, use the default `USD`.
-        3. **Map merchant to category** using the keyword table; if no match, set `category` to `Other`.
-        4. **Parse dates** with the rules above. If relative, compute the ISO date; if absolute (e.g., `March 15th`), parse to `YYYY-MM-DD`. If parsing fails, use the extraction date.
-        5. **Return a single JSON object** exactly as specified. If multiple expenses are detected in a single input, return a JSON array of objects.
-        6. **Do not add any extraneous text**—only output the JSON.
+    async def process_expenses(
+        self,
+        parsed_items: list[ExpenseExtraction],
+        llm_fallback: bool | None = None,
+        user_id: str | None = None,
+    ) -> list[ExpenseResponse]:
+        """Validate expenses concurrently and store the valid ones together.
+
+        Returns one response per item, in order.
         """
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(config.VALIDATION_CONCURRENCY)
+
+        async def validate(parsed: ExpenseExtraction) -> ExpenseValidation:
+            async with semaphore:
+                return await self.validate_expense(parsed, llm_fallback, user_id)
+
+        responses: list[ExpenseResponse | None] = [None] * len(parsed_items)
+        try:
+            results = await asyncio.gather(*(validate(p) for p in parsed_items))
+            pending: dict[int, dict[str, Any]] = {}
+            for index, (parsed, result) in enumerate(zip(parsed_items, results)):
+                if not result.is_valid:
+                    responses[index] = ExpenseResponse(
+                        success=False,
+                        message="Expense Insertion Failed",
+                        errors=result.errors,
+                        warnings=result.warnings,
+                        expense_id=None,
+                    )
+                elif Database.get_database() is None:
+                    responses[index] = ExpenseResponse(
+                        success=False,
+                        message="Expense Insertion Failed due to Lack of DB Connection",
+                        expense_id=None,
+                    )
+                else:
+                    document = self.build_expense(parsed, user_id).model_dump()
+                    document["_id"] = ObjectId()
+                    pending[index] = document
+            if pending:
+                await self._store_expenses(pending, results, responses, user_id)
+        except Exception as e:
+            for index, response in enumerate(responses):
+                if response is None:
+                    responses[index] = ExpenseResponse(
+                        success=False,
+                        message=f"Expense Insertion Failed with error : {e}",
+                        expense_id=None,
+                    )
+        finally:
+            AGENT_STAGE_SECONDS.observe(time.perf_counter() - started, stage="process")
+        return responses
+
+    async def _store_expenses(
+        self,
+        pending: dict[int, dict[str, Any]],
+        results: list[ExpenseValidation],
+        responses: list[ExpenseResponse | None],
+        user_id: str | None,
+    ) -> None:
+        """Insert the pending documents by item index, filling in their responses.
+
+        Items of one message are distinct expenses, even identical ones
+        ("coffee $4 and coffee $4"): each claims its own ordinal.
+        """
+        if user_id is not None:
+            with AGENT_STAGE_SECONDS.time(stage="dedup"):
+                duplicates = await dedup.deduplicator.claim(list(pending.values()))
+            for index, duplicate_id in zip(list(pending), duplicates):
+                if duplicate_id is not None:
+                    responses[index] = self._duplicate_response(
+                        duplicate_id, results[index]
+                    )
+                    del pending[index]
+        else:
+            dedup.apply_fingerprints(pending.values())
+        if not pending:
+            return
+        documents = list(pending.values())
+        currency.apply_usd_conversion(documents)
+
+        failed: dict[int, str] = {}
+        if self.write_buffer is not None:
+            for document in documents:
+                self.write_buffer.submit(document)
+            message = "Insertion queued"
+        else:
+            message = "Insertion successful"
+            try:
+                failed, duplicates = await self._insert_expenses(documents)
+            except Exception:
+                dedup.deduplicator.release(documents)
+                raise
+            dedup.deduplicator.release(
+                documents[position] for position in [*failed, *duplicates]
+            )
+            for position, duplicate_id in duplicates.items():
+                index = list(pending)[position]
+                responses[index] = self._duplicate_response(
+                    duplicate_id, results[index]
+                )
+        inserted = []
+        for position, (index, document) in enumerate(pending.items()):
+            if responses[index] is not None:
+                continue
+            result = results[index]
+            if position in failed:
+                responses[index] = ExpenseResponse(
+                    success=False,
+                    message=f"Expense Insertion Failed with error : {failed[position]}",
+                    errors=result.errors,
+                    warnings=result.warnings,
+                    expense_id=None,
+                )
+                continue
+            inserted.append(document)
+            responses[index] = ExpenseResponse(
+                success=True,
+                message=message,
+                errors=result.errors,
+                warnings=result.warnings,
+                expense_id=str(document["_id"]),
+            )
+        if inserted and self.write_buffer is None:
+            await self.after_insert(inserted)
+
+    @staticmethod
+    async def _insert_expenses(
+        documents: list[dict[str, Any]],
+    ) -> tuple[dict[int, str], dict[int, str]]:
+        """Insert documents, renumbering those whose fingerprint was taken.
+
+        Returns:
+            The error of each document that failed, and the _id each
+            duplicate of a stored source transaction duplicates, by position
+        """
+        failed: dict[int, str] = {}
+        duplicates: dict[int, str] = {}
+        positions = list(range(len(documents)))
+        while positions:
+            try:
+                with AGENT_STAGE_SECONDS.time(stage="insert"):
+                    await core_data.insert_many(
+                        [documents[position] for position in positions],
+                        "expenses",
+                        ordered=False,
+                    )
+                break
+            except BulkWriteError as e:
+                retry = []
+                for error in e.details.get("writeErrors", []):
+                    position = positions[error["index"]]
+                    if not dedup.is_fingerprint_conflict(error):
+                        failed[position] = error["errmsg"]
+                        continue
+                    # Another process stored an identical expense first
+                    duplicate_id = await dedup.deduplicator.reclaim(documents[position])
+                    if duplicate_id is None:
+                        retry.append(position)
+                    else:
+                        duplicates[position] = duplicate_id
+                positions = retry
+        return failed, duplicates
+
+    @staticmethod
+    def _duplicate_response(
+        expense_id: str | None, result: ExpenseValidation
+    ) -> ExpenseResponse:
+        """Resubmissions succeed with the original expense, which is not inserted again."""
+        return ExpenseResponse(
+            success=True,
+            message="Duplicate of an existing expense",
+            errors=result.errors,
+            warnings=result.warnings,
+            expense_id=expense_id,
+            duplicate=True,
+        )
+
+    async def after_insert(self, documents: list[dict[str, Any]]) -> None:
+        """Keep derived data in step with newly inserted expenses.
+
+        Failures are logged rather than raised: the expenses are already
+        stored and derived data can be rebuilt.
+        """
+        for name, record in (
+            ("rollups", rollups.record_expenses),
+            ("budgets", budgets.record_expenses),
+            ("analytics", analytics.record_expenses),
+            ("merchants", merchants.record_expenses),
+            ("dedup", dedup.record_expenses),
+        ):
+            try:
+                with AGENT_STAGE_SECONDS.time(stage=f"after_insert.{name}"):
+                    await record(documents)
+            except Exception as e:
+                logger.error(f"Updating {name} failed: {e}")
+
+
+def _as_datetime(value: datetime | str) -> datetime:
+    """Expense dates are stored as UTC datetimes so range queries work."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip())
+        except ValueError:
+            return datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
 
 
 #   User Input (raw text)
@@ -0,0 +1,224 @@
+"""Answer natural-language spending questions with one LLM call at most.
+
+The model turns a question into a SpendingQuery, which is compiled into an
+indexed pipeline (app/services/query_compiler.py). Questions are also
+reduced to a shape: literals the parser vocabulary recognizes (numbers,
+categories and their keywords, known merchants, currency words) become
+slots, e.g. "spent over 50 on coffee last month" → "spent over <number>
+on <category> last month". When the model's query uses every slot, it is
+kept as a template for that shape, and later questions of the same shape
+are filled in without calling the model. Relative periods stay symbolic
+in the template, so it remains valid from one day to the next.
+"""
+
+import re
+from collections import OrderedDict
+from typing import Any
+
+from app.config import config
+from app.database import core_data
+from app.models.query import QueryAnswer, SpendingQuery
+from app.services.llm_services import LLMService
+from app.services.prompts import prompt_registry
+from app.services.query_compiler import compile_query
+from app.utils.enums import LLMProfile, RequestPriority
+from app.utils.log import logger
+from app.utils.metrics import AGENT_STAGE_SECONDS, Counter
+from app.utils.nlp_parser import (
+    CATEGORY_KEYWORDS,
+    CURRENCY_WORDS,
+    KNOWN_MERCHANTS,
+)
+
+Slot = tuple[str, Any]
+
+# Vocabulary word (lowercase) → (slot kind, canonical value). Merchants win
+# over category keywords ("uber"), as a named merchant is the narrower filter.
+_VOCABULARY: dict[str, Slot] = {
+    **{currency: ("currency", code) for currency, code in CURRENCY_WORDS.items()},
+    **{
+        keyword: ("category", category)
+        for category, keywords in CATEGORY_KEYWORDS.items()
+        for keyword in keywords
+    },
+    **{category.lower(): ("category", category) for category in CATEGORY_KEYWORDS},
+    **{merchant: ("merchant", merchant) for merchant in KNOWN_MERCHANTS},
+}
+_SLOT_RE = re.compile(
+    r"(?<![\w.])(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)(?![\w.])"
+    r"|\b(?P<word>"
+    + "|".join(re.escape(word) for word in sorted(_VOCABULARY, key=len, reverse=True))
+    + r")s?\b"
+)
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+# Fields of a SpendingQuery that can hold a slot value, by slot kind
+_SLOT_FIELDS = {
+    "min_amount": "number",
+    "max_amount": "number",
+    "limit": "number",
+    "currency": "currency",
+    "categories": "category",
+    "merchants": "merchant",
+}
+
+
+def question_shape(question: str) -> tuple[str, list[Slot]]:
+    """Normalized question with recognized literals replaced by typed slots."""
+    text = _TRAILING_PUNCTUATION.sub("", " ".join(question.lower().split()))
+    slots: list[Slot] = []
+
+    def replace(match: re.Match) -> str:
+        if match.group("number"):
+            slots.append(("number", float(match.group("number").replace(",", ""))))
+            return "<number>"
+        kind, value = _VOCABULARY[match.group("word")]
+        slots.append((kind, value))
+        return f"<{kind}>"
+
+    return _SLOT_RE.sub(replace, text), slots
+
+
+def _same(kind: str, slot_value: Any, value: Any) -> bool:
+    if kind == "number":
+        return float(slot_value) == float(value)
+    return str(slot_value).casefold() == str(value).casefold()
+
+
+def make_template(query: SpendingQuery, slots: list[Slot]) -> dict[str, Any] | None:
+    """The query with slot values replaced by slot references.
+
+    None when the query cannot be reused for other questions of the same
+    shape: it has absolute dates, leaves a slot unused, or a value matches
+    more than one slot.
+    """
+    if query.start_date is not None or query.end_date is not None:
+        return None
+    template = query.model_dump(mode="json")
+    used: set[int] = set()
+
+    def bind(kind: str, value: Any) -> Any:
+        matches = [
+            index
+            for index, (slot_kind, slot_value) in enumerate(slots)
+            if slot_kind == kind and _same(kind, slot_value, value)
+        ]
+        if len(matches) > 1:
+            raise ValueError("ambiguous slot")
+        if not matches:
+            return value
+        used.add(matches[0])
+        return {"slot": matches[0]}
+
+    try:
+        for field, kind in _SLOT_FIELDS.items():
+            value = template[field]
+            if isinstance(value, list):
+                template[field] = [bind(kind, item) for item in value]
+            elif value is not None:
+                template[field] = bind(kind, value)
+    except ValueError:
+        return None
+    return template if len(used) == len(slots) else None
+
+
+def fill_template(template: dict[str, Any], slots: list[Slot]) -> SpendingQuery:
+    def fill(value: Any) -> Any:
+        if isinstance(value, dict) and "slot" in value:
+            return slots[value["slot"]][1]
+        return value
+
+    return SpendingQuery.model_validate(
+        {
+            field: (
+                [fill(item) for item in value]
+                if isinstance(value, list)
+                else fill(value)
+            )
+            for field, value in template.items()
+        }
+    )
+
+
+class PlanCache:
+    """LRU of query templates keyed by question shape."""
+
+    def __init__(self, max_shapes: int = config.QUERY_PLAN_CACHE_SIZE):
+        self.max_shapes = max_shapes
+        self._templates: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, shape: str, slots: list[Slot]) -> SpendingQuery | None:
+        template = self._templates.get(shape)
+        if template is not None:
+            try:
+                query = fill_template(template, slots)
+            except ValueError as e:
+                # e.g. "top 500": valid shape, out-of-range value
+                logger.debug(f"Cached plan for '{shape}' does not fit: {e}")
+            else:
+                self.hits += 1
+                self._templates.move_to_end(shape)
+                return query
+        self.misses += 1
+        return None
+
+    def put(self, shape: str, slots: list[Slot], query: SpendingQuery) -> None:
+        template = make_template(query, slots)
+        if template is None:
+            return
+        self._templates[shape] = template
+        self._templates.move_to_end(shape)
+        while len(self._templates) > self.max_shapes:
+            self._templates.popitem(last=False)
+
+
+plan_cache = PlanCache()
+
+Counter(
+    "query_plan_cache_lookups_total",
+    "Spending question plan lookups by result",
+    ("result",),
+    function=lambda: {("hit",): plan_cache.hits, ("miss",): plan_cache.misses},
+)
+
+
+class QueryAgent:
+    def __init__(self, llm_service: LLMService | None = None):
+        self.llm_service = llm_service or LLMService()
+        self.plan_cache = plan_cache
+
+    async def to_query(self, question: str) -> tuple[SpendingQuery, bool]:
+        """The question as a SpendingQuery, and whether it came from the plan cache."""
+        shape, slots = question_shape(question)
+        query = self.plan_cache.get(shape, slots)
+        if query is not None:
+            return query, True
+        with AGENT_STAGE_SECONDS.time(stage="query_llm"):
+            response = await self.llm_service.parse_structured(
+                system_prompt=prompt_registry.system_prompt("spending_query"),
+                user_prompt=question,
+                output_schema=SpendingQuery,
+                priority=RequestPriority.INTERACTIVE,
+                profile=LLMProfile.QUERY,
+            )
+        query = SpendingQuery.model_validate(response)
+        self.plan_cache.put(shape, slots, query)
+        return query, False
+
+    async def answer(self, question: str, user_id: str) -> QueryAnswer:
+        query, plan_cached = await self.to_query(question)
+        plan = compile_query(query, user_id)
+        with AGENT_STAGE_SECONDS.time(stage="query_execute"):
+            rows = await core_data.query_read(plan.collection, plan.pipeline, plan.hint)
+        for row in rows:
+            if "_id" in row:
+                row["_id"] = str(row["_id"])
+        return QueryAnswer(
+            question=question,
+            query=query,
+            source=plan.collection,
+            plan_cached=plan_cached,
+            rows=rows,
+        )
@@ -0,0 +1,232 @@
+import asyncio
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator
+
+from bson import ObjectId, json_util
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from app.agents.agent import Agent
+from app.agents.query_agent import QueryAgent
+from app.config import config
+from app.database import core_data
+from app.database.db import Database
+from app.models.agent import ExpenseExtraction, ExpenseResponse
+from app.models.api import (
+    ExpenseBatchRequest,
+    ExpensePage,
+    ExpenseRequest,
+    SpendingQuestion,
+)
+from app.models.query import QueryAnswer
+from app.services.batcher import ExpenseParseBatcher
+from app.utils.enums import RequestPriority
+from app.utils.log import logger
+
+router = APIRouter(prefix="/expenses", tags=["expenses"])
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Newest first; matches the (user_id, date, _id) index on expenses
+LIST_SORT = [("date", Database.DESCENDING), ("_id", Database.DESCENDING)]
+
+
+def get_agent(request: Request) -> Agent:
+    return request.app.state.agent
+
+
+def get_batcher(request: Request) -> ExpenseParseBatcher:
+    return request.app.state.batcher
+
+
+def get_query_agent(request: Request) -> QueryAgent:
+    return request.app.state.query_agent
+
+
+def _ndjson(payload: dict[str, Any]) -> str:
+    return json.dumps(payload, default=str) + "\n"
+
+
+def _encode_cursor(after: dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(after).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> dict[str, Any]:
+    try:
+        after = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Spliced into the keyset filter: only the exact shape _encode_cursor makes
+    if (
+        not isinstance(after, dict)
+        or after.keys() != {"date", "_id"}
+        or not isinstance(after["date"], datetime)
+        or not isinstance(after["_id"], ObjectId)
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
+
+
+async def _parse(
+    batcher: ExpenseParseBatcher,
+    text: str,
+    priority: RequestPriority = RequestPriority.INTERACTIVE,
+) -> ExpenseExtraction:
+    return ExpenseExtraction.model_validate(
+        await batcher.parse(text, priority=priority)
+    )
+
+
+async def _submit(
+    agent: Agent,
+    batcher: ExpenseParseBatcher,
+    text: str,
+    user_id: str | None,
+    priority: RequestPriority = RequestPriority.INTERACTIVE,
+) -> ExpenseResponse:
+    try:
+        parsed = await _parse(batcher, text, priority)
+    except Exception as e:
+        logger.warning(f"Expense parsing failed: {e}")
+        return ExpenseResponse(
+            success=False,
+            message=f"Expense Parsing Failed with error : {e}",
+            expense_id=None,
+        )
+    return await agent.process_expense(parsed, user_id=user_id)
+
+
+@router.get("", response_model=ExpensePage)
+async def list_expenses(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=config.API_MAX_PAGE_SIZE),
+    cursor: str | None = None,
+):
+    """A user's expenses, newest first, paginated with an opaque cursor."""
+    try:
+        documents, after = await core_data.read_page(
+            "expenses",
+            {"user_id": user_id},
+            LIST_SORT,
+            limit,
+            after=_decode_cursor(cursor) if cursor else None,
+        )
+    except RuntimeError as e:
+        # core_data without a configured MongoDB
+        raise HTTPException(status_code=503, detail=str(e))
+    return ExpensePage(
+        items=[{**document, "_id": str(document["_id"])} for document in documents],
+        next_cursor=_encode_cursor(after) if after else None,
+    )
+
+
+@router.post("/query", response_model=QueryAnswer)
+async def query_expenses(
+    body: SpendingQuestion, query_agent: QueryAgent = Depends(get_query_agent)
+):
+    """Answer a natural-language question about a user's spending."""
+    try:
+        return await query_agent.answer(body.question, body.user_id)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Question not understood: {e}")
+    except RuntimeError as e:
+        # core_data without a configured MongoDB
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.post("/parse", response_model=ExpenseExtraction)
+async def parse_expense(
+    body: ExpenseRequest, batcher: ExpenseParseBatcher = Depends(get_batcher)
+):
+    return await _parse(batcher, body.text)
+
+
+@router.post("", response_model=ExpenseResponse)
+async def submit_expense(
+    body: ExpenseRequest,
+    agent: Agent = Depends(get_agent),
+    batcher: ExpenseParseBatcher = Depends(get_batcher),
+):
+    return await _submit(agent, batcher, body.text, body.user_id)
+
+
+@router.post("/split", response_model=list[ExpenseResponse])
+async def submit_expenses(body: ExpenseRequest, agent: Agent = Depends(get_agent)):
+    """Submit a message mentioning several expenses, parsed with one LLM call.
+
+    Returns one response per expense found, in the order they were mentioned.
+    """
+    try:
+        parsed = await agent.parse_expenses(body.text)
+    except Exception as e:
+        logger.warning(f"Expense parsing failed: {e}")
+        return [
+            ExpenseResponse(
+                success=False,
+                message=f"Expense Parsing Failed with error : {e}",
+                expense_id=None,
+            )
+        ]
+    return await agent.process_expenses(parsed, user_id=body.user_id)
+
+
+@router.post("/stream")
+async def submit_expense_stream(
+    body: ExpenseRequest,
+    agent: Agent = Depends(get_agent),
+    batcher: ExpenseParseBatcher = Depends(get_batcher),
+):
+    """Submit one expense, streaming an NDJSON event as each stage completes."""
+
+    async def events() -> AsyncIterator[str]:
+        yield _ndjson({"stage": "received"})
+        try:
+            parsed = await _parse(batcher, body.text)
+        except Exception as e:
+            yield _ndjson({"stage": "failed", "error": str(e)})
+            return
+        yield _ndjson({"stage": "parsed", "data": parsed.model_dump(mode="json")})
+        response = await agent.process_expense(parsed, user_id=body.user_id)
+        yield _ndjson(
+            {"stage": "processed", "result": response.model_dump(mode="json")}
+        )
+
+    return StreamingResponse(events(), media_type=NDJSON_MEDIA_TYPE)
+
+
+@router.post("/batch")
+async def submit_expense_batch(
+    body: ExpenseBatchRequest,
+    agent: Agent = Depends(get_agent),
+    batcher: ExpenseParseBatcher = Depends(get_batcher),
+):
+    """Submit many expenses, streaming one NDJSON line per expense as it finishes.
+
+    Lines arrive in completion order and carry the `index` of their input.
+    """
+    semaphore = asyncio.Semaphore(config.API_BATCH_CONCURRENCY)
+
+    async def run(index: int, text: str) -> tuple[int, ExpenseResponse]:
+        async with semaphore:
+            return index, await _submit(
+                agent, batcher, text, body.user_id, RequestPriority.BULK
+            )
+
+    async def results() -> AsyncIterator[str]:
+        tasks = [
+            asyncio.create_task(run(index, text))
+            for index, text in enumerate(body.texts)
+        ]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                index, response = await completed
+                yield _ndjson({"index": index, **response.model_dump(mode="json")})
+        finally:
+            # Client went away: stop the work it no longer waits for
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type=NDJSON_MEDIA_TYPE)
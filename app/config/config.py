@@ -19,6 +19,14 @@ def get_secret(secret_name, default_value: str = ""):
 # MongoDB Configuration
 MONGO_URI = get_secret("MONGO_URI", "")
 DATABASE_NAME = get_secret("DATABASE_NAME", "copilot")
+CURSOR_BATCH_SIZE = int(get_secret("CURSOR_BATCH_SIZE", "1000"))
+MONGO_MAX_POOL_SIZE = int(get_secret("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(get_secret("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(get_secret("MONGO_MAX_IDLE_TIME_MS", "300000"))
+# Comma-separated, in preference order; zstd/snappy need their extra packages
+MONGO_COMPRESSORS = get_secret("MONGO_COMPRESSORS", "zlib")
+MONGO_WRITE_CONCERN = get_secret("MONGO_WRITE_CONCERN", "majority")
+MONGO_WRITE_TIMEOUT_MS = int(get_secret("MONGO_WRITE_TIMEOUT_MS", "0"))
 
 # Azure OpenAI Configuration
 AZURE_OPENAI_CHAT_DEPLOYMENT_NAME = get_secret("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME")
@@ -26,8 +34,143 @@ AZURE_OPENAI_API_KEY = get_secret("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = get_secret("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_VERSION = get_secret("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
 
+# Model Profiles Configuration
+# One profile per call site; each setting can be overridden with
+# LLM_<PROFILE>_DEPLOYMENT, _REASONING_EFFORT, _MAX_TOKENS (0 = no cap; it
+# includes reasoning tokens) and _TEMPERATURE. Output from the other profiles
+# that fails schema validation is retried once on "strong".
+_LLM_PROFILE_DEFAULTS = {
+    "parse": ("low", 2048, 0.0),
+    "parse_batch": ("low", 8192, 0.0),
+    "validate": ("low", 2048, 0.0),
+    "query": ("medium", 4096, 0.0),
+    "strong": ("medium", 0, 0.7),
+}
+LLM_PROFILES = {
+    name: {
+        "deployment": get_secret(
+            f"LLM_{name.upper()}_DEPLOYMENT", AZURE_OPENAI_CHAT_DEPLOYMENT_NAME
+        ),
+        "reasoning_effort": get_secret(f"LLM_{name.upper()}_REASONING_EFFORT", effort),
+        "max_tokens": int(get_secret(f"LLM_{name.upper()}_MAX_TOKENS", str(tokens))),
+        "temperature": float(
+            get_secret(f"LLM_{name.upper()}_TEMPERATURE", str(temperature))
+        ),
+    }
+    for name, (effort, tokens, temperature) in _LLM_PROFILE_DEFAULTS.items()
+}
+LLM_ESCALATION_ENABLED = get_secret("LLM_ESCALATION_ENABLED", "true") == "true"
+
+# Prompt Registry Configuration
+PROMPT_REGISTRY_COLLECTION = get_secret("PROMPT_REGISTRY_COLLECTION", "prompt_registry")
+# Seconds between checks for newly published prompt versions (0 = never)
+PROMPT_RELOAD_INTERVAL = float(get_secret("PROMPT_RELOAD_INTERVAL", "60"))
+PROMPT_TOKEN_ENCODING = get_secret("PROMPT_TOKEN_ENCODING", "o200k_base")
+
 # LangChain Configuration
 LANGCHAIN_TRACING = get_secret("LANGCHAIN_TRACING", "false") == "true"
 LANGCHAIN_API_KEY = get_secret("LANGCHAIN_API_KEY")
 LANGCHAIN_PROJECT = get_secret("LANGCHAIN_PROJECT", "cortex-agent-service")
 LANGCHAIN_ENDPOINT = get_secret("LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com")
+
+# Expense Parsing Configuration
+EXPENSE_PARSE_MODE = get_secret("EXPENSE_PARSE_MODE", "hybrid")
+LOCAL_PARSE_CONFIDENCE_THRESHOLD = float(
+    get_secret("LOCAL_PARSE_CONFIDENCE_THRESHOLD", "0.85")
+)
+
+# Expense Validation Configuration
+VALIDATION_LLM_FALLBACK = get_secret("VALIDATION_LLM_FALLBACK", "false") == "true"
+VALIDATION_CONCURRENCY = int(get_secret("VALIDATION_CONCURRENCY", "8"))
+
+# Merchant Index Configuration
+MERCHANT_FUZZY_THRESHOLD = float(get_secret("MERCHANT_FUZZY_THRESHOLD", "0.6"))
+MERCHANT_INDEX_USERS = int(get_secret("MERCHANT_INDEX_USERS", "10000"))
+MERCHANT_INDEX_LOAD_LIMIT = int(get_secret("MERCHANT_INDEX_LOAD_LIMIT", "50000"))
+
+# LLM Response Cache Configuration
+LLM_CACHE_ENABLED = get_secret("LLM_CACHE_ENABLED", "true") == "true"
+LLM_CACHE_MAX_ENTRIES = int(get_secret("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_SECONDS = float(get_secret("LLM_CACHE_TTL_SECONDS", "900"))
+LLM_CACHE_SHARED = get_secret("LLM_CACHE_SHARED", "false") == "true"
+LLM_CACHE_COLLECTION = get_secret("LLM_CACHE_COLLECTION", "llm_cache")
+
+# LLM HTTP Pool Configuration
+LLM_HTTP_MAX_CONNECTIONS = int(get_secret("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    get_secret("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+LLM_HTTP_KEEPALIVE_EXPIRY = float(get_secret("LLM_HTTP_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP_TIMEOUT = float(get_secret("LLM_HTTP_TIMEOUT", "60"))
+
+# LLM Admission Control Configuration
+LLM_ADMISSION_ENABLED = get_secret("LLM_ADMISSION_ENABLED", "true") == "true"
+# Requests/tokens per minute of the deployment's quota (0 = unlimited)
+LLM_MAX_RPM = float(get_secret("LLM_MAX_RPM", "0"))
+LLM_MAX_TPM = float(get_secret("LLM_MAX_TPM", "0"))
+LLM_MIN_CONCURRENCY = int(get_secret("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(get_secret("LLM_MAX_CONCURRENCY", "64"))
+LLM_INITIAL_CONCURRENCY = int(get_secret("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_TARGET_LATENCY_SECONDS = float(get_secret("LLM_TARGET_LATENCY_SECONDS", "20"))
+LLM_EXPECTED_COMPLETION_TOKENS = int(
+    get_secret("LLM_EXPECTED_COMPLETION_TOKENS", "500")
+)
+# Attempts per call on 429/5xx/connection errors, retried through the queue
+LLM_MAX_ATTEMPTS = int(get_secret("LLM_MAX_ATTEMPTS", "3"))
+
+# Parse Batching Configuration
+PARSE_BATCH_MAX_SIZE = int(get_secret("PARSE_BATCH_MAX_SIZE", "8"))
+PARSE_BATCH_MAX_WAIT_MS = float(get_secret("PARSE_BATCH_MAX_WAIT_MS", "25"))
+
+# Bulk Ingestion Configuration
+INGEST_CONCURRENCY = int(get_secret("INGEST_CONCURRENCY", "16"))
+INGEST_BATCH_SIZE = int(get_secret("INGEST_BATCH_SIZE", "500"))
+INGEST_QUEUE_SIZE = int(get_secret("INGEST_QUEUE_SIZE", "1000"))
+INGEST_AMOUNT_SIGN = str(get_secret("INGEST_AMOUNT_SIGN", "infer"))
+
+# Duplicate Detection Configuration
+DEDUP_WINDOW_MINUTES = float(get_secret("DEDUP_WINDOW_MINUTES", "10"))
+DEDUP_BLOOM_USERS = int(get_secret("DEDUP_BLOOM_USERS", "10000"))
+DEDUP_BLOOM_ERROR_RATE = float(get_secret("DEDUP_BLOOM_ERROR_RATE", "0.01"))
+
+# Write-behind Configuration
+WRITE_BEHIND_ENABLED = get_secret("WRITE_BEHIND_ENABLED", "false") == "true"
+WRITE_BEHIND_BATCH_SIZE = int(get_secret("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_MAX_WAIT_MS = float(get_secret("WRITE_BEHIND_MAX_WAIT_MS", "50"))
+WRITE_BEHIND_FLUSH_TIMEOUT = float(get_secret("WRITE_BEHIND_FLUSH_TIMEOUT", "5"))
+WRITE_BEHIND_SPILL_PATH = get_secret(
+    "WRITE_BEHIND_SPILL_PATH", "expenses.spill.jsonl"
+)
+
+# API Configuration
+API_MAX_BATCH_SIZE = int(get_secret("API_MAX_BATCH_SIZE", "1000"))
+API_BATCH_CONCURRENCY = int(get_secret("API_BATCH_CONCURRENCY", "8"))
+API_MAX_PAGE_SIZE = int(get_secret("API_MAX_PAGE_SIZE", "200"))
+
+# Rollup Configuration
+ROLLUPS_COLLECTION = get_secret("ROLLUPS_COLLECTION", "expense_rollups")
+
+# Budget Configuration
+BUDGET_USAGE_COLLECTION = get_secret("BUDGET_USAGE_COLLECTION", "budget_usage")
+BUDGET_ALERTS_COLLECTION = get_secret("BUDGET_ALERTS_COLLECTION", "budget_alerts")
+BUDGET_ALERT_THRESHOLDS = [
+    float(threshold)
+    for threshold in get_secret("BUDGET_ALERT_THRESHOLDS", "0.8,1.0").split(",")
+]
+
+# Currency Conversion Configuration
+FX_RATES_PATH = get_secret("FX_RATES_PATH", "")
+FX_RATES_COLLECTION = get_secret("FX_RATES_COLLECTION", "fx_rates")
+FX_MAX_STALENESS_DAYS = int(get_secret("FX_MAX_STALENESS_DAYS", "7"))
+
+# Spending Query Configuration
+QUERY_PLAN_CACHE_SIZE = int(get_secret("QUERY_PLAN_CACHE_SIZE", "1024"))
+
+# Analytics Configuration
+ANALYTICS_CACHE_USERS = int(get_secret("ANALYTICS_CACHE_USERS", "256"))
+
+# User Data Cache Configuration
+USER_CACHE_MAX_ENTRIES = int(get_secret("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_PREFERENCES_TTL = float(get_secret("USER_CACHE_PREFERENCES_TTL", "300"))
+USER_CACHE_BUDGETS_TTL = float(get_secret("USER_CACHE_BUDGETS_TTL", "60"))
+USER_CACHE_CHANGE_STREAMS = get_secret("USER_CACHE_CHANGE_STREAMS", "false") == "true"
@@ -1,15 +1,60 @@
-from typing import Any, List, Mapping, Optional, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+)
 
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 from pymongo.results import (
+    BulkWriteResult,
     DeleteResult,
     InsertManyResult,
     InsertOneResult,
     UpdateResult,
 )
 
+from app.config import config
 from app.database.db import Database
+from app.utils.log import logger
+from app.utils.metrics import instrument_db
+
+# Called after every write with the collection name and the user_ids the
+# write touched, or None when they cannot be told from the filter/documents
+WriteListener = Callable[[str, Optional[set[str]]], None]
+
+_write_listeners: list[WriteListener] = []
+
 
+def add_write_listener(listener: WriteListener) -> None:
+    """Register a callback run after every write made through this module."""
+    _write_listeners.append(listener)
 
+
+def _notify_write(
+    collection_name: str, items: Optional[Iterable[Mapping[str, Any]]]
+) -> None:
+    user_ids: Optional[set[str]] = set() if items is not None else None
+    for item in items or ():
+        user_id = item.get("user_id")
+        if not isinstance(user_id, str):
+            user_ids = None
+            break
+        user_ids.add(user_id)
+    for listener in _write_listeners:
+        try:
+            listener(collection_name, user_ids)
+        except Exception as e:
+            logger.error(f"Write listener failed for {collection_name}: {e}")
+
+
+@instrument_db
 async def update_one(
     collection_name: str,
     filter: Mapping[str, Any],
@@ -31,18 +76,55 @@ async def update_one(
     Raises:
         RuntimeError: If MongoDB is not configured
     """
-    db = Database.get_database()
-    if db is None:
-        raise RuntimeError(
-            "MongoDB is not configured. Set MONGO_URI and DATABASE_NAME environment variables."
-        )
+    collection = Database.get_collection(collection_name)
 
-    collection = db.get_collection(collection_name)
-
-    res = await collection.update_one(filter=filter, update=update, upsert=upsert)
+    try:
+        res = await collection.update_one(filter=filter, update=update, upsert=upsert)
+    finally:
+        _notify_write(collection_name, [filter])
     return res
 
 
+@instrument_db
+async def find_one_and_update(
+    collection_name: str,
+    filter: Mapping[str, Any],
+    update: Mapping[str, Any],
+    upsert: bool = False,
+    projection: Optional[Mapping[str, Any]] = None,
+) -> dict[str, Any]:
+    """
+    Atomically update a single document and return it as it is after the update.
+
+    Args:
+        collection_name: Name of the collection to update
+        filter: Filter criteria to match the document
+        update: Update operations (e.g. {"$inc": {...}})
+        upsert: Whether to insert a new document if no match is found
+        projection: Fields to include/exclude in the returned document
+
+    Returns:
+        The updated document or empty dict if nothing matched
+
+    Raises:
+        RuntimeError: If MongoDB is not configured
+    """
+    collection = Database.get_collection(collection_name)
+
+    try:
+        res = await collection.find_one_and_update(
+            filter,
+            update,
+            projection=projection,
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+        )
+    finally:
+        _notify_write(collection_name, [filter])
+    return res or {}
+
+
+@instrument_db
 async def delete(collection_name: str, filter: Mapping[str, Any]) -> DeleteResult:
     """
     Delete documents from a MongoDB collection.
@@ -57,19 +139,17 @@ async def delete(collection_name: str, filter: Mapping[str, Any]) -> DeleteResul
     Raises:
         RuntimeError: If MongoDB is not configured
     """
-    db = Database.get_database()
-    if db is None:
-        raise RuntimeError(
-            "MongoDB is not configured. Set MONGO_URI and DATABASE_NAME environment variables."
-        )
+    collection = Database.get_collection(collection_name)
 
-    collection = db.get_collection(collection_name)
-
-    res = await collection.delete_many(filter=filter)
+    try:
+        res = await collection.delete_many(filter=filter)
+    finally:
+        _notify_write(collection_name, [filter])
 
     return res
 
 
+@instrument_db
 async def insert_one(
     document: dict[str, Any],
     collection_name: str,
@@ -87,21 +167,20 @@ async def insert_one(
     Raises:
         RuntimeError: If MongoDB is not configured
     """
-    db = Database.get_database()
-    if db is None:
-        raise RuntimeError(
-            "MongoDB is not configured. Set MONGO_URI and DATABASE_NAME environment variables."
-        )
-
-    collection = db.get_collection(collection_name)
+    collection = Database.get_collection(collection_name)
 
-    res = await collection.insert_one(document)
+    try:
+        res = await collection.insert_one(document)
+    finally:
+        _notify_write(collection_name, [document])
     return res
 
 
+@instrument_db
 async def insert_many(
     documents: List[dict[str, Any]],
     collection_name: str,
+    ordered: bool = True,
 ) -> InsertManyResult:
     """
     Insert multiple documents into MongoDB.
@@ -109,6 +188,8 @@ async def insert_many(
     Args:
         document: Document to be inserted
         collection_name: Name of the collection to query
+        ordered: Stop at the first failed insert. With False, the server
+            attempts every document and reports failures in a BulkWriteError
 
     Returns:
         The matching document or empty dict if not found
@@ -116,18 +197,45 @@ async def insert_many(
     Raises:
         RuntimeError: If MongoDB is not configured
     """
-    db = Database.get_database()
-    if db is None:
-        raise RuntimeError(
-            "MongoDB is not configured. Set MONGO_URI and DATABASE_NAME environment variables."
-        )
+    collection = Database.get_collection(collection_name)
+
+    try:
+        res = await collection.insert_many(documents=documents, ordered=ordered)
+    finally:
+        _notify_write(collection_name, documents)
+    return res
+
+
+@instrument_db
+async def bulk_write(
+    collection_name: str,
+    requests: List[Any],
+    ordered: bool = False,
+) -> BulkWriteResult:
+    """
+    Send a batch of write operations to MongoDB in one round trip.
+
+    Args:
+        collection_name: Name of the collection to write to
+        requests: pymongo write operations (UpdateOne, InsertOne, ...)
+        ordered: Stop at the first failed operation
+
+    Returns:
+        BulkWriteResult with counts for each kind of operation
 
-    collection = db.get_collection(collection_name)
+    Raises:
+        RuntimeError: If MongoDB is not configured
+    """
+    collection = Database.get_collection(collection_name)
 
-    res = await collection.insert_many(documents=documents)
+    try:
+        res = await collection.bulk_write(requests, ordered=ordered)
+    finally:
+        _notify_write(collection_name, None)
     return res
 
 
+@instrument_db
 async def read_one(
     collection_name: str,
     data_filter: Union[dict[str, Any], str],
@@ -146,26 +254,25 @@ async def read_one(
     Raises:
         RuntimeError: If MongoDB is not configured
     """
-    db = Database.get_database()
-    if db is None:
-        raise RuntimeError(
-            "MongoDB is not configured. Set MONGO_URI and DATABASE_NAME environment variables."
-        )
-
-    collection = db.get_collection(collection_name)
+    collection = Database.get_collection(collection_name)
 
     model = await collection.find_one(data_filter, options)
     return model or {}
 
 
+@instrument_db
 async def query_read(
-    collection_name: str, aggregate: list[dict[str, Any]]
+    collection_name: str,
+    aggregate: list[dict[str, Any]],
+    hint: Optional[Union[str, Sequence[tuple[str, int]]]] = None,
 ) -> list[dict[str, Any]]:
     """Execute an aggregation pipeline on MongoDB.
 
     Args:
         collection_name: Name of the collection to query
         aggregate: Aggregation pipeline stages
+        hint: Index (name or key pattern) the query planner must use; ignored
+            while that index does not exist
 
     Returns:
         List of documents from the aggregation result
@@ -173,20 +280,161 @@ async def query_read(
     Raises:
         RuntimeError: If MongoDB is not configured
     """
-    db = Database.get_database()
-    if db is None:
-        raise RuntimeError(
-            "MongoDB is not configured. Set MONGO_URI and DATABASE_NAME environment variables."
-        )
-
-    collection = db.get_collection(collection_name)
+    collection = Database.get_collection(collection_name)
 
     if not aggregate:
         aggregate = []
 
+    if hint:
+        try:
+            return await collection.aggregate(aggregate, hint=hint).to_list(None)
+        except OperationFailure as e:
+            # Indexes are built in the background: on a fresh deployment the
+            # hinted one may not exist yet
+            if "hint" not in str(e):
+                raise
+            logger.warning(f"Index hint {hint} unusable, running without it: {e}")
     return await collection.aggregate(aggregate).to_list(None)
 
 
+@instrument_db
+async def iter_read(
+    collection_name: str,
+    data_filter: Mapping[str, Any],
+    projection: Optional[Mapping[str, Any]] = None,
+    sort: Optional[Sequence[tuple[str, int]]] = None,
+    limit: int = 0,
+    batch_size: int = config.CURSOR_BATCH_SIZE,
+) -> AsyncIterator[dict[str, Any]]:
+    """Stream documents matching a filter, one server batch at a time.
+
+    Args:
+        collection_name: Name of the collection to query
+        data_filter: Filter criteria for the query
+        projection: Fields to include/exclude
+        sort: (field, direction) pairs
+        limit: Maximum number of documents (0 for no limit)
+        batch_size: Documents fetched per round trip
+
+    Yields:
+        Matching documents
+
+    Raises:
+        RuntimeError: If MongoDB is not configured
+    """
+    collection = Database.get_collection(collection_name)
+
+    cursor = collection.find(
+        data_filter, projection, limit=limit, batch_size=batch_size
+    )
+    if sort:
+        cursor = cursor.sort(list(sort))
+    try:
+        async for document in cursor:
+            yield document
+    finally:
+        # Release the server-side cursor if the caller stops early
+        await cursor.close()
+
+
+@instrument_db
+async def iter_aggregate(
+    collection_name: str,
+    aggregate: list[dict[str, Any]],
+    batch_size: int = config.CURSOR_BATCH_SIZE,
+    allow_disk_use: bool = False,
+) -> AsyncIterator[dict[str, Any]]:
+    """Stream the results of an aggregation pipeline, one server batch at a time.
+
+    Args:
+        collection_name: Name of the collection to query
+        aggregate: Aggregation pipeline stages
+        batch_size: Documents fetched per round trip
+        allow_disk_use: Let blocking stages ($sort, $group) spill to disk
+
+    Yields:
+        Documents from the aggregation result
+
+    Raises:
+        RuntimeError: If MongoDB is not configured
+    """
+    collection = Database.get_collection(collection_name)
+
+    cursor = collection.aggregate(
+        aggregate or [], batchSize=batch_size, allowDiskUse=allow_disk_use
+    )
+    try:
+        async for document in cursor:
+            yield document
+    finally:
+        await cursor.close()
+
+
+def _keyset_filter(
+    sort: Sequence[tuple[str, int]], after: Mapping[str, Any]
+) -> dict[str, Any]:
+    """Match documents strictly after `after` in `sort` order."""
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {name: after[name] for name, _ in sort[:i]}
+        branch[field] = {
+            "$gt" if direction == Database.ASCENDING else "$lt": after[field]
+        }
+        branches.append(branch)
+    return {"$or": branches}
+
+
+@instrument_db
+async def read_page(
+    collection_name: str,
+    data_filter: Mapping[str, Any],
+    sort: Sequence[tuple[str, int]],
+    limit: int,
+    after: Optional[Mapping[str, Any]] = None,
+    projection: Optional[Mapping[str, Any]] = None,
+) -> tuple[list[dict[str, Any]], Optional[dict[str, Any]]]:
+    """Read one page of documents using keyset (seek) pagination.
+
+    Each page continues from the sort key of the previous page's last
+    document instead of skipping, so every page is a bounded index range
+    scan when an index matches the filter and `sort`. The last sort field
+    must be unique (normally `_id`).
+
+    Args:
+        collection_name: Name of the collection to query
+        data_filter: Filter criteria for the query
+        sort: (field, direction) pairs, ending with a unique field
+        limit: Page size
+        after: Sort key returned with the previous page
+        projection: Fields to include/exclude
+
+    Returns:
+        The page of documents and the sort key to pass as `after` for the
+        next page, or None on the last page
+
+    Raises:
+        RuntimeError: If MongoDB is not configured
+    """
+    query: dict[str, Any] = dict(data_filter)
+    if after is not None:
+        query = {"$and": [query, _keyset_filter(sort, after)]}
+    documents = [
+        document
+        async for document in iter_read(
+            collection_name,
+            query,
+            projection=projection,
+            sort=sort,
+            limit=limit + 1,
+            batch_size=limit + 1,
+        )
+    ]
+    if len(documents) <= limit:
+        return documents, None
+    documents = documents[:limit]
+    return documents, {field: documents[-1][field] for field, _ in sort}
+
+
 @staticmethod
 async def list_collections() -> List[str]:
     """List all collections in the database."""
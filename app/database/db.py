@@ -1,35 +1,83 @@
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+import asyncio
+
+from motor.motor_asyncio import (
+    AsyncIOMotorClient,
+    AsyncIOMotorCollection,
+    AsyncIOMotorDatabase,
+)
 
 from app.config import config
+from app.database.indexes import ensure_indexes
 from app.utils.log import logger
 
 
 class Database:
-    # MongoDB client - initialized lazily
+    # MongoDB client - initialized lazily, once per process
     _client: AsyncIOMotorClient | None = None
     _db: AsyncIOMotorDatabase | None = None
+    _collections: dict[str, AsyncIOMotorCollection] = {}
+    _index_task: asyncio.Task | None = None
 
     ASCENDING = 1
     """Ascending sort order."""
     DESCENDING = -1
     """Descending sort order."""
 
+    @staticmethod
+    def _client_options() -> dict:
+        """Pool, compression and write-concern settings for the client."""
+        write_concern = config.MONGO_WRITE_CONCERN
+        options = {
+            "maxPoolSize": config.MONGO_MAX_POOL_SIZE,
+            "minPoolSize": config.MONGO_MIN_POOL_SIZE,
+            "maxIdleTimeMS": config.MONGO_MAX_IDLE_TIME_MS,
+            "w": int(write_concern) if write_concern.isdigit() else write_concern,
+        }
+        if config.MONGO_COMPRESSORS:
+            options["compressors"] = config.MONGO_COMPRESSORS
+        if config.MONGO_WRITE_TIMEOUT_MS:
+            options["wTimeoutMS"] = config.MONGO_WRITE_TIMEOUT_MS
+        return options
+
     @staticmethod
     async def connect() -> None:
-        Database._client = AsyncIOMotorClient(config.MONGO_URI)
-        Database._db = Database._client[config.DATABASE_NAME]
+        if Database.get_database() is None:
+            return
         logger.info("MongoDB client initialized Successfully")
-        await Database.create_indexes()
+        # Index builds run in the background so startup does not wait on them
+        Database._index_task = asyncio.create_task(Database.create_indexes())
 
     @staticmethod
     async def disconnect() -> None:
+        if Database._index_task is not None and not Database._index_task.done():
+            Database._index_task.cancel()
+        Database._index_task = None
         if Database._client is not None:
             Database._client.close()
             Database._client = None
             Database._db = None
+            Database._collections.clear()
             logger.info("MongoDB client disconnected")
-        else:
-            raise ConnectionError("Client not connected")
+
+    @staticmethod
+    async def warm_up() -> None:
+        """Open `MONGO_MIN_POOL_SIZE` connections before the first request.
+
+        Concurrent pings each check out their own connection, so the pool
+        is filled (handshake, auth, compression negotiation) up front.
+        """
+        client = Database.get_client()
+        if client is None:
+            return
+        await asyncio.gather(
+            *(
+                client.admin.command("ping")
+                for _ in range(max(config.MONGO_MIN_POOL_SIZE, 1))
+            )
+        )
+        logger.info(
+            f"MongoDB pool warmed with {config.MONGO_MIN_POOL_SIZE} connections"
+        )
 
     @staticmethod
     def get_client():
@@ -38,7 +86,9 @@ class Database:
             if not config.MONGO_URI:
                 logger.warning("MONGO_URI not set - MongoDB features will be disabled")
                 return None
-            Database._client = AsyncIOMotorClient(config.MONGO_URI)
+            Database._client = AsyncIOMotorClient(
+                config.MONGO_URI, **Database._client_options()
+            )
             logger.info("MongoDB client initialized")
         return Database._client
 
@@ -58,20 +108,28 @@ class Database:
             logger.info(f"Connected to database: {config.DATABASE_NAME}")
         return Database._db
 
+    @staticmethod
+    def get_collection(name: str) -> AsyncIOMotorCollection:
+        """Get a cached collection handle.
+
+        Raises:
+            RuntimeError: If MongoDB is not configured
+        """
+        collection = Database._collections.get(name)
+        if collection is None:
+            db = Database.get_database()
+            if db is None:
+                raise RuntimeError(
+                    "MongoDB is not configured. Set MONGO_URI and DATABASE_NAME environment variables."
+                )
+            collection = Database._collections[name] = db.get_collection(name)
+        return collection
+
     @staticmethod
     async def create_indexes():
-        """Create indexes for collections."""
+        """Create indexes for collections (see app/database/indexes.py)."""
         db = Database.get_database()
         if db is None:
             return
-        await db["expenses"].create_index(
-            [("user_id", Database.ASCENDING), ("date", Database.DESCENDING)]
-        )
-        await db["users"].create_index([("name", Database.ASCENDING)])
-        await db["preferences"].create_index(
-            [("user_id", Database.ASCENDING), ("email", Database.ASCENDING)]
-        )
-        await db["budgets"].create_index(
-            [("user_id", Database.ASCENDING), ("category", Database.ASCENDING)]
-        )
+        await ensure_indexes(db)
         logger.info("Indexes created")
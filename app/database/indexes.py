@@ -0,0 +1,90 @@
+"""Index catalogue for every collection the app queries.
+
+Each entry is shaped after the queries that use it (equality fields, then
+sort fields, then range fields). `benchmarks/index_advisor.py` checks the
+app's query shapes against this catalogue with explain().
+"""
+
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from app.config import config
+from app.utils.log import logger
+
+# Listing/analytics by user, newest first; _id makes the sort key unique for
+# keyset pagination. Also the hint of compiled spending queries.
+EXPENSES_BY_USER_DATE = [
+    ("user_id", ASCENDING),
+    ("date", DESCENDING),
+    ("_id", DESCENDING),
+]
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "expenses": [
+        IndexModel(EXPENSES_BY_USER_DATE),
+        IndexModel(
+            [("user_id", ASCENDING), ("category", ASCENDING), ("date", DESCENDING)]
+        ),
+        IndexModel(
+            [("user_id", ASCENDING), ("merchant", ASCENDING), ("date", DESCENDING)]
+        ),
+        # Duplicate detection; partial so expenses stored before fingerprints
+        # existed do not all collide on a missing value
+        IndexModel(
+            [("user_id", ASCENDING), ("fingerprint", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"fingerprint": {"$type": "string"}},
+        ),
+    ],
+    "users": [IndexModel([("name", ASCENDING)])],
+    "preferences": [IndexModel([("user_id", ASCENDING)])],
+    "budgets": [
+        # User cache loads by user_id (prefix); category and start_date serve
+        # ad hoc active-budget lookups
+        IndexModel(
+            [("user_id", ASCENDING), ("category", ASCENDING), ("start_date", ASCENDING)]
+        ),
+    ],
+    config.ROLLUPS_COLLECTION: [
+        IndexModel(
+            [
+                ("user_id", ASCENDING),
+                ("dimension", ASCENDING),
+                ("granularity", ASCENDING),
+                ("period_start", ASCENDING),
+                ("key", ASCENDING),
+                ("currency", ASCENDING),
+            ],
+            unique=True,
+        ),
+    ],
+    config.BUDGET_USAGE_COLLECTION: [
+        IndexModel(
+            [("budget_id", ASCENDING), ("period_start", ASCENDING)], unique=True
+        ),
+    ],
+    config.PROMPT_REGISTRY_COLLECTION: [
+        IndexModel([("name", ASCENDING), ("version", DESCENDING)], unique=True),
+    ],
+    config.LLM_CACHE_COLLECTION: [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
+    """Create every catalogued index; existing identical indexes are no-ops.
+
+    Collections are handled concurrently and a failure on one (e.g. an
+    option conflict with an index created by hand) does not stop the rest.
+    """
+
+    async def ensure(collection_name: str, models: list[IndexModel]) -> None:
+        try:
+            await db[collection_name].create_indexes(models)
+        except Exception as e:
+            logger.error(f"Creating indexes on {collection_name} failed: {e}")
+
+    await asyncio.gather(*(ensure(name, models) for name, models in INDEXES.items()))
@@ -1,16 +1,52 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from uvicorn import run
 
+from app.agents.agent import Agent
+from app.agents.query_agent import QueryAgent
+from app.api.routes import expenses
+from app.config import config
 from app.database.db import Database
+from app.services import currency
+from app.services.batcher import ExpenseParseBatcher
+from app.services.llm_services import LLMRegistry
+from app.services.merchants import merchant_index
+from app.services.prompts import prompt_registry
+from app.services.user_cache import user_cache
+from app.services.write_behind import WriteBehindBuffer
+from app.utils.metrics import registry
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """FastAPI lifespan: initialize and teardown for app."""
     _db = await Database.connect()
+    # Open pooled connections now rather than on the first requests
+    await Database.warm_up()
+    await currency.load_rates()
+    await prompt_registry.load()
+    prompt_registry.start()
+    await merchant_index.load()
+    user_cache.start()
+    # One agent and batcher per process, shared by every request
+    app.state.agent = Agent()
+    app.state.batcher = ExpenseParseBatcher(app.state.agent)
+    app.state.query_agent = QueryAgent(app.state.agent.llm_service)
+    if config.WRITE_BEHIND_ENABLED:
+        app.state.agent.write_buffer = WriteBehindBuffer(
+            on_inserted=app.state.agent.after_insert
+        )
+        await app.state.agent.write_buffer.start()
     yield
+    await app.state.batcher.close()
+    if app.state.agent.write_buffer is not None:
+        # Drain queued expenses (or spill them) before the client goes away
+        await app.state.agent.write_buffer.close()
+    await LLMRegistry.close()
+    await prompt_registry.close()
+    await user_cache.close()
     await Database.disconnect()
 
 
@@ -26,6 +62,15 @@ def create_app():
     async def root():
         return {"message": "Hello World"}
 
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus text exposition of the in-process metrics."""
+        return PlainTextResponse(
+            registry.render(), media_type="text/plain; version=0.0.4"
+        )
+
+    app.include_router(expenses.router)
+
     return app
 
 
@@ -20,6 +20,24 @@ class ExpenseExtraction(BaseModel):
     )
 
 
+class ExpenseExtractionList(BaseModel):
+    expenses: List[ExpenseExtraction] = Field(
+        default_factory=list,
+        description="Every expense mentioned in the message, in order",
+    )
+
+
+class IndexedExpenseExtraction(ExpenseExtraction):
+    index: int = Field(description="Number of the input message the expense came from")
+
+
+class ExpenseExtractionBatch(BaseModel):
+    expenses: List[IndexedExpenseExtraction] = Field(
+        default_factory=list,
+        description="Expenses extracted from a batch of numbered messages",
+    )
+
+
 class ExpenseValidation(BaseModel):
     is_valid: bool
     errors: Optional[List[str]] = Field(
@@ -40,6 +58,10 @@ class ExpenseResponse(BaseModel):
     success: bool
     message: str
     expense_id: str | None
+    duplicate: bool = Field(
+        default=False,
+        description="Whether expense_id is an earlier expense this one duplicates",
+    )
     errors: Optional[List[str]] = Field(
         default_factory=list,
         description="List of validation errors during expense extraction if any",
@@ -48,3 +70,35 @@ class ExpenseResponse(BaseModel):
         default_factory=list,
         description="List of validation warnings during expense extraction if any",
     )
+
+
+class IngestionReport(BaseModel):
+    received: int = 0
+    parsed: int = 0
+    invalid: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    credits: int = Field(
+        default=0, description="Export rows of money in (deposits, refunds), skipped"
+    )
+    inserted: int = 0
+    errors: List[str] = Field(
+        default_factory=list,
+        description="First errors encountered during ingestion (capped)",
+    )
+
+
+class BudgetStatus(BaseModel):
+    budget_id: str
+    user_id: str
+    category: str
+    currency: str
+    period_start: datetime
+    period_end: datetime
+    limit: float
+    spent: float = 0.0
+    utilization: float = 0.0
+
+
+class BudgetAlert(BudgetStatus):
+    threshold: float = Field(description="Utilization threshold that was crossed")
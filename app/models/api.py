@@ -0,0 +1,33 @@
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.config import config
+
+
+class ExpenseRequest(BaseModel):
+    text: str = Field(min_length=1, description="Natural language expense entry")
+    user_id: Optional[str] = None
+
+
+class ExpenseBatchRequest(BaseModel):
+    texts: List[str] = Field(
+        min_length=1,
+        max_length=config.API_MAX_BATCH_SIZE,
+        description="Natural language expense entries",
+    )
+    user_id: Optional[str] = None
+
+
+class SpendingQuestion(BaseModel):
+    question: str = Field(
+        min_length=1, description="Natural language question about spending"
+    )
+    user_id: str
+
+
+class ExpensePage(BaseModel):
+    items: List[dict[str, Any]]
+    next_cursor: Optional[str] = Field(
+        default=None, description="Pass as `cursor` to fetch the next page"
+    )
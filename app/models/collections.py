@@ -1,5 +1,5 @@
 from typing import Optional, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime, timezone
 from app.utils.enums import BudgetPeriod, Currencies
 
@@ -7,21 +7,31 @@ class Expenses(BaseModel):
     """
     Collection = expenses
     """
+    model_config = ConfigDict(use_enum_values=True)
+
     user_id: str
     amount: float
     currency: Currencies
+    converted_amount_usd: Optional[float] = None
     description: Optional[str] = None
     merchant: str
+    # normalize_merchant(merchant): what merchant rollups and groupings key on
+    merchant_key: Optional[str] = None
     category: str
     date: datetime | str = Field(default_factory=lambda: datetime.now(timezone.utc))
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     tags: List[str] = Field(default_factory=list)
     notes: Optional[str] = None
+    # Transaction id of the bank export the expense was imported from
+    source_id: Optional[str] = None
+    fingerprint: Optional[str] = None
 
 class Budgets(BaseModel):
     """
     Collection = budgets
     """
+    model_config = ConfigDict(use_enum_values=True)
+
     user_id: str
     category: str
     amount: float
@@ -0,0 +1,93 @@
+from datetime import date
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from app.utils.enums import (
+    Currencies,
+    QueryGroupBy,
+    QueryIntent,
+    RelativePeriod,
+)
+from app.utils.nlp_parser import CATEGORY_KEYWORDS, DEFAULT_CATEGORY
+
+_CATEGORIES = {
+    category.lower(): category for category in [*CATEGORY_KEYWORDS, DEFAULT_CATEGORY]
+}
+
+
+class SpendingQuery(BaseModel):
+    """A spending question as filters plus what to compute over the matches."""
+
+    intent: QueryIntent = Field(
+        description="total: one sum; breakdown: sums per group_by; list: the expenses"
+    )
+    period: Optional[RelativePeriod] = Field(
+        default=None,
+        description="Relative date range; leave start_date/end_date empty when set",
+    )
+    start_date: Optional[date] = Field(
+        default=None, description="First day of an absolute range (inclusive)"
+    )
+    end_date: Optional[date] = Field(
+        default=None, description="Last day of an absolute range (inclusive)"
+    )
+    categories: List[str] = Field(
+        default_factory=list, description="Only expenses in these categories"
+    )
+    merchants: List[str] = Field(
+        default_factory=list, description="Only expenses at these merchants"
+    )
+    min_amount: Optional[float] = Field(
+        default=None, ge=0, description="Smallest amount, in the expense's currency"
+    )
+    max_amount: Optional[float] = Field(
+        default=None, ge=0, description="Largest amount, in the expense's currency"
+    )
+    currency: Optional[Currencies] = Field(
+        default=None, description="Only expenses paid in this currency"
+    )
+    group_by: Optional[QueryGroupBy] = Field(
+        default=None, description="Grouping of a breakdown"
+    )
+    limit: Optional[int] = Field(
+        default=None, ge=1, le=100, description="Top N groups or expenses"
+    )
+
+    @field_validator("categories")
+    @classmethod
+    def known_category_names(cls, categories: List[str]) -> List[str]:
+        return [_CATEGORIES.get(category.lower(), category) for category in categories]
+
+    @field_validator("merchants")
+    @classmethod
+    def non_empty_merchants(cls, merchants: List[str]) -> List[str]:
+        return [merchant.strip() for merchant in merchants if merchant.strip()]
+
+    @model_validator(mode="after")
+    def consistent(self) -> "SpendingQuery":
+        if self.period is not None and (self.start_date or self.end_date):
+            raise ValueError("Use either period or start_date/end_date, not both")
+        if self.start_date and self.end_date and self.start_date > self.end_date:
+            raise ValueError("start_date is after end_date")
+        if (
+            self.min_amount is not None
+            and self.max_amount is not None
+            and self.min_amount > self.max_amount
+        ):
+            raise ValueError("min_amount is greater than max_amount")
+        if self.intent is QueryIntent.BREAKDOWN and self.group_by is None:
+            raise ValueError("A breakdown needs group_by")
+        if self.intent is not QueryIntent.BREAKDOWN and self.group_by is not None:
+            raise ValueError("group_by only applies to a breakdown")
+        return self
+
+
+class QueryAnswer(BaseModel):
+    question: str
+    query: SpendingQuery
+    source: str = Field(description="Collection the answer was computed from")
+    plan_cached: bool = Field(
+        description="Whether the question's shape was known, skipping the LLM"
+    )
+    rows: List[dict[str, Any]]
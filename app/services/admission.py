@@ -0,0 +1,275 @@
+"""Admission control for Azure OpenAI calls.
+
+Callers wait in a priority queue (interactive before bulk) and are let
+through while three limits allow it:
+
+- requests and tokens per minute, as token buckets refilled continuously;
+- a concurrency limit adapted by AIMD: it grows by about one per round of
+  successful calls and is halved (at most once per cooldown) on a 429, a
+  server error or a call slower than the target latency.
+
+A 429 also pauses admission for the Retry-After the service asked for, with
+jitter, so queued callers do not all retry at the same instant.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import openai
+
+from app.config import config
+from app.utils.enums import RequestPriority
+from app.utils.log import logger
+from app.utils.metrics import Counter, Gauge, Histogram
+
+PRIORITY_RANK = {RequestPriority.INTERACTIVE: 0, RequestPriority.BULK: 1}
+
+# Multiplicative decrease applied to the concurrency limit on congestion
+BACKOFF = 0.5
+# Extra fraction of Retry-After added at random to spread retries
+RETRY_JITTER = 0.25
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    return isinstance(error, openai.RateLimitError)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Errors worth another attempt: throttling, server errors and timeouts."""
+    return isinstance(
+        error,
+        (
+            openai.RateLimitError,
+            openai.InternalServerError,
+            openai.APIConnectionError,
+        ),
+    )
+
+
+def retry_after(error: BaseException, default: float = 1.0) -> float:
+    """Seconds the service asked us to wait, from the 429 response headers."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return default
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough prompt size (4 characters per token) plus the expected completion."""
+    return sum(len(text) for text in texts) // 4 + config.LLM_EXPECTED_COMPLETION_TOKENS
+
+
+class TokenBucket:
+    """Budget of `per_minute` units refilled continuously; 0 means unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # A request larger than the whole budget only waits for a full bucket
+        needed = min(amount, self.capacity) - self.tokens
+        return max(needed, 0.0) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        if self.capacity:
+            self._refill(now)
+            self.tokens -= amount
+
+    def give_back(self, amount: float) -> None:
+        if self.capacity:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Permit:
+    """An admitted call; set `tokens_used` once the response reports usage."""
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.tokens_used: int | None = None
+        self.started = time.monotonic()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_rpm: float = config.LLM_MAX_RPM,
+        max_tpm: float = config.LLM_MAX_TPM,
+        min_concurrency: int = config.LLM_MIN_CONCURRENCY,
+        max_concurrency: int = config.LLM_MAX_CONCURRENCY,
+        initial_concurrency: int = config.LLM_INITIAL_CONCURRENCY,
+        target_latency: float = config.LLM_TARGET_LATENCY_SECONDS,
+    ):
+        self.requests = TokenBucket(max_rpm)
+        self.tokens = TokenBucket(max_tpm)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(initial_concurrency)
+        self.target_latency = target_latency
+        self.inflight = 0
+        self.throttled = 0
+        self._queue: list[tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._wakeup: asyncio.TimerHandle | None = None
+
+    def queue_depth(self) -> dict[RequestPriority, int]:
+        depth = {priority: 0 for priority in PRIORITY_RANK}
+        ranks = {rank: priority for priority, rank in PRIORITY_RANK.items()}
+        for rank, _, _, future in self._queue:
+            if not future.done():
+                depth[ranks[rank]] += 1
+        return depth
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        estimated_tokens: int = 0,
+    ) -> AsyncIterator[Permit]:
+        """Wait for admission, then report the outcome of the call made inside."""
+        queued = time.monotonic()
+        await self._acquire(priority, estimated_tokens)
+        ADMISSION_WAIT_SECONDS.observe(
+            time.monotonic() - queued, priority=priority.value
+        )
+        permit = Permit(estimated_tokens)
+        try:
+            yield permit
+        except BaseException as e:
+            if is_rate_limited(e):
+                self._on_throttled(retry_after(e))
+            elif is_retryable(e):
+                self._decrease()
+            raise
+        else:
+            self._on_success(time.monotonic() - permit.started)
+        finally:
+            self._release(permit)
+
+    async def _acquire(self, priority: RequestPriority, tokens: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._queue, (PRIORITY_RANK[priority], next(self._sequence), tokens, future)
+        )
+        self._pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up: hand the slot back
+                self.inflight -= 1
+                self._pump()
+            raise
+
+    def _pump(self) -> None:
+        """Admit queued callers, best priority first, while limits allow."""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        while self._queue and self.inflight < int(self.limit):
+            _, _, tokens, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            wait = max(
+                self._paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(tokens, now),
+            )
+            if wait > 0:
+                loop = asyncio.get_running_loop()
+                self._wakeup = loop.call_later(wait, self._pump)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1, now)
+            self.tokens.take(tokens, now)
+            self.inflight += 1
+            future.set_result(None)
+
+    def _release(self, permit: Permit) -> None:
+        self.inflight -= 1
+        if permit.tokens_used is not None:
+            # Settle the reservation against what the call really used
+            self.tokens.give_back(permit.estimated_tokens - permit.tokens_used)
+        self._pump()
+
+    def _on_success(self, latency: float) -> None:
+        if latency > self.target_latency:
+            self._decrease()
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _on_throttled(self, delay: float) -> None:
+        self.throttled += 1
+        now = time.monotonic()
+        self._paused_until = max(
+            self._paused_until, now + delay * (1 + random.uniform(0, RETRY_JITTER))
+        )
+        self._decrease()
+        logger.warning(
+            f"LLM throttled: pausing {delay:.1f}s, concurrency limit {int(self.limit)}"
+        )
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        # Calls already in flight when congestion began report it too; count
+        # one decrease per cooldown rather than one per call
+        if now - self._last_decrease < min(self.target_latency, 5.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * BACKOFF)
+
+
+admission = AdmissionController()
+
+Gauge(
+    "llm_admission_queue_depth",
+    "LLM calls waiting for admission",
+    ("priority",),
+    function=lambda: {
+        (priority.value,): depth for priority, depth in admission.queue_depth().items()
+    },
+)
+Gauge(
+    "llm_admission_inflight",
+    "LLM calls currently admitted",
+    function=lambda: {(): admission.inflight},
+)
+Gauge(
+    "llm_admission_concurrency_limit",
+    "Current adaptive concurrency limit for LLM calls",
+    function=lambda: {(): int(admission.limit)},
+)
+Counter(
+    "llm_admission_throttled_total",
+    "LLM calls rejected with 429",
+    function=lambda: {(): admission.throttled},
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "llm_admission_wait_seconds",
+    "Time LLM calls spent queued for admission",
+    ("priority",),
+)
@@ -0,0 +1,344 @@
+"""Columnar, in-memory analytics over one user's expense history.
+
+A user's expenses are loaded once into NumPy columns sorted by day, so
+date-range filters are two binary searches and group-bys, percentiles,
+rolling windows and z-scores are single vectorized passes.
+"""
+
+import asyncio
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Iterable, Mapping
+
+import numpy as np
+
+from app.config import config
+from app.database import core_data
+from app.services.currency import epoch_day
+from app.services.rollups import dimension_key
+from app.utils.enums import RollupDimension
+from app.utils.metrics import Counter
+
+PROJECTION = {
+    "_id": 0,
+    "amount": 1,
+    "converted_amount_usd": 1,
+    "currency": 1,
+    "category": 1,
+    "merchant": 1,
+    "date": 1,
+}
+
+
+class ExpenseFrame:
+    """Expense columns for one user, sorted by day.
+
+    Amounts are aggregated in USD. Expenses that have not been converted
+    have no USD value: they are left out of totals, percentiles and
+    anomaly scores (adding yen to dollars would skew them), and
+    `unconverted` counts them.
+    """
+
+    def __init__(
+        self,
+        amount: np.ndarray,
+        amount_usd: np.ndarray,
+        category_code: np.ndarray,
+        merchant_code: np.ndarray,
+        day: np.ndarray,
+        categories: list[str],
+        merchants: list[str],
+    ):
+        order = np.argsort(day, kind="stable")
+        self.amount = amount[order]
+        self.amount_usd = amount_usd[order]
+        self.category_code = category_code[order]
+        self.merchant_code = merchant_code[order]
+        self.day = day[order]
+        self.categories = categories
+        self.merchants = merchants
+        self.value = self.amount_usd
+        self.converted = ~np.isnan(self.amount_usd)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Mapping[str, Any]]) -> "ExpenseFrame":
+        builder = FrameBuilder()
+        for document in documents:
+            builder.add(document)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def _range(self, start: date | None, end: date | None) -> slice:
+        """Rows with start <= day < end, found by binary search."""
+        low = 0 if start is None else np.searchsorted(self.day, epoch_day(start))
+        high = (
+            len(self.day)
+            if end is None
+            else np.searchsorted(self.day, epoch_day(end), side="left")
+        )
+        return slice(int(low), int(high))
+
+    def unconverted(self, start: date | None = None, end: date | None = None) -> int:
+        """Expenses in the range left out of aggregates for lack of a USD value."""
+        return int(np.count_nonzero(~self.converted[self._range(start, end)]))
+
+    def _codes(self, dimension: RollupDimension) -> tuple[np.ndarray, list[str]]:
+        if dimension is RollupDimension.MERCHANT:
+            return self.merchant_code, self.merchants
+        return self.category_code, self.categories
+
+    def filter_mask(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        category: str | None = None,
+        merchant: str | None = None,
+        min_amount: float | None = None,
+        max_amount: float | None = None,
+    ) -> np.ndarray:
+        """Boolean mask over all rows for the given filters."""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self._range(start, end)] = True
+        if category is not None:
+            code = (
+                self.categories.index(category) if category in self.categories else -1
+            )
+            mask &= self.category_code == code
+        if merchant is not None:
+            key = dimension_key({"merchant": merchant}, RollupDimension.MERCHANT)
+            code = self.merchants.index(key) if key in self.merchants else -1
+            mask &= self.merchant_code == code
+        if min_amount is not None:
+            mask &= self.value >= min_amount
+        if max_amount is not None:
+            mask &= self.value <= max_amount
+        return mask
+
+    def group_by(
+        self,
+        dimension: RollupDimension,
+        start: date | None = None,
+        end: date | None = None,
+        limit: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """Total and count per category/merchant, largest total first."""
+        rows = self._range(start, end)
+        converted = self.converted[rows]
+        codes, names = self._codes(dimension)
+        codes = codes[rows][converted]
+        totals = np.bincount(
+            codes, weights=self.value[rows][converted], minlength=len(names)
+        )
+        counts = np.bincount(codes, minlength=len(names))
+        order = np.argsort(-totals, kind="stable")
+        order = order[counts[order] > 0][:limit]
+        return [
+            {"key": names[i], "total": float(totals[i]), "count": int(counts[i])}
+            for i in order
+        ]
+
+    def percentiles(
+        self,
+        q: Iterable[float] = (50, 90, 99),
+        mask: np.ndarray | None = None,
+    ) -> dict[float, float]:
+        values = self.value[self.converted if mask is None else mask & self.converted]
+        q = list(q)
+        if not len(values):
+            return {p: float("nan") for p in q}
+        return dict(zip(q, np.percentile(values, q).tolist()))
+
+    def rolling_totals(
+        self,
+        window_days: int = 30,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> list[dict[str, Any]]:
+        """Trailing `window_days` spend for every day in the range."""
+        rows = self._range(start, end)
+        converted = self.converted[rows]
+        days = self.day[rows][converted]
+        if not len(days):
+            return []
+        first = int(days[0]) if start is None else epoch_day(start)
+        last = int(days[-1]) if end is None else epoch_day(end) - 1
+        daily = np.bincount(
+            days - first,
+            weights=self.value[rows][converted],
+            minlength=last - first + 1,
+        )
+        cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+        index = np.arange(1, len(daily) + 1)
+        window = cumulative[index] - cumulative[np.maximum(index - window_days, 0)]
+        epoch = date(1970, 1, 1).toordinal()
+        return [
+            {"date": date.fromordinal(epoch + first + i).isoformat(), "total": float(v)}
+            for i, v in enumerate(window.tolist())
+        ]
+
+    def anomalies(
+        self,
+        threshold: float = 3.0,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> list[dict[str, Any]]:
+        """Expenses whose z-score within their category exceeds `threshold`.
+
+        Category means and deviations are computed over the whole history;
+        only rows inside the date range are reported. Unconverted rows get
+        no score.
+        """
+        if not len(self):
+            return []
+        codes = self.category_code[self.converted]
+        values = self.value[self.converted]
+        counts = np.bincount(codes, minlength=len(self.categories))
+        sums = np.bincount(codes, weights=values, minlength=len(self.categories))
+        squares = np.bincount(codes, weights=values**2, minlength=len(self.categories))
+        safe_counts = np.maximum(counts, 1)
+        mean = sums / safe_counts
+        std = np.sqrt(np.maximum(squares / safe_counts - mean**2, 0.0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (self.value - mean[self.category_code]) / std[self.category_code]
+        z = np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0)
+        rows = self._range(start, end)
+        hits = np.flatnonzero(np.abs(z[rows]) > threshold) + rows.start
+        epoch = date(1970, 1, 1).toordinal()
+        return [
+            {
+                "date": date.fromordinal(epoch + int(self.day[i])).isoformat(),
+                "amount": float(self.amount[i]),
+                "value": float(self.value[i]),
+                "category": self.categories[self.category_code[i]],
+                "merchant": self.merchants[self.merchant_code[i]],
+                "z_score": float(z[i]),
+            }
+            for i in hits
+        ]
+
+
+class FrameBuilder:
+    """Accumulates expense documents into columns one at a time.
+
+    Only the column values are kept, so a frame can be built from a
+    streaming cursor without holding the documents themselves.
+    """
+
+    def __init__(self):
+        self.amounts: list[float] = []
+        self.amounts_usd: list[float] = []
+        self.category_codes: list[int] = []
+        self.merchant_codes: list[int] = []
+        self.days: list[int] = []
+        self.categories: dict[str, int] = {}
+        self.merchants: dict[str, int] = {}
+
+    def add(self, document: Mapping[str, Any]) -> None:
+        self.amounts.append(document["amount"])
+        usd = document.get("converted_amount_usd")
+        self.amounts_usd.append(np.nan if usd is None else usd)
+        category = document.get("category") or ""
+        self.category_codes.append(
+            self.categories.setdefault(category, len(self.categories))
+        )
+        merchant = dimension_key(document, RollupDimension.MERCHANT)
+        self.merchant_codes.append(
+            self.merchants.setdefault(merchant, len(self.merchants))
+        )
+        self.days.append(epoch_day(document["date"]))
+
+    def build(self) -> ExpenseFrame:
+        return ExpenseFrame(
+            amount=np.asarray(self.amounts, dtype=np.float64),
+            amount_usd=np.asarray(self.amounts_usd, dtype=np.float64),
+            category_code=np.asarray(self.category_codes, dtype=np.int32),
+            merchant_code=np.asarray(self.merchant_codes, dtype=np.int32),
+            day=np.asarray(self.days, dtype=np.int32),
+            categories=list(self.categories),
+            merchants=list(self.merchants),
+        )
+
+
+class FrameCache:
+    """LRU of per-user frames, invalidated when the user inserts expenses.
+
+    Concurrent misses for a user share one load (single-flight); a load
+    the user's inserts invalidated while it ran is returned but not cached.
+    """
+
+    def __init__(self, max_users: int = config.ANALYTICS_CACHE_USERS):
+        self.max_users = max_users
+        self._frames: OrderedDict[str, ExpenseFrame] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._stale: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, user_id: str) -> ExpenseFrame:
+        frame = self._frames.get(user_id)
+        if frame is not None:
+            self.hits += 1
+            self._frames.move_to_end(user_id)
+            return frame
+        task = self._inflight.get(user_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # A task of its own, so a caller going away does not cancel the others
+            task = self._inflight[user_id] = asyncio.ensure_future(self._load(user_id))
+        return await asyncio.shield(task)
+
+    async def _load(self, user_id: str) -> ExpenseFrame:
+        try:
+            frame = await load_frame(user_id)
+            if user_id not in self._stale:
+                self._frames[user_id] = frame
+                while len(self._frames) > self.max_users:
+                    self._frames.popitem(last=False)
+            return frame
+        finally:
+            del self._inflight[user_id]
+            self._stale.discard(user_id)
+
+    def invalidate(self, user_id: str) -> None:
+        self._frames.pop(user_id, None)
+        if user_id in self._inflight:
+            self._stale.add(user_id)
+
+
+async def load_frame(user_id: str) -> ExpenseFrame:
+    """Stream a user's expenses through the (user_id, date) index into a frame."""
+    builder = FrameBuilder()
+    async for document in core_data.iter_read(
+        "expenses", {"user_id": user_id}, projection=PROJECTION
+    ):
+        builder.add(document)
+    return builder.build()
+
+
+frame_cache = FrameCache()
+
+Counter(
+    "analytics_frame_cache_lookups_total",
+    "Per-user analytics frame lookups by result",
+    ("result",),
+    function=lambda: {
+        ("hit",): frame_cache.hits,
+        ("miss",): frame_cache.misses,
+        ("coalesced",): frame_cache.coalesced,
+    },
+)
+
+
+async def get_frame(user_id: str) -> ExpenseFrame:
+    return await frame_cache.get(user_id)
+
+
+async def record_expenses(documents: Iterable[Mapping[str, Any]]) -> None:
+    """Drop cached frames of users who just inserted expenses."""
+    for user_id in {document["user_id"] for document in documents}:
+        frame_cache.invalidate(user_id)
@@ -0,0 +1,109 @@
+import asyncio
+
+from app.agents.agent import Agent
+from app.config import config
+from app.models.agent import ExpenseExtraction
+from app.utils.enums import ParseMode, RequestPriority
+from app.utils.log import logger
+
+
+class ExpenseParseBatcher:
+    """Coalesces concurrent Agent.parse_expense calls into batched LLM calls.
+
+    Requests that arrive within `max_wait_ms` of the first pending one are
+    sent together as a single numbered prompt (up to `max_batch_size`), and
+    each caller gets back its own item. Inputs the local parser is confident
+    about never enter a batch, and each priority is batched separately so
+    bulk work never holds up an interactive caller.
+    """
+
+    def __init__(
+        self,
+        agent: Agent,
+        max_batch_size: int = config.PARSE_BATCH_MAX_SIZE,
+        max_wait_ms: float = config.PARSE_BATCH_MAX_WAIT_MS,
+    ):
+        self.agent = agent
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: dict[RequestPriority, list[tuple[str, asyncio.Future]]] = {
+            priority: [] for priority in RequestPriority
+        }
+        self._timers: dict[RequestPriority, asyncio.TimerHandle] = {}
+        self._inflight: set[asyncio.Task] = set()
+
+    async def parse(
+        self,
+        user_prompt: str,
+        mode: ParseMode | None = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+    ) -> ExpenseExtraction:
+        mode = mode or ParseMode(config.EXPENSE_PARSE_MODE)
+        if mode is ParseMode.HYBRID:
+            extraction = self.agent.parse_expense_locally(user_prompt)
+            if extraction is not None:
+                return extraction
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending[priority]
+        pending.append((user_prompt, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(priority)
+        elif priority not in self._timers:
+            self._timers[priority] = loop.call_later(
+                self.max_wait, self._flush, priority
+            )
+        return await future
+
+    async def close(self) -> None:
+        """Flush pending requests and wait for in-flight batches."""
+        for priority in RequestPriority:
+            self._flush(priority)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def _flush(self, priority: RequestPriority) -> None:
+        timer = self._timers.pop(priority, None)
+        if timer is not None:
+            timer.cancel()
+        if not self._pending[priority]:
+            return
+        batch, self._pending[priority] = self._pending[priority], []
+        task = asyncio.create_task(self._dispatch(batch, priority))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(
+        self, batch: list[tuple[str, asyncio.Future]], priority: RequestPriority
+    ) -> None:
+        prompts = [prompt for prompt, _ in batch]
+        if len(batch) == 1:
+            results: list[ExpenseExtraction | None] = [None]
+        else:
+            try:
+                results = await self.agent.parse_expense_batch(prompts, priority)
+            except Exception as e:
+                logger.warning(f"Batched parse of {len(batch)} expenses failed: {e}")
+                results = [None] * len(batch)
+
+        # Anything the batch did not answer is retried on its own
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            retries = await asyncio.gather(
+                *(
+                    self.agent.parse_expense(prompts[i], ParseMode.LLM, priority)
+                    for i in missing
+                ),
+                return_exceptions=True,
+            )
+            for i, result in zip(missing, retries):
+                results[i] = result
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Iterable, Mapping
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.config import config
+from app.database import core_data
+from app.database.db import Database
+from app.models.agent import BudgetAlert, BudgetStatus
+from app.services.currency import usd_to_currency
+from app.services.rollups import period_start
+from app.services.user_cache import get_budgets
+from app.utils.enums import BudgetPeriod, RollupGranularity
+from app.utils.log import logger
+
+AlertListener = Callable[[BudgetAlert], Awaitable[None]]
+
+_alert_listeners: list[AlertListener] = []
+
+# (budget_id, period_start) of usage documents known to exist, so only the
+# first expense of a period pays for the seeding lookup
+_seeded: set[tuple[str, datetime]] = set()
+MAX_SEEDED = 10_000
+
+
+def add_alert_listener(listener: AlertListener) -> None:
+    """Register a coroutine called for every budget threshold crossing."""
+    _alert_listeners.append(listener)
+
+
+def period_bounds(period: BudgetPeriod, at: datetime) -> tuple[datetime, datetime]:
+    """Calendar period [start, end) of a budget containing `at`."""
+    if period is BudgetPeriod.WEEKLY:
+        start = period_start(at, RollupGranularity.WEEK)
+        return start, start + timedelta(days=7)
+    if period is BudgetPeriod.MONTHLY:
+        start = period_start(at, RollupGranularity.MONTH)
+        return start, period_start(start + timedelta(days=31), RollupGranularity.MONTH)
+    start = period_start(at, RollupGranularity.MONTH).replace(month=1)
+    return start, start.replace(year=start.year + 1)
+
+
+def _as_utc(value: datetime | str) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def active_budgets(
+    user_id: str, category: str, at: datetime
+) -> list[dict[str, Any]]:
+    """Budgets of a user for a category that cover `at`, from the user cache."""
+    return [
+        budget
+        for budget in await get_budgets(user_id)
+        if budget["category"] == category
+        and _as_utc(budget["start_date"]) <= at <= _as_utc(budget["end_date"])
+    ]
+
+
+async def _period_spend(
+    budget: Mapping[str, Any],
+    start: datetime,
+    end: datetime,
+    exclude: Iterable[Any] = (),
+) -> float:
+    """Stored spend in the budget's category over [start, end), in its currency."""
+    spent = 0.0
+    async for expense in core_data.iter_read(
+        "expenses",
+        {
+            "user_id": budget["user_id"],
+            "category": budget["category"],
+            # Within the budget's own dates, as in active_budgets
+            "date": {
+                "$gte": max(start, _as_utc(budget["start_date"])),
+                "$lt": end,
+                "$lte": _as_utc(budget["end_date"]),
+            },
+            "_id": {"$nin": list(exclude)},
+        },
+        projection={"amount": 1, "currency": 1, "converted_amount_usd": 1},
+    ):
+        amount = usd_to_currency(expense, budget["currency"])
+        if amount is not None:
+            spent += amount
+    return spent
+
+
+def _usage_fields(
+    budget: Mapping[str, Any], end: datetime, spent: float
+) -> dict[str, Any]:
+    return {
+        "user_id": budget["user_id"],
+        "category": budget["category"],
+        "currency": budget["currency"],
+        "period_end": end,
+        "limit": float(budget["amount"]),
+        "spent": spent,
+    }
+
+
+async def _seed(
+    budget: Mapping[str, Any],
+    start: datetime,
+    end: datetime,
+    exclude: Iterable[Any],
+) -> None:
+    """Create a period's usage from the expenses already stored in it.
+
+    A budget added mid-period, or a period that only got backdated
+    imports, starts from what was spent so far instead of 0. `exclude` are
+    the expenses about to be added with `$inc`; an expense of a concurrent
+    batch still in flight can be counted twice, which rebuild_budget_usage
+    repairs.
+    """
+    key = (str(budget["_id"]), start)
+    if key in _seeded:
+        return
+    filter = {"budget_id": key[0], "period_start": start}
+    if not await core_data.read_one(config.BUDGET_USAGE_COLLECTION, filter, {"_id": 1}):
+        spent = await _period_spend(budget, start, end, exclude)
+        await core_data.update_one(
+            config.BUDGET_USAGE_COLLECTION,
+            filter,
+            {
+                "$setOnInsert": {
+                    **_usage_fields(budget, end, spent),
+                    "updated_at": datetime.now(timezone.utc),
+                }
+            },
+            upsert=True,
+        )
+    if len(_seeded) >= MAX_SEEDED:
+        _seeded.clear()
+    _seeded.add(key)
+
+
+async def _apply(
+    budget: Mapping[str, Any],
+    expense: Mapping[str, Any],
+    amount: float,
+    batch_ids: Iterable[Any] = (),
+) -> None:
+    period = BudgetPeriod(budget["period"])
+    start, end = period_bounds(period, _as_utc(expense["date"]))
+    await _seed(budget, start, end, batch_ids)
+    usage = await core_data.find_one_and_update(
+        config.BUDGET_USAGE_COLLECTION,
+        {"budget_id": str(budget["_id"]), "period_start": start},
+        {
+            "$inc": {"spent": amount},
+            "$set": {
+                "limit": float(budget["amount"]),
+                "updated_at": datetime.now(timezone.utc),
+            },
+            "$setOnInsert": {
+                "user_id": budget["user_id"],
+                "category": budget["category"],
+                "currency": budget["currency"],
+                "period_end": end,
+            },
+        },
+        upsert=True,
+    )
+    # Each $inc sees its own before/after values, so exactly one concurrent
+    # writer observes a given threshold being crossed
+    spent = usage["spent"]
+    limit = usage["limit"]
+    for threshold in config.BUDGET_ALERT_THRESHOLDS:
+        if spent - amount < threshold * limit <= spent:
+            await _fire(
+                BudgetAlert(
+                    **_status_fields(usage),
+                    threshold=threshold,
+                )
+            )
+
+
+def _status_fields(usage: Mapping[str, Any]) -> dict[str, Any]:
+    limit = usage["limit"]
+    return {
+        "budget_id": usage["budget_id"],
+        "user_id": usage["user_id"],
+        "category": usage["category"],
+        "currency": usage["currency"],
+        "period_start": usage["period_start"],
+        "period_end": usage["period_end"],
+        "limit": limit,
+        "spent": usage["spent"],
+        "utilization": usage["spent"] / limit if limit else 0.0,
+    }
+
+
+async def _fire(alert: BudgetAlert) -> None:
+    logger.warning(
+        f"Budget {alert.budget_id} ({alert.category}) reached "
+        f"{alert.threshold:.0%}: {alert.spent:.2f}/{alert.limit:.2f} {alert.currency}"
+    )
+    await core_data.insert_one(
+        {**alert.model_dump(), "created_at": datetime.now(timezone.utc)},
+        config.BUDGET_ALERTS_COLLECTION,
+    )
+    for listener in _alert_listeners:
+        try:
+            await listener(alert)
+        except Exception as e:
+            logger.error(f"Budget alert listener failed: {e}")
+
+
+async def record_expenses(documents: Iterable[Mapping[str, Any]]) -> None:
+    """Add newly inserted expenses to the running spend of matching budgets."""
+    documents = list(documents)
+    batch_ids = [expense["_id"] for expense in documents if "_id" in expense]
+    updates = []
+    for expense in documents:
+        budgets = await active_budgets(
+            expense["user_id"], expense["category"], _as_utc(expense["date"])
+        )
+        for budget in budgets:
+            amount = usd_to_currency(expense, budget["currency"])
+            if amount is None:
+                logger.debug(
+                    f"Skipping budget {budget['_id']}: no rate from "
+                    f"{expense['currency']} to {budget['currency']}"
+                )
+                continue
+            updates.append(_apply(budget, expense, amount, batch_ids))
+    await asyncio.gather(*updates)
+
+
+async def get_budget_status(
+    budget: Mapping[str, Any], at: datetime | None = None
+) -> BudgetStatus:
+    """Utilization of a budget for the period containing `at` (default now).
+
+    A single lookup on the unique (budget_id, period_start) index.
+    """
+    start, end = period_bounds(
+        BudgetPeriod(budget["period"]), at or datetime.now(timezone.utc)
+    )
+    usage = await core_data.read_one(
+        config.BUDGET_USAGE_COLLECTION,
+        {"budget_id": str(budget["_id"]), "period_start": start},
+    )
+    if not usage:
+        return BudgetStatus(
+            budget_id=str(budget["_id"]),
+            user_id=budget["user_id"],
+            category=budget["category"],
+            currency=budget["currency"],
+            period_start=start,
+            period_end=end,
+            limit=float(budget["amount"]),
+        )
+    return BudgetStatus(**_status_fields(usage))
+
+
+async def get_budget_status_by_id(
+    budget_id: str, at: datetime | None = None
+) -> BudgetStatus | None:
+    budget = await core_data.read_one("budgets", {"_id": ObjectId(budget_id)})
+    if not budget:
+        return None
+    return await get_budget_status(budget, at)
+
+
+async def rebuild_budget_usage(user_id: str | None = None) -> int:
+    """Recompute budget usage from the expenses collection (backfill/repair).
+
+    Needed after imports of older expenses, deletions and edits, which the
+    running totals never see.
+
+    Args:
+        user_id: Only rebuild this user's budgets; all users when omitted
+
+    Returns:
+        Number of usage documents written
+    """
+    written = 0
+    async for budget in core_data.iter_read(
+        "budgets", {"user_id": user_id} if user_id else {}
+    ):
+        period = BudgetPeriod(budget["period"])
+        spent: dict[datetime, float] = {}
+        async for expense in core_data.iter_read(
+            "expenses",
+            {
+                "user_id": budget["user_id"],
+                "category": budget["category"],
+                "date": {
+                    "$gte": _as_utc(budget["start_date"]),
+                    "$lte": _as_utc(budget["end_date"]),
+                },
+            },
+            projection={
+                "amount": 1,
+                "currency": 1,
+                "converted_amount_usd": 1,
+                "date": 1,
+            },
+        ):
+            amount = usd_to_currency(expense, budget["currency"])
+            if amount is not None:
+                start, _ = period_bounds(period, _as_utc(expense["date"]))
+                spent[start] = spent.get(start, 0.0) + amount
+        budget_id = str(budget["_id"])
+        await core_data.delete(config.BUDGET_USAGE_COLLECTION, {"budget_id": budget_id})
+        if spent:
+            now = datetime.now(timezone.utc)
+            await core_data.bulk_write(
+                config.BUDGET_USAGE_COLLECTION,
+                [
+                    UpdateOne(
+                        {"budget_id": budget_id, "period_start": start},
+                        {
+                            "$set": {
+                                **_usage_fields(
+                                    budget, period_bounds(period, start)[1], total
+                                ),
+                                "updated_at": now,
+                            }
+                        },
+                        upsert=True,
+                    )
+                    for start, total in spent.items()
+                ],
+            )
+        written += len(spent)
+    _seeded.clear()
+    logger.info(f"Budget usage rebuilt for {user_id or 'all users'}: {written} periods")
+    return written
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain budget usage")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user-id", help="Only rebuild this user's budgets")
+    args = parser.parse_args()
+
+    await Database.connect()
+    try:
+        await rebuild_budget_usage(args.user_id)
+    finally:
+        await Database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping
+
+from app.config import config
+from app.database import core_data
+from app.utils.log import logger
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    return " ".join(prompt.split())
+
+
+def make_cache_key(
+    system_prompt: str,
+    user_prompt: str,
+    schema_name: str,
+    settings: Mapping[str, Any],
+) -> str:
+    """Content-addressed key for a structured LLM call.
+
+    The system prompt is part of the hashed content, so editing a prompt
+    invalidates every entry produced with the old text.
+    """
+    payload = json.dumps(
+        [
+            normalize_prompt(system_prompt),
+            normalize_prompt(user_prompt),
+            schema_name,
+            dict(settings),
+        ],
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheTier(ABC):
+    """A single storage layer of the response cache."""
+
+    name: str = "tier"
+
+    @abstractmethod
+    async def get(self, key: str) -> Any | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any) -> None: ...
+
+    @abstractmethod
+    async def clear(self) -> None: ...
+
+
+class LRUCacheTier(CacheTier):
+    """In-process LRU with per-entry TTL."""
+
+    name = "lru"
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MongoCacheTier(CacheTier):
+    """Cache entries shared between workers through a Mongo collection.
+
+    Expiry is enforced on read and by the TTL index on `expires_at`
+    in app/database/indexes.py.
+    """
+
+    name = "shared"
+
+    def __init__(self, collection_name: str, ttl_seconds: float):
+        self.collection_name = collection_name
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> Any | None:
+        document = await core_data.read_one(
+            self.collection_name,
+            {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"value": 1},
+        )
+        return document.get("value")
+
+    async def set(self, key: str, value: Any) -> None:
+        now = datetime.now(timezone.utc)
+        await core_data.update_one(
+            self.collection_name,
+            {"_id": key},
+            {
+                "$set": {
+                    "value": value,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                }
+            },
+            upsert=True,
+        )
+
+    async def clear(self) -> None:
+        await core_data.delete(self.collection_name, {})
+
+
+class ResponseCache:
+    """Read-through cache over one or more tiers, fastest first.
+
+    A hit in a slower tier is promoted into the faster ones. Failures in a
+    tier are logged and treated as a miss so the cache never fails a call.
+    """
+
+    def __init__(self, tiers: list[CacheTier]):
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+        self.tier_hits: dict[str, int] = {tier.name: 0 for tier in tiers}
+
+    async def get(self, key: str) -> Any | None:
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = await tier.get(key)
+            except Exception as e:
+                logger.warning(f"Cache tier '{tier.name}' read failed: {e}")
+                continue
+            if value is not None:
+                self.hits += 1
+                self.tier_hits[tier.name] += 1
+                for faster in self.tiers[:index]:
+                    await faster.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        for tier in self.tiers:
+            try:
+                await tier.set(key, value)
+            except Exception as e:
+                logger.warning(f"Cache tier '{tier.name}' write failed: {e}")
+
+    async def clear(self) -> None:
+        for tier in self.tiers:
+            await tier.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        stats: dict[str, Any] = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "tier_hits": dict(self.tier_hits),
+        }
+        for tier in self.tiers:
+            if isinstance(tier, LRUCacheTier):
+                stats["entries"] = len(tier)
+                stats["evictions"] = tier.evictions
+                stats["expirations"] = tier.expirations
+        return stats
+
+
+def build_response_cache() -> ResponseCache | None:
+    """Build the LLM response cache from configuration."""
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    tiers: list[CacheTier] = [
+        LRUCacheTier(config.LLM_CACHE_MAX_ENTRIES, config.LLM_CACHE_TTL_SECONDS)
+    ]
+    if config.LLM_CACHE_SHARED:
+        tiers.append(
+            MongoCacheTier(config.LLM_CACHE_COLLECTION, config.LLM_CACHE_TTL_SECONDS)
+        )
+    return ResponseCache(tiers)
@@ -0,0 +1,243 @@
+"""Historical exchange rates and vectorized conversion to USD.
+
+Rates are "USD per one unit of currency" for a given day, loaded either from
+a CSV file (columns: date, currency, usd_per_unit) or from the `fx_rates`
+collection (fields: date, currency, usd_per_unit). Each currency is held as
+two date-sorted NumPy arrays, so converting a batch is one `searchsorted`
+per currency instead of a lookup per expense.
+"""
+
+import argparse
+import asyncio
+import csv
+from datetime import date, datetime, timezone
+from typing import Any, Iterable, Mapping, MutableMapping, Sequence
+
+import numpy as np
+from pymongo import UpdateOne
+
+from app.config import config
+from app.database import core_data
+from app.database.db import Database
+from app.services import rollups
+from app.utils.log import logger
+
+BASE_CURRENCY = "USD"
+
+_EPOCH = date(1970, 1, 1)
+
+
+def epoch_day(value: date | datetime | str) -> int:
+    """Days since 1970-01-01 (UTC) of a date, datetime or ISO string."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        value = value.date()
+    return (value - _EPOCH).days
+
+
+class RateTable:
+    """As-of lookup of daily USD rates per currency."""
+
+    def __init__(self, max_staleness_days: int = config.FX_MAX_STALENESS_DAYS):
+        self.max_staleness_days = max_staleness_days
+        self._days: dict[str, np.ndarray] = {}
+        self._rates: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_rows(
+        cls, rows: Iterable[tuple[date | datetime | str, str, float]], **kwargs
+    ) -> "RateTable":
+        columns: dict[str, tuple[list[int], list[float]]] = {}
+        for day, currency, rate in rows:
+            days, rates = columns.setdefault(currency.upper(), ([], []))
+            days.append(epoch_day(day))
+            rates.append(float(rate))
+        table = cls(**kwargs)
+        for currency, (days, rates) in columns.items():
+            day_array = np.asarray(days, dtype=np.int64)
+            order = np.argsort(day_array, kind="stable")
+            table._days[currency] = day_array[order]
+            table._rates[currency] = np.asarray(rates, dtype=np.float64)[order]
+        return table
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs) -> "RateTable":
+        with open(path, newline="", encoding="utf-8") as handle:
+            return cls.from_rows(
+                (
+                    (row["date"], row["currency"], row["usd_per_unit"])
+                    for row in csv.DictReader(handle)
+                ),
+                **kwargs,
+            )
+
+    @property
+    def currencies(self) -> list[str]:
+        return [BASE_CURRENCY, *sorted(self._days)]
+
+    def __len__(self) -> int:
+        return sum(len(days) for days in self._days.values())
+
+    def usd_rates(
+        self, currencies: Sequence[str] | np.ndarray, days: Sequence[int] | np.ndarray
+    ) -> np.ndarray:
+        """USD per unit for each (currency, epoch day); NaN where unknown/stale."""
+        currencies = np.asarray(currencies, dtype="U3")
+        days = np.asarray(days, dtype=np.int64)
+        rates = np.full(len(days), np.nan)
+        for currency in np.unique(currencies):
+            mask = currencies == currency
+            if currency == BASE_CURRENCY:
+                rates[mask] = 1.0
+                continue
+            known_days = self._days.get(currency)
+            if known_days is None:
+                continue
+            wanted = days[mask]
+            # Most recent rate on or before each wanted day
+            index = np.searchsorted(known_days, wanted, side="right") - 1
+            found = index >= 0
+            index = np.clip(index, 0, None)
+            fresh = found & (wanted - known_days[index] <= self.max_staleness_days)
+            rates[mask] = np.where(fresh, self._rates[currency][index], np.nan)
+        return rates
+
+    def convert_to_usd(
+        self,
+        amounts: Sequence[float] | np.ndarray,
+        currencies: Sequence[str] | np.ndarray,
+        days: Sequence[int] | np.ndarray,
+    ) -> np.ndarray:
+        return np.asarray(amounts, dtype=np.float64) * self.usd_rates(currencies, days)
+
+    def convert_from_usd(
+        self, amount_usd: float, currency: str, day: int
+    ) -> float | None:
+        rate = self.usd_rates([currency], [day])[0]
+        if np.isnan(rate) or rate == 0:
+            return None
+        return float(amount_usd / rate)
+
+
+_rate_table = RateTable()
+
+
+def get_rate_table() -> RateTable:
+    return _rate_table
+
+
+async def load_rates() -> RateTable:
+    """Load rates into the process-wide table from FX_RATES_PATH or Mongo."""
+    global _rate_table
+    if config.FX_RATES_PATH:
+        _rate_table = RateTable.from_csv(config.FX_RATES_PATH)
+    else:
+        try:
+            documents = await core_data.query_read(
+                config.FX_RATES_COLLECTION,
+                [{"$project": {"_id": 0, "date": 1, "currency": 1, "usd_per_unit": 1}}],
+            )
+        except RuntimeError as e:
+            logger.warning(f"Exchange rates not loaded: {e}")
+            return _rate_table
+        _rate_table = RateTable.from_rows(
+            (doc["date"], doc["currency"], doc["usd_per_unit"]) for doc in documents
+        )
+    logger.info(
+        f"Loaded {len(_rate_table)} exchange rates for {_rate_table.currencies}"
+    )
+    return _rate_table
+
+
+def apply_usd_conversion(documents: Sequence[MutableMapping[str, Any]]) -> None:
+    """Set `converted_amount_usd` on expense documents in one vectorized pass.
+
+    Documents whose rate is unknown get None, so they can be backfilled later.
+    """
+    if not documents:
+        return
+    converted = _rate_table.convert_to_usd(
+        [document["amount"] for document in documents],
+        [document["currency"] for document in documents],
+        [epoch_day(document["date"]) for document in documents],
+    )
+    for document, value in zip(documents, converted.tolist()):
+        document["converted_amount_usd"] = None if np.isnan(value) else round(value, 4)
+
+
+async def backfill_converted_amounts(batch_size: int = 1000) -> int:
+    """Fill `converted_amount_usd` on stored expenses that lack it.
+
+    Walks the matching expenses in _id order, converting and writing each
+    batch with a single unordered bulk write.
+
+    Returns:
+        Number of expenses updated
+    """
+    updated = 0
+    last_id = None
+    while True:
+        match: dict[str, Any] = {"converted_amount_usd": None}
+        if last_id is not None:
+            match["_id"] = {"$gt": last_id}
+        batch = await core_data.query_read(
+            "expenses",
+            [
+                {"$match": match},
+                {"$sort": {"_id": 1}},
+                {"$limit": batch_size},
+                {"$project": {"amount": 1, "currency": 1, "date": 1}},
+            ],
+        )
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        apply_usd_conversion(batch)
+        requests = [
+            UpdateOne(
+                {"_id": document["_id"]},
+                {"$set": {"converted_amount_usd": document["converted_amount_usd"]}},
+            )
+            for document in batch
+            if document["converted_amount_usd"] is not None
+        ]
+        if requests:
+            await core_data.bulk_write("expenses", requests)
+            updated += len(requests)
+    logger.info(f"Backfilled converted_amount_usd on {updated} expenses")
+    return updated
+
+
+def usd_to_currency(expense: Mapping[str, Any], currency: str) -> float | None:
+    """Amount of an expense expressed in another currency, via its USD value."""
+    if expense.get("currency") == currency:
+        return float(expense["amount"])
+    amount_usd = expense.get("converted_amount_usd")
+    if amount_usd is None:
+        return None
+    return _rate_table.convert_from_usd(
+        amount_usd, currency, epoch_day(expense["date"])
+    )
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Exchange rate maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    await Database.connect()
+    try:
+        await load_rates()
+        if await backfill_converted_amounts(args.batch_size):
+            # USD totals in the rollups were summed without these amounts
+            await rollups.rebuild_rollups()
+    finally:
+        await Database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
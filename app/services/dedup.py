@@ -0,0 +1,352 @@
+"""Duplicate expense detection, so resubmissions and re-run imports are idempotent.
+
+An expense's fingerprint hashes its source transaction id when it has one
+(bank exports), else (user, amount, currency, normalized merchant, day)
+plus its ordinal among identical expenses: two $2.75 bus fares on the same
+day are ordinals 0 and 1, not one expense seen twice. Fingerprints are
+stored under a unique (user_id, fingerprint) index, which is what finally
+keeps duplicates out:
+
+- An import numbers identical rows in order of appearance, so re-running
+  it (or an overlapping statement) reproduces the same fingerprints.
+- An interactive submission takes the first ordinal not stored yet, so it
+  is always kept; resubmissions are caught by the near-duplicate window
+  instead: the same amount and merchant within DEDUP_WINDOW_MINUTES.
+
+Each user has an in-memory Bloom filter of their fingerprints: an ordinal
+the filter has never seen is free for sure, so only possible repeats cost
+a lookup. The filters and the near-duplicate window are per process; the
+unique index covers whatever they miss.
+"""
+
+import asyncio
+import hashlib
+import math
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Iterable, Mapping
+
+from app.config import config
+from app.database import core_data
+from app.services.merchants import normalize_merchant
+from app.utils.log import logger
+from app.utils.metrics import Counter
+
+DUPLICATE_KEY = 11000
+
+# Fingerprints a new filter is sized for, at the least
+MIN_BLOOM_CAPACITY = 1024
+
+# (seconds since epoch, amount, currency, merchant, expense _id)
+RecentExpense = tuple[float, float, str, str, str]
+
+
+def _identity(document: Mapping[str, Any]) -> str:
+    if document.get("source_id"):
+        return f"{document['user_id']}|id:{document['source_id']}"
+    day = document["date"]
+    day = day.date().isoformat() if isinstance(day, datetime) else str(day)[:10]
+    return "|".join(
+        (
+            str(document["user_id"]),
+            f"{float(document['amount']):.2f}",
+            str(document["currency"]),
+            normalize_merchant(document.get("merchant") or ""),
+            day,
+        )
+    )
+
+
+def fingerprint(document: Mapping[str, Any], ordinal: int = 0) -> str:
+    """Fingerprint of the `ordinal`-th expense identical to `document`.
+
+    Ordinals do not apply to documents with a source transaction id.
+    """
+    key = _identity(document)
+    if ordinal and not document.get("source_id"):
+        key = f"{key}|#{ordinal}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def apply_fingerprints(
+    documents: Iterable[dict[str, Any]], seen: dict[str, int] | None = None
+) -> None:
+    """Fingerprint imported documents, numbering identical ones in order.
+
+    Args:
+        seen: Occurrences counted so far, by identity, to carry the
+            numbering across the batches of one import
+    """
+    seen = {} if seen is None else seen
+    for document in documents:
+        identity = _identity(document)
+        ordinal = seen.get(identity, 0)
+        seen[identity] = ordinal + 1
+        document["fingerprint"] = fingerprint(document, ordinal)
+
+
+def is_fingerprint_conflict(error: Mapping[str, Any]) -> bool:
+    """Whether a write error is a duplicate fingerprint (not a duplicate _id)."""
+    return error.get("code") == DUPLICATE_KEY and "fingerprint" in (
+        error.get("keyPattern") or {}
+    )
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over hex fingerprints (double hashing)."""
+
+    def __init__(
+        self, capacity: int, error_rate: float = config.DEDUP_BLOOM_ERROR_RATE
+    ):
+        self.capacity = capacity
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _positions(self, value: str) -> Iterable[int]:
+        first, second = int(value[:16], 16), int(value[16:32], 16) | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class _UserState:
+    __slots__ = ("bloom", "recent", "claimed", "lock")
+
+    def __init__(self):
+        self.bloom: BloomFilter | None = None
+        self.recent: deque[RecentExpense] = deque()
+        # Fingerprints handed out here whose expenses are not stored yet → _id
+        self.claimed: dict[str, str] = {}
+        self.lock = asyncio.Lock()
+
+
+class Deduplicator:
+    def __init__(
+        self,
+        collection_name: str = "expenses",
+        window_minutes: float = config.DEDUP_WINDOW_MINUTES,
+        max_users: int = config.DEDUP_BLOOM_USERS,
+    ):
+        self.collection_name = collection_name
+        self.window = window_minutes * 60
+        self.max_users = max_users
+        self._users: OrderedDict[str, _UserState] = OrderedDict()
+        self.checks: dict[str, int] = {}
+
+    def _user(self, user_id: str) -> _UserState:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+        return state
+
+    def _count(self, result: str) -> None:
+        self.checks[result] = self.checks.get(result, 0) + 1
+
+    async def claim(
+        self, documents: list[dict[str, Any]], check_window: bool = True
+    ) -> list[str | None]:
+        """Fingerprint new submissions of one user, in order.
+
+        Documents matching an expense in the near-duplicate window are
+        resubmissions: they get no fingerprint and their result is the _id
+        they duplicate. Every other document is claimed: it gets the first
+        ordinal neither stored nor claimed (documents of the same call are
+        distinct expenses) and opens the window for later resubmissions.
+        Release documents that end up not being stored.
+
+        Args:
+            documents: Expenses of a single user, with their _id set
+            check_window: Whether to look for resubmissions at all
+
+        Returns:
+            The duplicated _id, or None for each claimed document
+        """
+        if not documents:
+            return []
+        state = self._user(documents[0]["user_id"])
+        # Claims of one user are serialized, so two concurrent submissions
+        # can neither both miss each other nor take the same ordinal
+        async with state.lock:
+            duplicates = [
+                self._near_duplicate(state, document) if check_window else None
+                for document in documents
+            ]
+            if state.bloom is None:
+                state.bloom = await self._load_bloom(documents[0]["user_id"])
+            next_ordinal: dict[str, int] = {}
+            for index, document in enumerate(documents):
+                if duplicates[index] is not None:
+                    self._count("near_duplicate")
+                    continue
+                identity = _identity(document)
+                ordinal = next_ordinal.get(identity, 0)
+                value = fingerprint(document, ordinal)
+                while True:
+                    holder = await self._holder(state, document, value)
+                    if holder is None:
+                        break
+                    if document.get("source_id"):
+                        # The same bank transaction, not a repeat
+                        duplicates[index] = holder
+                        break
+                    ordinal += 1
+                    value = fingerprint(document, ordinal)
+                if duplicates[index] is not None:
+                    self._count("duplicate")
+                    continue
+                self._count("repeat" if ordinal else "new")
+                next_ordinal[identity] = ordinal + 1
+                document["fingerprint"] = value
+                state.claimed[value] = str(document["_id"])
+                self.remember(document)
+            return duplicates
+
+    async def reclaim(self, document: dict[str, Any]) -> str | None:
+        """Claim the next ordinal for a document whose fingerprint was taken.
+
+        Claims are only exclusive within a process: another one may store
+        an identical expense first, and the unique index then rejects this
+        one. It is a repeat, not a duplicate, unless it has a source
+        transaction id.
+
+        Returns:
+            The _id of the stored expense with the same source transaction
+            id, or None once the document holds a free fingerprint
+        """
+        # The fingerprint is stored, under the other expense
+        self.record([document])
+        (holder,) = await self.claim([document], check_window=False)
+        return holder
+
+    async def _holder(
+        self, state: _UserState, document: Mapping[str, Any], value: str
+    ) -> str | None:
+        """_id of the expense stored or claimed with this fingerprint, if any."""
+        if value in state.claimed:
+            return state.claimed[value]
+        if state.bloom is None or value not in state.bloom:
+            return None
+        existing = await self.find_existing({**document, "fingerprint": value})
+        if existing is None:
+            self._count("false_positive")
+        return existing
+
+    def release(self, documents: Iterable[Mapping[str, Any]]) -> None:
+        """Give back the claims of documents that were not stored."""
+        for document in documents:
+            state = self._users.get(document["user_id"])
+            if state is None:
+                continue
+            state.claimed.pop(document.get("fingerprint"), None)
+            expense_id = str(document.get("_id"))
+            state.recent = deque(
+                recent for recent in state.recent if recent[-1] != expense_id
+            )
+
+    async def find_existing(self, document: Mapping[str, Any]) -> str | None:
+        found = await core_data.read_one(
+            self.collection_name,
+            {"user_id": document["user_id"], "fingerprint": document["fingerprint"]},
+            {"_id": 1},
+        )
+        return str(found["_id"]) if found else None
+
+    def _near_duplicate(
+        self, state: _UserState, document: Mapping[str, Any]
+    ) -> str | None:
+        if self.window <= 0:
+            return None
+        horizon = time.time() - self.window
+        while state.recent and state.recent[0][0] < horizon:
+            state.recent.popleft()
+        amount = float(document["amount"])
+        merchant = normalize_merchant(document.get("merchant") or "")
+        for _, seen_amount, currency, seen_merchant, expense_id in state.recent:
+            if (
+                seen_amount == amount
+                and currency == document["currency"]
+                and seen_merchant == merchant
+            ):
+                return expense_id
+        return None
+
+    async def _load_bloom(self, user_id: str) -> BloomFilter:
+        """Filter of the user's stored fingerprints, read from the unique index."""
+        fingerprints = [
+            document["fingerprint"]
+            async for document in core_data.iter_read(
+                self.collection_name,
+                {"user_id": user_id, "fingerprint": {"$type": "string"}},
+                projection={"_id": 0, "fingerprint": 1},
+            )
+        ]
+        bloom = BloomFilter(max(MIN_BLOOM_CAPACITY, 2 * len(fingerprints)))
+        for value in fingerprints:
+            bloom.add(value)
+        logger.debug(f"Loaded {len(fingerprints)} fingerprints for {user_id}")
+        return bloom
+
+    def record(self, documents: Iterable[Mapping[str, Any]]) -> None:
+        """Add stored fingerprints to the filters already loaded."""
+        for document in documents:
+            state = self._users.get(document["user_id"])
+            if state is None or not document.get("fingerprint"):
+                continue
+            state.claimed.pop(document["fingerprint"], None)
+            if state.bloom is None:
+                continue
+            state.bloom.add(document["fingerprint"])
+            if len(state.bloom) > state.bloom.capacity:
+                # Past its capacity the error rate climbs; reload it bigger
+                state.bloom = None
+
+    def remember(self, document: Mapping[str, Any]) -> None:
+        """Open the near-duplicate window for an accepted submission."""
+        if self.window <= 0:
+            return
+        self._user(document["user_id"]).recent.append(
+            (
+                time.time(),
+                float(document["amount"]),
+                document["currency"],
+                normalize_merchant(document.get("merchant") or ""),
+                str(document["_id"]),
+            )
+        )
+
+
+deduplicator = Deduplicator()
+
+Counter(
+    "expense_dedup_checks_total",
+    "Duplicate checks of submitted expenses by result",
+    ("result",),
+    function=lambda: {
+        (result,): count for result, count in deduplicator.checks.items()
+    },
+)
+
+
+async def record_expenses(documents: Iterable[Mapping[str, Any]]) -> None:
+    """Add newly stored fingerprints to the users' filters."""
+    deduplicator.record(documents)
@@ -0,0 +1,123 @@
+from datetime import date, datetime, timedelta, timezone
+from enum import Enum
+from typing import Any
+
+from app.models.agent import ExpenseExtraction, ExpenseValidation
+from app.services.merchants import merchant_index
+from app.utils.nlp_parser import DEFAULT_CATEGORY, categorize
+
+HIGH_AMOUNT_THRESHOLD = 10_000.0
+
+# Active ISO 4217 currency codes
+ISO_4217_CODES = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB
+    BRL BSD BTN BWP BYN BZD CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP
+    DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD GNF GTQ GYD HKD HNL HTG HUF
+    IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW KWD KYD KZT LAK
+    LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK MXN MYR MZN
+    NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF
+    SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP STN SVC SYP SZL THB TJS TMT TND
+    TOP TRY TTD TWD TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XCD XOF XPF YER
+    ZAR ZMW ZWL
+    """.split())
+
+
+class ExpenseValidator:
+    """Deterministic implementation of the rules in the process_expense prompt."""
+
+    def __init__(self, high_amount_threshold: float = HIGH_AMOUNT_THRESHOLD):
+        self.high_amount_threshold = high_amount_threshold
+
+    def validate(
+        self,
+        data: ExpenseExtraction | dict[str, Any],
+        today: date | None = None,
+        user_id: str | None = None,
+    ) -> ExpenseValidation:
+        """Validate parsed expense data.
+
+        Args:
+            data: Parsed expense, as a model or a raw dict
+            today: Reference date for the future-date check (defaults to UTC today)
+            user_id: Owner of the expense, whose own merchant filings come first
+
+        Returns:
+            ExpenseValidation with errors, warnings and the original data
+        """
+        if isinstance(data, ExpenseExtraction):
+            fields = data.model_dump()
+        else:
+            fields = dict(data)
+        errors: list[str] = []
+        warnings: list[str] = []
+
+        amount = fields.get("amount")
+        if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+            errors.append(f"Amount '{amount}' is not a number.")
+        elif amount <= 0:
+            errors.append(f"Amount {amount} must be greater than zero.")
+        elif amount > self.high_amount_threshold:
+            warnings.append(
+                f"Amount {amount} is suspiciously high (over {self.high_amount_threshold:,.0f})."
+            )
+
+        currency = fields.get("currency")
+        if isinstance(currency, Enum):
+            currency = currency.value
+        if not currency:
+            errors.append("Currency is missing.")
+        elif currency not in ISO_4217_CODES:
+            errors.append(f"Currency '{currency}' is not a valid ISO 4217 code.")
+
+        merchant = fields.get("merchant") or ""
+        category = fields.get("category") or ""
+        expected = self.expected_category(merchant, user_id)
+        if expected is not None and expected != category:
+            warnings.append(
+                f"Category '{category}' does not fit typical merchants like '{merchant}'."
+            )
+
+        error = self._check_date(fields.get("date"), today)
+        if error:
+            errors.append(error)
+
+        return ExpenseValidation(
+            is_valid=not errors, errors=errors, warnings=warnings, data=fields
+        )
+
+    def expected_category(
+        self, merchant: str, user_id: str | None = None
+    ) -> str | None:
+        """Category implied by the merchant name, or None if it is unknown."""
+        if not merchant:
+            return None
+        return merchant_index.category(merchant, user_id) or categorize(merchant)
+
+    def needs_category_review(
+        self, data: ExpenseExtraction, user_id: str | None = None
+    ) -> bool:
+        """Whether the merchant/category fit can only be judged by the LLM."""
+        return (
+            bool(data.merchant)
+            and data.category != DEFAULT_CATEGORY
+            and self.expected_category(data.merchant, user_id) is None
+        )
+
+    @staticmethod
+    def _check_date(value: Any, today: date | None) -> str | None:
+        if value is None or value == "":
+            return "Date is missing."
+        if isinstance(value, datetime):
+            parsed = value.date()
+        elif isinstance(value, date):
+            parsed = value
+        else:
+            try:
+                parsed = datetime.fromisoformat(str(value).strip()).date()
+            except ValueError:
+                return f"Date '{value}' is not a valid YYYY-MM-DD date."
+        today = today or datetime.now(timezone.utc).date()
+        # One day of slack for users ahead of UTC
+        if parsed > today + timedelta(days=1):
+            return f"Date {parsed.isoformat()} is in the future."
+        return None
@@ -0,0 +1,380 @@
+import argparse
+import asyncio
+import csv
+from typing import Any, AsyncIterable, Iterable, Iterator, Mapping, Sequence
+
+import dateparser
+from pymongo.errors import BulkWriteError
+
+from app.agents.agent import Agent
+from app.config import config
+from app.database import core_data
+from app.database.db import Database
+from app.models.agent import ExpenseExtraction, IngestionReport
+from app.services import currency, dedup
+from app.services.batcher import ExpenseParseBatcher
+from app.utils.enums import AmountSign, RequestPriority
+from app.utils.log import logger
+from app.utils.nlp_parser import (
+    DEFAULT_CATEGORY,
+    categorize,
+    extract_currency,
+    parse_date,
+)
+
+MAX_REPORTED_ERRORS = 50
+
+# Column names seen in common bank/card exports, by ExpenseExtraction field
+COLUMN_ALIASES: dict[str, tuple[str, ...]] = {
+    "amount": ("amount", "value", "transaction amount"),
+    "debit": ("debit", "withdrawal", "debit amount", "paid out", "money out"),
+    "credit": ("credit", "deposit", "credit amount", "paid in", "money in"),
+    "type": ("type", "transaction type", "dr/cr", "cr/dr", "debit/credit"),
+    "currency": ("currency", "ccy", "currency code"),
+    "merchant": ("merchant", "payee", "description", "name", "narration"),
+    "category": ("category",),
+    "date": ("date", "transaction date", "posted date", "posting date", "value date"),
+    "note": ("note", "notes", "memo", "reference"),
+    "source_id": (
+        "transaction id",
+        "transaction reference",
+        "reference number",
+        "fitid",
+    ),
+}
+# Values of a transaction type column marking money in
+CREDIT_TYPES = {"credit", "cr", "deposit", "refund", "payment", "reversal"}
+
+_AMOUNT_NOISE = str.maketrans("", "", ",$€£₹¥ ")
+_SENTINEL = object()
+
+
+def read_csv_rows(path: str, encoding: str = "utf-8-sig") -> Iterator[dict[str, str]]:
+    """Stream rows of a CSV/bank export without loading the whole file."""
+    with open(path, newline="", encoding=encoding) as handle:
+        yield from csv.DictReader(handle)
+
+
+def _row_fields(row: Mapping[str, Any]) -> dict[str, str]:
+    columns = {str(key).strip().lower(): value for key, value in row.items() if key}
+    fields: dict[str, str] = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            value = columns.get(alias)
+            if value not in (None, ""):
+                fields[field] = str(value).strip()
+                break
+    return fields
+
+
+def _to_amount(value: str) -> float:
+    value = value.translate(_AMOUNT_NOISE)
+    # Accountants write negatives as (12.50)
+    if value.startswith("(") and value.endswith(")"):
+        value = "-" + value[1:-1]
+    return float(value)
+
+
+def _row_date(value: str) -> str | None:
+    """ISO day of an export date ("2024-01-15", "01/15/2024", "15 Jan 2024")."""
+    parsed = parse_date(value) or dateparser.parse(
+        value, settings={"PREFER_DATES_FROM": "past"}
+    )
+    return parsed.date().isoformat() if parsed else None
+
+
+def row_amount(
+    row: Mapping[str, Any],
+    amount_sign: AmountSign = AmountSign(config.INGEST_AMOUNT_SIGN),
+) -> float | None:
+    """Amount spent in an export row; 0.0 for money in (deposits, refunds, payments).
+
+    Debit/credit columns or a transaction type column decide when present;
+    otherwise the sign of the amount column is read as `amount_sign` says.
+    A single row cannot be inferred from: INFER reads it as debits negative.
+    Returns None when the row has no readable amount.
+    """
+    fields = _row_fields(row)
+    try:
+        if "debit" in fields and _to_amount(fields["debit"]):
+            return abs(_to_amount(fields["debit"]))
+        if "credit" in fields and _to_amount(fields["credit"]):
+            return 0.0
+        if "amount" not in fields:
+            return None
+        amount = _to_amount(fields["amount"])
+    except ValueError:
+        return None
+    if "type" in fields:
+        return 0.0 if fields["type"].lower() in CREDIT_TYPES else abs(amount)
+    if amount_sign in (AmountSign.DEBITS_NEGATIVE, AmountSign.INFER):
+        return max(-amount, 0.0)
+    if amount_sign is AmountSign.DEBITS_POSITIVE:
+        return max(amount, 0.0)
+    return abs(amount)
+
+
+def infer_amount_sign(rows: Iterable[Mapping[str, Any]]) -> AmountSign:
+    """Sign convention of an export: debits negative if any amount is negative.
+
+    Exports that list only money spent often leave it positive; reading
+    them as debits negative would class every row as a credit.
+    """
+    for row in rows:
+        fields = _row_fields(row)
+        if "amount" not in fields or "debit" in fields or "type" in fields:
+            continue
+        try:
+            if _to_amount(fields["amount"]) < 0:
+                return AmountSign.DEBITS_NEGATIVE
+        except ValueError:
+            continue
+    return AmountSign.UNSIGNED
+
+
+def row_to_extraction(
+    row: Mapping[str, Any],
+    amount_sign: AmountSign = AmountSign(config.INGEST_AMOUNT_SIGN),
+) -> ExpenseExtraction | None:
+    """Map a structured export row to an ExpenseExtraction without the LLM.
+
+    Returns None when the row lacks an amount, merchant or readable date, in
+    which case the caller should fall back to parsing the row as text. Rows
+    of money in are not expenses: check them with `row_amount` first.
+    """
+    fields = _row_fields(row)
+    amount = row_amount(row, amount_sign)
+    date = _row_date(fields["date"]) if "date" in fields else None
+    if not amount or "merchant" not in fields or date is None:
+        return None
+    return ExpenseExtraction(
+        amount=amount,
+        currency=fields.get("currency", "").upper()
+        or extract_currency(fields.get("amount") or fields.get("debit", ""))
+        or "USD",
+        merchant=fields["merchant"],
+        category=fields.get("category")
+        or categorize(fields["merchant"])
+        or DEFAULT_CATEGORY,
+        date=date,
+        note=fields.get("note", ""),
+    )
+
+
+class BulkIngestor:
+    """Bounded-concurrency parse → validate → persist pipeline.
+
+    Items are pulled from the source into a bounded queue, so a fast source
+    waits for the workers instead of buffering everything in memory. Valid
+    expenses are written with unordered `insert_many` batches.
+
+    AmountSign.INFER reads a sequence of rows twice, to infer the sign
+    convention first; other sources can only be read once and are read as
+    debits negative (CSV files are inferred by `ingest_csv`).
+    """
+
+    def __init__(
+        self,
+        agent: Agent,
+        user_id: str,
+        concurrency: int = config.INGEST_CONCURRENCY,
+        batch_size: int = config.INGEST_BATCH_SIZE,
+        queue_size: int = config.INGEST_QUEUE_SIZE,
+        amount_sign: AmountSign = AmountSign(config.INGEST_AMOUNT_SIGN),
+    ):
+        self.agent = agent
+        self.user_id = user_id
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.amount_sign = amount_sign
+        self.batcher = ExpenseParseBatcher(agent)
+
+    async def ingest(
+        self,
+        source: (
+            Iterable[str | Mapping[str, Any]] | AsyncIterable[str | Mapping[str, Any]]
+        ),
+    ) -> IngestionReport:
+        """Ingest raw texts and/or structured rows.
+
+        Args:
+            source: Sync or async iterable of raw expense texts or export rows
+
+        Returns:
+            IngestionReport with per-stage counts
+        """
+        report = IngestionReport()
+        amount_sign = self.amount_sign
+        if amount_sign is AmountSign.INFER and isinstance(source, Sequence):
+            amount_sign = infer_amount_sign(
+                item for item in source if isinstance(item, Mapping)
+            )
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        buffer: list[dict[str, Any]] = []
+        # Identical rows seen so far, so each gets its own fingerprint
+        seen: dict[str, int] = {}
+
+        async def produce() -> None:
+            try:
+                if isinstance(source, AsyncIterable):
+                    async for item in source:
+                        await queue.put(item)
+                else:
+                    for item in source:
+                        await queue.put(item)
+            finally:
+                for _ in range(self.concurrency):
+                    await queue.put(_SENTINEL)
+
+        async def work() -> None:
+            while True:
+                item = await queue.get()
+                if item is _SENTINEL:
+                    return
+                report.received += 1
+                document = await self._process(item, report, amount_sign)
+                if document is not None:
+                    buffer.append(document)
+                    if len(buffer) >= self.batch_size:
+                        batch = buffer[:]
+                        buffer.clear()
+                        await self._flush(batch, report, seen)
+
+        await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+        await self.batcher.close()
+        if buffer:
+            await self._flush(buffer, report, seen)
+        if report.credits and report.credits == report.received:
+            self._record_error(
+                report,
+                f"Every row was read as money in under {amount_sign.value}: "
+                "check the amount sign convention of the export",
+            )
+        logger.info(
+            f"Ingestion finished for {self.user_id}: {report.model_dump(exclude={'errors'})}"
+        )
+        return report
+
+    async def _process(
+        self,
+        item: str | Mapping[str, Any],
+        report: IngestionReport,
+        amount_sign: AmountSign,
+    ) -> dict[str, Any] | None:
+        try:
+            parsed = None
+            source_id = None
+            if isinstance(item, Mapping):
+                source_id = _row_fields(item).get("source_id")
+                if row_amount(item, amount_sign) == 0.0:
+                    report.credits += 1
+                    return None
+                parsed = row_to_extraction(item, amount_sign)
+                if parsed is None:
+                    item = " ".join(str(value) for value in item.values() if value)
+            if parsed is None:
+                parsed = ExpenseExtraction.model_validate(
+                    await self.batcher.parse(item, priority=RequestPriority.BULK)
+                )
+            report.parsed += 1
+
+            validation = await self.agent.validate_expense(
+                parsed, llm_fallback=False, user_id=self.user_id
+            )
+            if not validation.is_valid:
+                report.invalid += 1
+                self._record_error(report, f"{item!r}: {validation.errors}")
+                return None
+            document = self.agent.build_expense(parsed, self.user_id).model_dump()
+            document["source_id"] = source_id
+            return document
+        except Exception as e:
+            report.failed += 1
+            self._record_error(report, f"{item!r}: {e}")
+            return None
+
+    async def _flush(
+        self,
+        documents: list[dict[str, Any]],
+        report: IngestionReport,
+        seen: dict[str, int],
+    ) -> None:
+        currency.apply_usd_conversion(documents)
+        # Rows stored by an earlier run hit the unique fingerprint index
+        dedup.apply_fingerprints(documents, seen)
+        try:
+            await core_data.insert_many(documents, "expenses", ordered=False)
+            inserted = documents
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            duplicates = {
+                error["index"]
+                for error in errors
+                if dedup.is_fingerprint_conflict(error)
+            }
+            failures = [error for error in errors if error["index"] not in duplicates]
+            skipped = duplicates | {error["index"] for error in failures}
+            inserted = [d for i, d in enumerate(documents) if i not in skipped]
+            report.duplicates += len(duplicates)
+            report.failed += len(failures)
+            if failures:
+                self._record_error(report, f"Bulk insert: {failures[:5]}")
+        except Exception as e:
+            report.failed += len(documents)
+            self._record_error(report, f"Bulk insert of {len(documents)} failed: {e}")
+            return
+        report.inserted += len(inserted)
+        await self.agent.after_insert(inserted)
+
+    @staticmethod
+    def _record_error(report: IngestionReport, error: str) -> None:
+        if len(report.errors) < MAX_REPORTED_ERRORS:
+            report.errors.append(error)
+
+
+async def ingest_csv(ingestor: BulkIngestor, path: str) -> IngestionReport:
+    """Ingest a CSV export, inferring its sign convention with a first pass."""
+    if ingestor.amount_sign is AmountSign.INFER:
+        ingestor.amount_sign = infer_amount_sign(read_csv_rows(path))
+        logger.info(f"Reading amounts of {path} as {ingestor.amount_sign.value}")
+    return await ingestor.ingest(read_csv_rows(path))
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import expenses")
+    parser.add_argument(
+        "path", help="CSV export, or a text file with one expense per line"
+    )
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument(
+        "--text", action="store_true", help="Treat input as plain text lines"
+    )
+    parser.add_argument(
+        "--amount-sign",
+        choices=[sign.value for sign in AmountSign],
+        default=config.INGEST_AMOUNT_SIGN,
+        help="How a single signed amount column marks money spent",
+    )
+    args = parser.parse_args()
+
+    await Database.connect()
+    try:
+        if args.text:
+            with open(args.path, encoding="utf-8") as handle:
+                source = (line.strip() for line in handle if line.strip())
+                report = await BulkIngestor(Agent(), args.user_id).ingest(source)
+        else:
+            report = await ingest_csv(
+                BulkIngestor(
+                    Agent(), args.user_id, amount_sign=AmountSign(args.amount_sign)
+                ),
+                args.path,
+            )
+        print(report.model_dump_json(indent=2))
+    finally:
+        await Database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,55 +1,336 @@
 # from app.models.agent import ExpenseExtraction
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
 from typing import Any, Type
 
+import httpx
 from langchain.messages import HumanMessage, SystemMessage
+from langchain_core.exceptions import OutputParserException
 from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
 from langchain_openai import AzureChatOpenAI
-from pydantic import BaseModel, SecretStr
+from pydantic import BaseModel, SecretStr, ValidationError
 
 from app.config import config
+from app.services.admission import (
+    AdmissionController,
+    admission,
+    estimate_tokens,
+    is_rate_limited,
+    is_retryable,
+)
+from app.services.cache import ResponseCache, build_response_cache, make_cache_key
+from app.utils.enums import LLMProfile, RequestPriority
+from app.utils.log import logger
+from app.utils.metrics import LLM_ESCALATIONS, LLM_REQUEST_SECONDS, LLM_TOKENS, Counter
+
+# Shared by every LLMService so retries from any request hit the same entries
+_response_cache = build_response_cache()
+_admission = admission if config.LLM_ADMISSION_ENABLED else None
+
+
+def _cache_lookups() -> dict[tuple[str, ...], float]:
+    if _response_cache is None:
+        return {}
+    lookups = {("miss", ""): _response_cache.misses}
+    for tier, hits in _response_cache.tier_hits.items():
+        lookups[("hit", tier)] = hits
+    return lookups
+
+
+Counter(
+    "llm_cache_lookups_total",
+    "LLM response cache lookups by result and answering tier",
+    ("result", "tier"),
+    function=_cache_lookups,
+)
+
+# Output that does not match the schema: raised by the SDK while parsing the
+# response, or reported by the output parser
+INVALID_OUTPUT_ERRORS = (ValidationError, OutputParserException)
+
+
+class ModelProfile(BaseModel, frozen=True):
+    """Deployment and sampling settings used by one call site."""
+
+    name: LLMProfile
+    deployment: str
+    reasoning_effort: str  # Can be "low", "medium", or "high"
+    max_tokens: int | None = None
+    temperature: float
+
+    @property
+    def reasoning(self) -> dict[str, str]:
+        # Summary can be "auto", "concise", or "detailed"
+        return {"effort": self.reasoning_effort, "summary": "auto"}
+
+
+PROFILES = {
+    LLMProfile(name): ModelProfile(
+        name=LLMProfile(name),
+        deployment=settings["deployment"],
+        reasoning_effort=settings["reasoning_effort"],
+        max_tokens=settings["max_tokens"] or None,
+        temperature=settings["temperature"],
+    )
+    for name, settings in config.LLM_PROFILES.items()
+}
+
+
+def _total_tokens(output: Any) -> int | None:
+    message = output.get("raw") if isinstance(output, dict) else output
+    usage = getattr(message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+def _record_usage(schema: str, profile: LLMProfile, message: AIMessage) -> None:
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    for kind, field in (("prompt", "input_tokens"), ("completion", "output_tokens")):
+        LLM_TOKENS.inc(
+            usage.get(field, 0), schema=schema, profile=profile.value, kind=kind
+        )
+
+
+class LLMRegistry:
+    """Process-wide chat client, HTTP pool and structured-output runnables.
+
+    Building an AzureChatOpenAI client or binding a schema with
+    `with_structured_output` is expensive, so both are done once per
+    process and model profile, and shared by every LLMService.
+    """
+
+    _http_client: httpx.AsyncClient | None = None
+    _chat_models: dict[LLMProfile, AzureChatOpenAI] = {}
+    _structured: dict[tuple[LLMProfile, Type[BaseModel]], Runnable] = {}
+
+    @staticmethod
+    def get_http_client() -> httpx.AsyncClient:
+        """Get the pooled HTTP client used for Azure OpenAI calls."""
+        if LLMRegistry._http_client is None:
+            LLMRegistry._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=config.LLM_HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=config.LLM_HTTP_TIMEOUT,
+            )
+        return LLMRegistry._http_client
+
+    @staticmethod
+    def get_chat_model(profile: LLMProfile = LLMProfile.STRONG) -> AzureChatOpenAI:
+        """Get the shared chat model of a profile, initializing if needed."""
+        chat_model = LLMRegistry._chat_models.get(profile)
+        if chat_model is None:
+            settings = PROFILES[profile]
+            chat_model = AzureChatOpenAI(
+                name=settings.deployment,
+                model=settings.deployment,
+                api_key=SecretStr(config.AZURE_OPENAI_API_KEY),
+                azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
+                api_version=config.AZURE_OPENAI_API_VERSION,
+                verbose=True,
+                temperature=settings.temperature,
+                max_tokens=settings.max_tokens,
+                # With admission control, retries go back through its queue
+                max_retries=0 if config.LLM_ADMISSION_ENABLED else 2,
+                reasoning=settings.reasoning,
+                http_async_client=LLMRegistry.get_http_client(),
+                # Future params TBD
+            )
+            LLMRegistry._chat_models[profile] = chat_model
+            logger.info(f"Azure OpenAI client initialized ({profile.value} profile)")
+        return chat_model
+
+    @staticmethod
+    def get_structured(
+        output_schema: Type[BaseModel], profile: LLMProfile = LLMProfile.STRONG
+    ) -> Runnable:
+        """Get the prebuilt structured-output runnable for a schema and profile."""
+        runnable = LLMRegistry._structured.get((profile, output_schema))
+        if runnable is None:
+            # include_raw keeps the AIMessage, which carries token usage
+            runnable = LLMRegistry.get_chat_model(profile).with_structured_output(
+                output_schema, include_raw=True
+            )
+            LLMRegistry._structured[(profile, output_schema)] = runnable
+        return runnable
+
+    @staticmethod
+    async def close() -> None:
+        """Drop the shared clients and close their connection pool."""
+        LLMRegistry._structured.clear()
+        LLMRegistry._chat_models.clear()
+        if LLMRegistry._http_client is not None:
+            await LLMRegistry._http_client.aclose()
+            LLMRegistry._http_client = None
 
 
 class LLMService:
-    def __init__(self):
-        self.deployment_name = config.AZURE_OPENAI_CHAT_DEPLOYMENT_NAME
-        self.model = config.AZURE_OPENAI_CHAT_DEPLOYMENT_NAME
-        self.api_key = config.AZURE_OPENAI_API_KEY
+    def __init__(
+        self,
+        cache: ResponseCache | None = _response_cache,
+        admission: AdmissionController | None = _admission,
+    ):
+        self.cache = cache
+        self.admission = admission
         self.api_version = config.AZURE_OPENAI_API_VERSION
-        self.chat_endpoint = config.AZURE_OPENAI_ENDPOINT
-        self.db_name = config.DATABASE_NAME
-        self.db_url = config.MONGO_URI
-        self.agent = AzureChatOpenAI(
-            name=self.deployment_name,
-            model=self.model,
-            api_key=SecretStr(self.api_key),
-            azure_endpoint=self.chat_endpoint,
-            api_version=self.api_version,
-            verbose=True,
-            temperature=0.7,
-            max_retries=2,
-            reasoning={
-                "effort": "medium",  # Can be "low", "medium", or "high"
-                "summary": "auto",  # Can be "auto", "concise", or "detailed"
-            },
-            # Future params TBD
-        )
 
     async def chat(
-        self, user_messages: str, system_prompt: str, response_format=None
+        self,
+        user_messages: str,
+        system_prompt: str,
+        response_format=None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        profile: LLMProfile = LLMProfile.STRONG,
     ) -> AIMessage:
         system_msg = SystemMessage(system_prompt)
         human_msg = HumanMessage(user_messages)
         messages = [system_msg, human_msg]
 
-        res = await self.agent.ainvoke(messages)
+        res = await self._invoke(
+            LLMRegistry.get_chat_model(profile),
+            messages,
+            priority,
+            estimate_tokens(system_prompt, user_messages),
+        )
 
         return res
 
     async def parse_structured(
-        self, user_prompt: str, system_prompt: str, output_schema: Type[BaseModel]
+        self,
+        user_prompt: str,
+        system_prompt: str,
+        output_schema: Type[BaseModel],
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        profile: LLMProfile = LLMProfile.STRONG,
     ) -> dict[str, Any]:
+        """Structured output from the profile's model.
+
+        Output that fails validation against `output_schema` (malformed or
+        truncated JSON) is retried once on the strong profile.
+        """
+        schema = output_schema.__name__
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result, outcome = await self._parse_structured(
+                user_prompt, system_prompt, output_schema, priority, profile
+            )
+            return result
+        finally:
+            LLM_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                schema=schema,
+                profile=profile.value,
+                outcome=outcome,
+            )
+
+    async def _parse_structured(
+        self,
+        user_prompt: str,
+        system_prompt: str,
+        output_schema: Type[BaseModel],
+        priority: RequestPriority,
+        profile: LLMProfile,
+    ) -> tuple[Any, str]:
         system_msg = SystemMessage(system_prompt)
         human_msg = HumanMessage(user_prompt)
         messages = [system_msg, human_msg]
-        res = await self.agent.with_structured_output(output_schema).ainvoke(messages)
-        return res
+        key = None
+        if self.cache is not None:
+            key = make_cache_key(
+                system_prompt,
+                user_prompt,
+                output_schema.__name__,
+                self._cache_settings(PROFILES[profile]),
+            )
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return output_schema.model_validate(cached), "cache_hit"
+        outcome = "ok"
+        try:
+            res = await self._invoke_structured(
+                output_schema, profile, messages, priority, system_prompt, user_prompt
+            )
+        except INVALID_OUTPUT_ERRORS as e:
+            if profile is LLMProfile.STRONG or not config.LLM_ESCALATION_ENABLED:
+                raise
+            logger.info(
+                f"{output_schema.__name__} from {profile.value} profile failed "
+                f"validation, escalating: {e}"
+            )
+            LLM_ESCALATIONS.inc(schema=output_schema.__name__, profile=profile.value)
+            outcome = "escalated"
+            res = await self._invoke_structured(
+                output_schema,
+                LLMProfile.STRONG,
+                messages,
+                priority,
+                system_prompt,
+                user_prompt,
+            )
+        if key is not None:
+            await self.cache.set(
+                key, res.model_dump(mode="json") if isinstance(res, BaseModel) else res
+            )
+        return res, outcome
+
+    async def _invoke_structured(
+        self,
+        output_schema: Type[BaseModel],
+        profile: LLMProfile,
+        messages: list,
+        priority: RequestPriority,
+        system_prompt: str,
+        user_prompt: str,
+    ) -> Any:
+        output = await self._invoke(
+            LLMRegistry.get_structured(output_schema, profile),
+            messages,
+            priority,
+            estimate_tokens(system_prompt, user_prompt),
+        )
+        _record_usage(output_schema.__name__, profile, output["raw"])
+        if output["parsing_error"] is not None:
+            raise output["parsing_error"]
+        return output["parsed"]
+
+    async def _invoke(
+        self,
+        runnable: Runnable,
+        messages: list,
+        priority: RequestPriority,
+        estimated_tokens: int,
+    ) -> Any:
+        """Call the model through admission control, retrying transient failures."""
+        if self.admission is None:
+            return await runnable.ainvoke(messages)
+        for attempt in range(1, config.LLM_MAX_ATTEMPTS + 1):
+            try:
+                async with self.admission.slot(priority, estimated_tokens) as permit:
+                    output = await runnable.ainvoke(messages)
+                    permit.tokens_used = _total_tokens(output)
+                    return output
+            except Exception as e:
+                if attempt == config.LLM_MAX_ATTEMPTS or not is_retryable(e):
+                    raise
+                logger.warning(f"LLM call failed (attempt {attempt}), retrying: {e}")
+                if not is_rate_limited(e):
+                    # Throttling already pauses admission; spread other retries
+                    await asyncio.sleep(random.uniform(0, 0.5 * 2**attempt))
+
+    def _cache_settings(self, profile: ModelProfile) -> dict[str, Any]:
+        return {
+            "model": profile.deployment,
+            "api_version": self.api_version,
+            "temperature": profile.temperature,
+            "reasoning": profile.reasoning,
+            "max_tokens": profile.max_tokens,
+            # Relative dates ("yesterday") resolve differently from one day to the next
+            "as_of": datetime.now(timezone.utc).date().isoformat(),
+        }
@@ -0,0 +1,341 @@
+"""Merchant → category index, so known merchants are categorized without the LLM.
+
+Names are normalized (case, punctuation, trailing store numbers) and kept
+in a hash for exact matches, a word trie for the longest known prefix
+("starbucks reserve roastery" → "starbucks") and a character trigram index
+for misspellings ("walmrt" → "walmart"). The index is seeded with the
+parser's known merchants and learns from every inserted expense: globally
+for the standard categories, per user for anything the user filed
+themselves, along with the custom categories in their preferences. The
+parser's category keywords are only matched as whole names: as prefixes
+or fuzzy targets, generic words misfile real merchants ("Hotel Chocolat",
+"Water Street Grill").
+"""
+
+import re
+from collections import OrderedDict
+from typing import Any, Iterable, Mapping
+
+from pydantic import BaseModel
+from pymongo import UpdateOne
+
+from app.config import config
+from app.database import core_data
+from app.utils.log import logger
+from app.utils.metrics import Counter, Gauge
+from app.utils.nlp_parser import CATEGORY_KEYWORDS, DEFAULT_CATEGORY, KNOWN_MERCHANTS
+
+# Votes a seeded name starts with, so a few odd expenses do not flip it
+SEED_VOTES = 5
+# Shorter names share too few trigrams for fuzzy matching to mean anything
+MIN_FUZZY_LENGTH = 4
+
+_NON_WORD = re.compile(r"[^a-z0-9&]+")
+_APOSTROPHES = re.compile(r"['’]")
+
+
+def normalize_merchant(name: str) -> str:
+    """Lowercase words without punctuation or a trailing store number.
+
+    "McDonald's #1234" and "mcdonalds" both become "mcdonalds".
+    """
+    words = _NON_WORD.sub(" ", _APOSTROPHES.sub("", name.lower())).split()
+    while len(words) > 1 and words[-1].isdigit():
+        words.pop()
+    return " ".join(words)
+
+
+def _trigrams(name: str) -> set[str]:
+    padded = f" {name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class MerchantMatch(BaseModel, frozen=True):
+    category: str
+    name: str
+    method: str
+    score: float = 1.0
+
+
+class _UserMerchants:
+    """What one user taught the index: their own filings and custom categories."""
+
+    __slots__ = ("merchants", "categories")
+
+    def __init__(self):
+        self.merchants: dict[str, str] = {}
+        self.categories: dict[str, str] = {}
+
+
+class MerchantIndex:
+    def __init__(
+        self,
+        fuzzy_threshold: float = config.MERCHANT_FUZZY_THRESHOLD,
+        max_users: int = config.MERCHANT_INDEX_USERS,
+    ):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_users = max_users
+        self._votes: dict[str, dict[str, int]] = {}
+        self._categories: dict[str, str] = {}
+        self._trie: dict[str | None, Any] = {}
+        self._grams: dict[str, set[str]] = {}
+        self._gram_counts: dict[str, int] = {}
+        self._users: OrderedDict[str, _UserMerchants] = OrderedDict()
+        self.lookups: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._categories)
+
+    def seed(self) -> None:
+        """Index the parser's known merchants and, as exact names only, its keywords."""
+        for category, keywords in CATEGORY_KEYWORDS.items():
+            for keyword in keywords:
+                self.add(keyword, category, SEED_VOTES, exact_only=True)
+        for merchant, category in KNOWN_MERCHANTS.items():
+            self.add(merchant, category, SEED_VOTES)
+
+    def add(
+        self, merchant: str, category: str, votes: int = 1, exact_only: bool = False
+    ) -> None:
+        """Count a vote for a name's category.
+
+        Args:
+            exact_only: Keep the name out of prefix and fuzzy matching
+        """
+        name = normalize_merchant(merchant)
+        if not name:
+            return
+        counts = self._votes.setdefault(name, {})
+        if not exact_only and name not in self._gram_counts:
+            self._insert(name)
+        counts[category] = counts.get(category, 0) + votes
+        self._categories[name] = max(counts, key=counts.__getitem__)
+
+    def _insert(self, name: str) -> None:
+        node = self._trie
+        for word in name.split():
+            node = node.setdefault(word, {})
+        node[None] = name
+        grams = _trigrams(name)
+        self._gram_counts[name] = len(grams)
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(name)
+
+    def _user(self, user_id: str) -> _UserMerchants:
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserMerchants()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+        return user
+
+    def learn(self, document: Mapping[str, Any]) -> None:
+        """Record the category of a stored expense."""
+        merchant = document.get("merchant") or ""
+        category = document.get("category") or ""
+        name = normalize_merchant(merchant)
+        if not name or not category or category == DEFAULT_CATEGORY:
+            return
+        # A custom category only means something to the user who made it
+        if category in CATEGORY_KEYWORDS:
+            self.add(name, category)
+        user_id = document.get("user_id")
+        if user_id:
+            self._user(user_id).merchants[name] = category
+
+    def set_user_categories(self, user_id: str, categories: Iterable[str]) -> None:
+        """Custom categories from the user's preferences, matched as words."""
+        self._user(user_id).categories = {
+            normalize_merchant(category): category
+            for category in categories
+            if normalize_merchant(category)
+        }
+
+    def lookup(self, merchant: str, user_id: str | None = None) -> MerchantMatch | None:
+        match = self._lookup(normalize_merchant(merchant), user_id)
+        method = match.method if match is not None else "miss"
+        self.lookups[method] = self.lookups.get(method, 0) + 1
+        return match
+
+    def category(self, merchant: str, user_id: str | None = None) -> str | None:
+        match = self.lookup(merchant, user_id)
+        return match.category if match is not None else None
+
+    def _lookup(self, name: str, user_id: str | None) -> MerchantMatch | None:
+        if not name:
+            return None
+        user = self._users.get(user_id) if user_id else None
+        if user is not None and name in user.merchants:
+            return MerchantMatch(
+                category=user.merchants[name], name=name, method="user"
+            )
+        if name in self._categories:
+            return MerchantMatch(
+                category=self._categories[name], name=name, method="exact"
+            )
+        prefix = self._longest_prefix(name)
+        if prefix is not None:
+            return MerchantMatch(
+                category=self._categories[prefix], name=prefix, method="prefix"
+            )
+        if user is not None:
+            padded = f" {name} "
+            for words, category in user.categories.items():
+                if f" {words} " in padded:
+                    return MerchantMatch(
+                        category=category, name=words, method="preference"
+                    )
+        return self._fuzzy(name)
+
+    def _longest_prefix(self, name: str) -> str | None:
+        """Longest indexed name made of the first words of `name`."""
+        node, found = self._trie, None
+        for word in name.split():
+            node = node.get(word)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+    def _fuzzy(self, name: str) -> MerchantMatch | None:
+        """Closest indexed name by trigram Dice similarity, above the threshold."""
+        if len(name) < MIN_FUZZY_LENGTH:
+            return None
+        grams = _trigrams(name)
+        shared: dict[str, int] = {}
+        for gram in grams:
+            for candidate in self._grams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        best, best_score = None, 0.0
+        for candidate, count in shared.items():
+            score = 2 * count / (len(grams) + self._gram_counts[candidate])
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is None or best_score < self.fuzzy_threshold:
+            return None
+        return MerchantMatch(
+            category=self._categories[best],
+            name=best,
+            method="fuzzy",
+            score=round(best_score, 4),
+        )
+
+    async def load(self) -> None:
+        """Learn from stored expenses and every user's custom categories.
+
+        Stored expenses only feed the global index; per-user filings are
+        learned as new expenses come in.
+        """
+        try:
+            async for row in core_data.iter_aggregate(
+                "expenses",
+                [
+                    {"$match": {"category": {"$in": list(CATEGORY_KEYWORDS)}}},
+                    {
+                        "$group": {
+                            "_id": {
+                                "merchant": {"$ifNull": ["$merchant_key", "$merchant"]},
+                                "category": "$category",
+                            },
+                            "count": {"$sum": 1},
+                        }
+                    },
+                    {"$sort": {"count": -1}},
+                    {"$limit": config.MERCHANT_INDEX_LOAD_LIMIT},
+                ],
+                allow_disk_use=True,
+            ):
+                self.add(
+                    row["_id"]["merchant"] or "", row["_id"]["category"], row["count"]
+                )
+            async for preferences in core_data.iter_read(
+                "preferences",
+                {},
+                projection={"_id": 0, "user_id": 1, "categories_list": 1},
+            ):
+                self.set_user_categories(
+                    preferences["user_id"], preferences.get("categories_list") or []
+                )
+        except RuntimeError as e:
+            logger.debug(f"Stored merchants not loaded: {e}")
+            return
+        logger.info(
+            f"Merchant index holds {len(self)} names for {len(self._users)} users"
+        )
+
+
+merchant_index = MerchantIndex()
+merchant_index.seed()
+
+Counter(
+    "merchant_index_lookups_total",
+    "Merchant category lookups by how they matched",
+    ("method",),
+    function=lambda: {
+        (method,): count for method, count in merchant_index.lookups.items()
+    },
+)
+Gauge(
+    "merchant_index_names",
+    "Merchant names in the global index",
+    function=lambda: {(): len(merchant_index)},
+)
+
+
+async def backfill_merchant_keys(
+    user_id: str | None = None, batch_size: int = 1000
+) -> int:
+    """Fill `merchant_key` (the normalized merchant) on stored expenses that lack it.
+
+    Walks the matching expenses in _id order, writing each batch with a
+    single unordered bulk write.
+
+    Returns:
+        Number of expenses updated
+    """
+    updated = 0
+    last_id = None
+    while True:
+        match: dict[str, Any] = {"merchant_key": None}
+        if user_id:
+            match["user_id"] = user_id
+        if last_id is not None:
+            match["_id"] = {"$gt": last_id}
+        batch = await core_data.query_read(
+            "expenses",
+            [
+                {"$match": match},
+                {"$sort": {"_id": 1}},
+                {"$limit": batch_size},
+                {"$project": {"merchant": 1}},
+            ],
+        )
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        await core_data.bulk_write(
+            "expenses",
+            [
+                UpdateOne(
+                    {"_id": document["_id"]},
+                    {
+                        "$set": {
+                            "merchant_key": normalize_merchant(
+                                document.get("merchant") or ""
+                            )
+                        }
+                    },
+                )
+                for document in batch
+            ],
+        )
+        updated += len(batch)
+    logger.info(f"Backfilled merchant_key on {updated} expenses")
+    return updated
+
+
+async def record_expenses(documents: Iterable[Mapping[str, Any]]) -> None:
+    """Learn the merchants of newly inserted expenses."""
+    for document in documents:
+        merchant_index.learn(document)
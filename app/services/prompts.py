@@ -0,0 +1,292 @@
+"""Versioned system prompts, minimized and ordered for provider prompt caching.
+
+The prompts bundled in app/prompts/*.md are version 0. Newer versions are
+published to the prompt registry collection (fields: name, version, text)
+and replace the bundled text. They are loaded once at startup, then polled
+every PROMPT_RELOAD_INTERVAL seconds, so a published version goes live
+without a restart.
+
+Azure OpenAI reuses the longest prompt prefix it has recently seen (from
+1024 tokens up), so system prompts are built from static text first with
+the dynamic part (today's date, for relative dates) appended at the end.
+Prompts shorter than that are not cached at all: parse_expense (about 835
+tokens) is below it, so its layout only pays off once the prompt grows
+past PROMPT_CACHE_MIN_TOKENS. The `tokens` command shows which prompts
+clear the threshold.
+
+Token counts need tiktoken's encoding data, which is downloaded on first
+use, so they are computed off the event loop when the registry loads.
+
+Usage:
+    python -m app.services.prompts tokens
+    python -m app.services.prompts publish <name> <path>
+"""
+
+import argparse
+import asyncio
+import re
+import textwrap
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import tiktoken
+from pydantic import BaseModel
+
+from app.config import config
+from app.database import core_data
+from app.database.db import Database
+from app.utils.log import logger
+from app.utils.metrics import Gauge
+
+PROMPTS_DIR = Path(__file__).resolve().parents[1] / "prompts"
+
+_TABLE_CELL_PADDING = re.compile(r" *\| *")
+_TABLE_RULE = re.compile(r"-{3,}")
+_REPEATED_SPACES = re.compile(r" {2,}")
+
+# Shortest prompt prefix Azure OpenAI caches
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+# tiktoken encoding, False once it turned out to be unavailable (offline)
+_encoding: tiktoken.Encoding | bool | None = None
+
+
+def minimize(text: str) -> str:
+    """Drop whitespace that costs tokens without helping the model.
+
+    Removes common and trailing indentation, table padding and repeated
+    blank lines; keeps relative indentation of nested lists and code.
+    """
+    lines: list[str] = []
+    for line in textwrap.dedent(text).splitlines():
+        line = line.rstrip()
+        stripped = line.lstrip()
+        if stripped.startswith("|"):
+            line = _TABLE_RULE.sub("---", _TABLE_CELL_PADDING.sub("|", stripped))
+        else:
+            indent = line[: len(line) - len(stripped)]
+            line = indent + _REPEATED_SPACES.sub(" ", stripped)
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text`; estimated at 4 characters per token without tiktoken data."""
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding(config.PROMPT_TOKEN_ENCODING)
+        except Exception as e:
+            logger.warning(f"Tokenizer unavailable, estimating prompt tokens: {e}")
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4
+    return len(_encoding.encode(text))
+
+
+class Prompt(BaseModel, frozen=True):
+    name: str
+    version: int
+    text: str
+    # Counted by PromptRegistry.count_tokens, off the event loop
+    tokens: int | None = None
+
+
+class PromptRegistry:
+    def __init__(
+        self,
+        directory: Path = PROMPTS_DIR,
+        collection_name: str = config.PROMPT_REGISTRY_COLLECTION,
+        reload_interval: float = config.PROMPT_RELOAD_INTERVAL,
+    ):
+        self.directory = directory
+        self.collection_name = collection_name
+        self.reload_interval = reload_interval
+        self._prompts: dict[str, Prompt] = {}
+        self._task: asyncio.Task | None = None
+
+    def _set(self, name: str, version: int, text: str) -> Prompt:
+        prompt = Prompt(name=name, version=version, text=minimize(text))
+        self._prompts[name] = prompt
+        return prompt
+
+    async def count_tokens(self) -> None:
+        """Fill in token counts; the first may download the tokenizer data."""
+        await asyncio.to_thread(self._count_tokens)
+
+    def _count_tokens(self) -> None:
+        for name, prompt in list(self._prompts.items()):
+            if prompt.tokens is None:
+                counted = prompt.model_copy(
+                    update={"tokens": count_tokens(prompt.text)}
+                )
+                # Unless a newer version replaced it meanwhile
+                if self._prompts.get(name) is prompt:
+                    self._prompts[name] = counted
+
+    def load_bundled(self) -> None:
+        for path in sorted(self.directory.glob("*.md")):
+            if path.stem not in self._prompts:
+                self._set(path.stem, 0, path.read_text(encoding="utf-8"))
+
+    async def load(self) -> None:
+        """Load the bundled prompts, then the latest published versions."""
+        self.load_bundled()
+        await self.refresh()
+        await self.count_tokens()
+        logger.info(
+            "Loaded prompts: "
+            + ", ".join(
+                f"{prompt.name} v{prompt.version} ({prompt.tokens} tokens)"
+                for prompt in self._prompts.values()
+            )
+        )
+
+    async def refresh(self) -> list[str]:
+        """Pick up versions published since the last check.
+
+        Returns:
+            Names of the prompts that changed
+        """
+        try:
+            latest = await core_data.query_read(
+                self.collection_name,
+                [
+                    {"$sort": {"name": 1, "version": -1}},
+                    {"$group": {"_id": "$name", "version": {"$first": "$version"}}},
+                ],
+            )
+        except RuntimeError as e:
+            logger.debug(f"Published prompts not loaded: {e}")
+            return []
+        changed = []
+        for entry in latest:
+            current = self._prompts.get(entry["_id"])
+            if current is not None and current.version >= entry["version"]:
+                continue
+            document = await core_data.read_one(
+                self.collection_name,
+                {"name": entry["_id"], "version": entry["version"]},
+                {"text": 1},
+            )
+            if document:
+                self._set(entry["_id"], entry["version"], document["text"])
+                changed.append(entry["_id"])
+                logger.info(f"Prompt {entry['_id']} now at version {entry['version']}")
+        return changed
+
+    def start(self) -> None:
+        """Poll for new versions in the background (no-op when the interval is 0)."""
+        if self.reload_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                if await self.refresh():
+                    await self.count_tokens()
+            except Exception as e:
+                logger.error(f"Reloading prompts failed: {e}")
+
+    def get(self, name: str) -> Prompt:
+        return self._prompts[name]
+
+    def prompts(self) -> list[Prompt]:
+        return list(self._prompts.values())
+
+    def system_prompt(self, *names: str, today: date | None = None) -> str:
+        """Join static prompts in order, with today's date as the only dynamic tail."""
+        today = today or datetime.now(timezone.utc).date()
+        static = "\n\n".join(self._prompts[name].text for name in names)
+        return f"{static}\n\nToday's date is {today.isoformat()}."
+
+    async def publish(self, name: str, text: str) -> Prompt:
+        """Store `text` as the next version of a prompt and use it here right away."""
+        latest = await core_data.query_read(
+            self.collection_name,
+            [
+                {"$match": {"name": name}},
+                {"$sort": {"version": -1}},
+                {"$limit": 1},
+                {"$project": {"version": 1}},
+            ],
+        )
+        version = latest[0]["version"] + 1 if latest else 1
+        await core_data.insert_one(
+            {
+                "name": name,
+                "version": version,
+                "text": text,
+                "created_at": datetime.now(timezone.utc),
+            },
+            self.collection_name,
+        )
+        self._set(name, version, text)
+        await self.count_tokens()
+        return self.get(name)
+
+
+prompt_registry = PromptRegistry()
+prompt_registry.load_bundled()
+
+Gauge(
+    "prompt_tokens",
+    "Tokens in each loaded system prompt (before the dynamic tail)",
+    ("name", "version"),
+    function=lambda: {
+        (prompt.name, str(prompt.version)): prompt.tokens
+        for prompt in prompt_registry.prompts()
+        if prompt.tokens is not None
+    },
+)
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Prompt registry maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("tokens", help="Token counts of the loaded prompts")
+    publish = subcommands.add_parser("publish", help="Publish a new prompt version")
+    publish.add_argument("name")
+    publish.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "tokens":
+        if Database.get_database() is not None:
+            await Database.connect()
+        await prompt_registry.load()
+        print(f"{'prompt':<24}{'version':>8}{'raw':>8}{'minimized':>11}{'cached':>8}")
+        for prompt in prompt_registry.prompts():
+            path = prompt_registry.directory / f"{prompt.name}.md"
+            raw = (
+                count_tokens(path.read_text(encoding="utf-8"))
+                if prompt.version == 0 and path.exists()
+                else None
+            )
+            # Alone, before the user message adds to the prefix
+            cached = "yes" if prompt.tokens >= PROMPT_CACHE_MIN_TOKENS else "no"
+            print(
+                f"{prompt.name:<24}{prompt.version:>8}"
+                f"{raw if raw is not None else '-':>8}{prompt.tokens:>11}{cached:>8}"
+            )
+    else:
+        await Database.connect()
+        with open(args.path, encoding="utf-8") as handle:
+            prompt = await prompt_registry.publish(args.name, handle.read())
+        print(f"Published {prompt.name} v{prompt.version} ({prompt.tokens} tokens)")
+    if Database.get_database() is not None:
+        await Database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
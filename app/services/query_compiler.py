@@ -0,0 +1,293 @@
+"""Compile a SpendingQuery into a Mongo aggregation pipeline.
+
+Totals and breakdowns are answered from the rollups when the query fits
+them: no amount bounds, at most one of categories/merchants, and a date
+range made of whole rollup periods (a range running up to today counts as
+whole). Everything else runs on `expenses` with the (user_id, date, _id)
+index as an explicit hint, so a plan never falls back to a collection scan.
+"""
+
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional, Sequence
+
+from pydantic import BaseModel
+
+from app.config import config
+from app.database.indexes import EXPENSES_BY_USER_DATE
+from app.models.query import SpendingQuery
+from app.services.merchants import normalize_merchant
+from app.services.rollups import dimension_key, period_start
+from app.utils.enums import (
+    QueryGroupBy,
+    QueryIntent,
+    RelativePeriod,
+    RollupDimension,
+    RollupGranularity,
+)
+
+# Expenses returned by a list query without a limit
+DEFAULT_LIST_LIMIT = 50
+
+_TIME_GROUPS = {
+    QueryGroupBy.DAY: RollupGranularity.DAY,
+    QueryGroupBy.WEEK: RollupGranularity.WEEK,
+    QueryGroupBy.MONTH: RollupGranularity.MONTH,
+}
+
+_SUMS = {
+    "total": {"$sum": "$amount"},
+    "total_usd": {"$sum": {"$ifNull": ["$converted_amount_usd", 0]}},
+    "count": {"$sum": 1},
+}
+_ROLLUP_SUMS = {
+    "total": {"$sum": "$total"},
+    "total_usd": {"$sum": "$total_usd"},
+    "count": {"$sum": "$count"},
+}
+
+
+class QueryPlan(BaseModel):
+    collection: str
+    pipeline: list[dict[str, Any]]
+    hint: Optional[list[tuple[str, int]]] = None
+
+
+def resolve_period(period: RelativePeriod, today: date) -> tuple[date, date]:
+    """[start, end) days of a relative period as seen on `today`."""
+    tomorrow = today + timedelta(days=1)
+    week = today - timedelta(days=today.weekday())
+    month = today.replace(day=1)
+    if period is RelativePeriod.TODAY:
+        return today, tomorrow
+    if period is RelativePeriod.YESTERDAY:
+        return today - timedelta(days=1), today
+    if period is RelativePeriod.THIS_WEEK:
+        return week, tomorrow
+    if period is RelativePeriod.LAST_WEEK:
+        return week - timedelta(days=7), week
+    if period is RelativePeriod.THIS_MONTH:
+        return month, tomorrow
+    if period is RelativePeriod.LAST_MONTH:
+        return (month - timedelta(days=1)).replace(day=1), month
+    if period is RelativePeriod.THIS_YEAR:
+        return today.replace(month=1, day=1), tomorrow
+    if period is RelativePeriod.LAST_YEAR:
+        return date(today.year - 1, 1, 1), date(today.year, 1, 1)
+    days = {
+        RelativePeriod.LAST_7_DAYS: 7,
+        RelativePeriod.LAST_30_DAYS: 30,
+        RelativePeriod.LAST_90_DAYS: 90,
+    }[period]
+    return tomorrow - timedelta(days=days), tomorrow
+
+
+def date_range(
+    query: SpendingQuery, today: date
+) -> tuple[datetime | None, datetime | None]:
+    """[start, end) of the query as UTC datetimes; None where unbounded."""
+    if query.period is not None:
+        start, end = resolve_period(query.period, today)
+    else:
+        start = query.start_date
+        end = query.end_date + timedelta(days=1) if query.end_date else None
+    return _midnight(start), _midnight(end)
+
+
+def _midnight(day: date | None) -> datetime | None:
+    if day is None:
+        return None
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _merchant_pattern(merchant: str) -> re.Pattern:
+    """Case and whitespace insensitive exact match of a merchant name."""
+    words = r"\s+".join(re.escape(word) for word in merchant.split())
+    return re.compile(rf"^\s*{words}\s*$", re.IGNORECASE)
+
+
+def compile_query(
+    query: SpendingQuery, user_id: str, today: date | None = None
+) -> QueryPlan:
+    today = today or datetime.now(timezone.utc).date()
+    start, end = date_range(query, today)
+    granularity = _rollup_granularity(query, start, end, today)
+    if granularity is not None:
+        return QueryPlan(
+            collection=config.ROLLUPS_COLLECTION,
+            pipeline=_rollup_pipeline(query, user_id, start, end, granularity),
+        )
+    return QueryPlan(
+        collection="expenses",
+        pipeline=_expense_pipeline(query, user_id, start, end),
+        hint=EXPENSES_BY_USER_DATE,
+    )
+
+
+def _rollup_granularity(
+    query: SpendingQuery,
+    start: datetime | None,
+    end: datetime | None,
+    today: date,
+) -> RollupGranularity | None:
+    """Coarsest rollup granularity that answers the query exactly, if any."""
+    if (
+        query.intent is QueryIntent.LIST
+        or query.min_amount is not None
+        or query.max_amount is not None
+        # Each rollup document is keyed by one dimension only
+        or (query.categories and query.merchants)
+        or (query.group_by is QueryGroupBy.MERCHANT and query.categories)
+        or (query.group_by is QueryGroupBy.CATEGORY and query.merchants)
+    ):
+        return None
+    if query.group_by in _TIME_GROUPS:
+        candidates: Sequence[RollupGranularity] = [_TIME_GROUPS[query.group_by]]
+    else:
+        candidates = [
+            RollupGranularity.MONTH,
+            RollupGranularity.WEEK,
+            RollupGranularity.DAY,
+        ]
+    # Nothing is recorded after today, so the current period counts as whole
+    open_ended = end is None or end.date() > today
+    for granularity in candidates:
+        if start is not None and period_start(start, granularity) != start:
+            continue
+        if not open_ended and period_start(end, granularity) != end:
+            continue
+        return granularity
+    return None
+
+
+def _rollup_dimension(query: SpendingQuery) -> RollupDimension:
+    if query.group_by is QueryGroupBy.MERCHANT or query.merchants:
+        return RollupDimension.MERCHANT
+    return RollupDimension.CATEGORY
+
+
+def _rollup_pipeline(
+    query: SpendingQuery,
+    user_id: str,
+    start: datetime | None,
+    end: datetime | None,
+    granularity: RollupGranularity,
+) -> list[dict[str, Any]]:
+    dimension = _rollup_dimension(query)
+    match: dict[str, Any] = {
+        "user_id": user_id,
+        "dimension": dimension.value,
+        "granularity": granularity.value,
+    }
+    if start is not None or end is not None:
+        match["period_start"] = _range(start, end)
+    if dimension is RollupDimension.MERCHANT and query.merchants:
+        match["key"] = {
+            "$in": [
+                dimension_key({"merchant": merchant}, dimension)
+                for merchant in query.merchants
+            ]
+        }
+    elif query.categories:
+        match["key"] = {"$in": query.categories}
+    if query.currency is not None:
+        match["currency"] = query.currency.value
+
+    if query.group_by in (QueryGroupBy.CATEGORY, QueryGroupBy.MERCHANT):
+        key: Any = "$key"
+    elif query.group_by in _TIME_GROUPS:
+        key = "$period_start"
+    else:
+        key = None
+    return [{"$match": match}, *_summarize(key, _ROLLUP_SUMS, query)]
+
+
+def _expense_pipeline(
+    query: SpendingQuery,
+    user_id: str,
+    start: datetime | None,
+    end: datetime | None,
+) -> list[dict[str, Any]]:
+    match: dict[str, Any] = {"user_id": user_id}
+    if start is not None or end is not None:
+        match["date"] = _range(start, end)
+    if query.categories:
+        match["category"] = {"$in": query.categories}
+    if query.merchants:
+        keys = [normalize_merchant(merchant) for merchant in query.merchants]
+        match["$or"] = [
+            {"merchant_key": {"$in": keys}},
+            # Stored before merchant_key existed and not backfilled yet
+            {
+                "merchant_key": None,
+                "merchant": {"$in": [_merchant_pattern(m) for m in query.merchants]},
+            },
+        ]
+    if query.min_amount is not None or query.max_amount is not None:
+        match["amount"] = {}
+        if query.min_amount is not None:
+            match["amount"]["$gte"] = query.min_amount
+        if query.max_amount is not None:
+            match["amount"]["$lte"] = query.max_amount
+    if query.currency is not None:
+        match["currency"] = query.currency.value
+
+    if query.intent is QueryIntent.LIST:
+        return [
+            {"$match": match},
+            {"$sort": {"date": -1, "_id": -1}},
+            {"$limit": query.limit or DEFAULT_LIST_LIMIT},
+        ]
+    if query.group_by is QueryGroupBy.CATEGORY:
+        key: Any = {"$ifNull": ["$category", ""]}
+    elif query.group_by is QueryGroupBy.MERCHANT:
+        # normalize_merchant() of the merchant, stored with each expense
+        key = {"$ifNull": ["$merchant_key", "$merchant", ""]}
+    elif query.group_by in _TIME_GROUPS:
+        trunc: dict[str, Any] = {"date": "$date", "unit": query.group_by.value}
+        if query.group_by is QueryGroupBy.WEEK:
+            trunc["startOfWeek"] = "monday"
+        key = {"$dateTrunc": trunc}
+    else:
+        key = None
+    return [{"$match": match}, *_summarize(key, _SUMS, query)]
+
+
+def _range(start: datetime | None, end: datetime | None) -> dict[str, datetime]:
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lt"] = end
+    return bounds
+
+
+def _summarize(
+    key: Any, sums: dict[str, Any], query: SpendingQuery
+) -> list[dict[str, Any]]:
+    """Sum per (key, currency); amounts in different currencies never add up."""
+    group_id: dict[str, Any] = {"currency": "$currency"}
+    if key is not None:
+        group_id["key"] = key
+    # Time series read oldest first; everything else largest first
+    if query.group_by in _TIME_GROUPS:
+        order: dict[str, int] = {"key": 1, "currency": 1}
+    else:
+        order = {"total_usd": -1, "total": -1}
+    stages: list[dict[str, Any]] = [
+        {"$group": {"_id": group_id, **sums}},
+        {
+            "$project": {
+                "_id": 0,
+                **({"key": "$_id.key"} if key is not None else {}),
+                "currency": "$_id.currency",
+                "total": 1,
+                "total_usd": 1,
+                "count": 1,
+            }
+        },
+        {"$sort": order},
+    ]
+    if query.limit:
+        stages.append({"$limit": query.limit})
+    return stages
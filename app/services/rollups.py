@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Mapping
+
+from pymongo import UpdateOne
+
+from app.config import config
+from app.database import core_data
+from app.database.db import Database
+from app.services.merchants import backfill_merchant_keys, normalize_merchant
+from app.utils.enums import RollupDimension, RollupGranularity
+from app.utils.log import logger
+
+# Fields that identify one summary document (also its unique index)
+ROLLUP_KEY_FIELDS = (
+    "user_id",
+    "dimension",
+    "granularity",
+    "period_start",
+    "key",
+    "currency",
+)
+
+
+def period_start(value: datetime, granularity: RollupGranularity) -> datetime:
+    """Start (UTC midnight) of the day, ISO week or month containing `value`."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    day = datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if granularity is RollupGranularity.WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity is RollupGranularity.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def dimension_key(document: Mapping[str, Any], dimension: RollupDimension) -> str:
+    value = document.get(dimension.value) or ""
+    if dimension is RollupDimension.MERCHANT:
+        return normalize_merchant(str(value))
+    return str(value)
+
+
+def rollup_increments(
+    documents: Iterable[Mapping[str, Any]],
+) -> dict[tuple, dict[str, float]]:
+    """Coalesce expense documents into one increment per summary document."""
+    increments: dict[tuple, dict[str, float]] = {}
+    for document in documents:
+        date = document["date"]
+        if isinstance(date, str):
+            date = datetime.fromisoformat(date)
+        for granularity in RollupGranularity:
+            start = period_start(date, granularity)
+            for dimension in RollupDimension:
+                key = (
+                    document["user_id"],
+                    dimension.value,
+                    granularity.value,
+                    start,
+                    dimension_key(document, dimension),
+                    document["currency"],
+                )
+                totals = increments.setdefault(
+                    key, {"total": 0.0, "total_usd": 0.0, "count": 0}
+                )
+                totals["total"] += document["amount"]
+                totals["total_usd"] += document.get("converted_amount_usd") or 0.0
+                totals["count"] += 1
+    return increments
+
+
+async def record_expenses(documents: Iterable[Mapping[str, Any]]) -> None:
+    """Apply newly inserted expenses to the rollups with one batch of `$inc` upserts."""
+    now = datetime.now(timezone.utc)
+    updates = [
+        UpdateOne(
+            dict(zip(ROLLUP_KEY_FIELDS, key)),
+            {"$inc": totals, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for key, totals in rollup_increments(documents).items()
+    ]
+    if updates:
+        await core_data.bulk_write(config.ROLLUPS_COLLECTION, updates)
+
+
+def _rebuild_pipeline(
+    match: dict[str, Any],
+    dimension: RollupDimension,
+    granularity: RollupGranularity,
+) -> list[dict[str, Any]]:
+    if dimension is RollupDimension.MERCHANT:
+        # normalize_merchant() of the merchant, as in dimension_key
+        key: Any = {"$ifNull": ["$merchant_key", "$merchant", ""]}
+    else:
+        key = {"$ifNull": [f"${dimension.value}", ""]}
+    trunc: dict[str, Any] = {"date": "$date", "unit": granularity.value}
+    if granularity is RollupGranularity.WEEK:
+        trunc["startOfWeek"] = "monday"
+    return [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "period_start": {"$dateTrunc": trunc},
+                    "key": key,
+                    "currency": "$currency",
+                },
+                "total": {"$sum": "$amount"},
+                "total_usd": {"$sum": {"$ifNull": ["$converted_amount_usd", 0]}},
+                "count": {"$sum": 1},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "user_id": "$_id.user_id",
+                "dimension": dimension.value,
+                "granularity": granularity.value,
+                "period_start": "$_id.period_start",
+                "key": "$_id.key",
+                "currency": "$_id.currency",
+                "total": 1,
+                "total_usd": 1,
+                "count": 1,
+                "updated_at": "$$NOW",
+            }
+        },
+        {
+            "$merge": {
+                "into": config.ROLLUPS_COLLECTION,
+                "on": list(ROLLUP_KEY_FIELDS),
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+
+
+async def rebuild_rollups(user_id: str | None = None) -> None:
+    """Recompute rollups from the expenses collection (backfill/repair).
+
+    Args:
+        user_id: Only rebuild this user's rollups; all users when omitted
+    """
+    match: dict[str, Any] = {"user_id": user_id} if user_id else {}
+    await backfill_merchant_keys(user_id)
+    await core_data.delete(config.ROLLUPS_COLLECTION, match)
+    for granularity in RollupGranularity:
+        for dimension in RollupDimension:
+            await core_data.query_read(
+                "expenses", _rebuild_pipeline(match, dimension, granularity)
+            )
+    logger.info(f"Rollups rebuilt for {user_id or 'all users'}")
+
+
+async def get_rollups(
+    user_id: str,
+    dimension: RollupDimension,
+    granularity: RollupGranularity,
+    start: datetime,
+    end: datetime,
+    key: str | None = None,
+) -> list[dict[str, Any]]:
+    """Summary documents for a user whose period starts in [start, end)."""
+    match: dict[str, Any] = {
+        "user_id": user_id,
+        "dimension": dimension.value,
+        "granularity": granularity.value,
+        "period_start": {
+            "$gte": period_start(start, granularity),
+            "$lt": end,
+        },
+    }
+    if key is not None:
+        match["key"] = key
+    return await core_data.query_read(
+        config.ROLLUPS_COLLECTION,
+        [{"$match": match}, {"$sort": {"period_start": 1}}, {"$project": {"_id": 0}}],
+    )
+
+
+async def spending_by(
+    user_id: str,
+    dimension: RollupDimension,
+    start: datetime,
+    end: datetime,
+    granularity: RollupGranularity = RollupGranularity.MONTH,
+    limit: int | None = None,
+) -> list[dict[str, Any]]:
+    """Totals per category/merchant and currency over a range, largest first.
+
+    The range is widened to whole periods of `granularity`.
+    """
+    pipeline: list[dict[str, Any]] = [
+        {
+            "$match": {
+                "user_id": user_id,
+                "dimension": dimension.value,
+                "granularity": granularity.value,
+                "period_start": {"$gte": period_start(start, granularity), "$lt": end},
+            }
+        },
+        {
+            "$group": {
+                "_id": {"key": "$key", "currency": "$currency"},
+                "total": {"$sum": "$total"},
+                "total_usd": {"$sum": "$total_usd"},
+                "count": {"$sum": "$count"},
+            }
+        },
+        {"$sort": {"total": -1}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append(
+        {
+            "$project": {
+                "_id": 0,
+                "key": "$_id.key",
+                "currency": "$_id.currency",
+                "total": 1,
+                "total_usd": 1,
+                "count": 1,
+            }
+        }
+    )
+    return await core_data.query_read(config.ROLLUPS_COLLECTION, pipeline)
+
+
+async def top_merchants(
+    user_id: str, start: datetime, end: datetime, limit: int = 10
+) -> list[dict[str, Any]]:
+    return await spending_by(user_id, RollupDimension.MERCHANT, start, end, limit=limit)
+
+
+async def month_over_month(
+    user_id: str, months: int = 2, now: datetime | None = None
+) -> list[dict[str, Any]]:
+    """Per-category monthly totals for the last `months` months, oldest first."""
+    current = period_start(now or datetime.now(timezone.utc), RollupGranularity.MONTH)
+    start = current
+    for _ in range(months - 1):
+        start = period_start(start - timedelta(days=1), RollupGranularity.MONTH)
+    return await get_rollups(
+        user_id,
+        RollupDimension.CATEGORY,
+        RollupGranularity.MONTH,
+        start,
+        period_start(current + timedelta(days=31), RollupGranularity.MONTH),
+    )
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain spending rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user-id", help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    await Database.connect()
+    try:
+        await rebuild_rollups(args.user_id)
+    finally:
+        await Database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,171 @@
+"""Read-through cache of per-user hot data: preferences and budgets.
+
+Every expense needs its user's preferences and budgets, which rarely
+change, so they are kept in memory with a TTL per kind. Concurrent misses
+for the same user share one Mongo read (single-flight). Entries are dropped
+as soon as core_data writes to their collection; writes made elsewhere
+(another process, the shell) are picked up through a Mongo change stream
+when USER_CACHE_CHANGE_STREAMS is on, and by the TTL otherwise.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from app.config import config
+from app.database import core_data
+from app.database.db import Database
+from app.utils.log import logger
+from app.utils.metrics import Counter, Gauge
+
+Key = tuple[str, str]
+Loader = Callable[[str], Awaitable[Any]]
+
+# Cached collections and how long their entries live, by collection name
+TTLS: dict[str, float] = {
+    "preferences": config.USER_CACHE_PREFERENCES_TTL,
+    "budgets": config.USER_CACHE_BUDGETS_TTL,
+}
+
+
+class UserDataCache:
+    """LRU of (collection, user_id) → value, each entry with its own expiry."""
+
+    def __init__(self, max_entries: int = config.USER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Key, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Key, asyncio.Future] = {}
+        # In-flight loads invalidated before they finished: not stored
+        self._stale: set[Key] = set()
+        self._task: asyncio.Task | None = None
+        self.lookups: dict[tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _count(self, kind: str, result: str) -> None:
+        self.lookups[kind, result] = self.lookups.get((kind, result), 0) + 1
+
+    async def get(
+        self, kind: str, user_id: str, loader: Loader, ttl: Optional[float] = None
+    ) -> Any:
+        """Cached value, or the loader's result shared by every concurrent miss."""
+        key = (kind, user_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._count(kind, "hit")
+            self._entries.move_to_end(key)
+            return entry[1]
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count(kind, "coalesced")
+        else:
+            self._count(kind, "miss")
+            # A task of its own, so a caller going away does not cancel the others
+            task = self._inflight[key] = asyncio.ensure_future(
+                self._load(key, loader, ttl if ttl is not None else TTLS[kind])
+            )
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Key, loader: Loader, ttl: float) -> Any:
+        try:
+            value = await loader(key[1])
+            if key not in self._stale:
+                self._entries[key] = (time.monotonic() + ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            del self._inflight[key]
+            self._stale.discard(key)
+
+    def invalidate(self, kind: str, user_id: str) -> None:
+        key = (kind, user_id)
+        self._entries.pop(key, None)
+        if key in self._inflight:
+            self._stale.add(key)
+
+    def clear(self, kind: str) -> None:
+        for key in [key for key in self._entries if key[0] == kind]:
+            del self._entries[key]
+        self._stale.update(key for key in self._inflight if key[0] == kind)
+
+    def on_write(self, collection_name: str, user_ids: Optional[set[str]]) -> None:
+        """core_data write listener."""
+        if collection_name not in TTLS:
+            return
+        if user_ids is None:
+            self.clear(collection_name)
+        else:
+            for user_id in user_ids:
+                self.invalidate(collection_name, user_id)
+
+    def start(self) -> None:
+        """Follow writes made outside this process through a change stream."""
+        if config.USER_CACHE_CHANGE_STREAMS and self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self) -> None:
+        db = Database.get_database()
+        if db is None:
+            return
+        pipeline = [{"$match": {"ns.coll": {"$in": list(TTLS)}}}]
+        try:
+            # Deletes carry no document; updates get theirs looked up
+            async with db.watch(pipeline, full_document="updateLookup") as stream:
+                async for change in stream:
+                    user_id = (change.get("fullDocument") or {}).get("user_id")
+                    self.on_write(
+                        change["ns"]["coll"],
+                        {user_id} if isinstance(user_id, str) else None,
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # e.g. a standalone server: change streams need a replica set
+            logger.error(f"User cache change stream stopped, relying on TTLs: {e}")
+
+
+user_cache = UserDataCache()
+core_data.add_write_listener(user_cache.on_write)
+
+Counter(
+    "user_cache_lookups_total",
+    "Per-user preferences/budgets cache lookups by result",
+    ("kind", "result"),
+    function=lambda: dict(user_cache.lookups),
+)
+Gauge(
+    "user_cache_entries",
+    "Entries in the per-user preferences/budgets cache",
+    function=lambda: {(): len(user_cache)},
+)
+
+
+async def _load_preferences(user_id: str) -> dict[str, Any]:
+    return await core_data.read_one("preferences", {"user_id": user_id})
+
+
+async def _load_budgets(user_id: str) -> list[dict[str, Any]]:
+    return await core_data.query_read("budgets", [{"$match": {"user_id": user_id}}])
+
+
+async def get_preferences(user_id: str) -> dict[str, Any]:
+    """The user's preferences document, or {} if they have none."""
+    return await user_cache.get("preferences", user_id, _load_preferences)
+
+
+async def get_budgets(user_id: str) -> list[dict[str, Any]]:
+    """Every budget of the user, current or not."""
+    return await user_cache.get("budgets", user_id, _load_budgets)
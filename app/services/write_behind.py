@@ -0,0 +1,258 @@
+"""Write-behind persistence for validated expenses.
+
+Documents get their ObjectId client-side and are acknowledged as soon as
+they are queued; they reach Mongo in unordered `insert_many` batches when
+either `max_batch_size` documents are pending or `max_wait_ms` has passed.
+A batch that cannot be written in time is appended to a local JSONL spill
+file (Extended JSON, fsynced) and replayed once Mongo accepts writes again.
+Every stored document is announced to `on_inserted` once, by the attempt
+that stored it.
+"""
+
+import asyncio
+import os
+from datetime import timezone
+from typing import Any, Awaitable, Callable
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+from app.config import config
+from app.database import core_data
+from app.services.dedup import DUPLICATE_KEY, deduplicator, is_fingerprint_conflict
+from app.utils.log import logger
+
+InsertListener = Callable[[list[dict[str, Any]]], Awaitable[None]]
+
+# Replayed documents get back the aware UTC datetimes they were queued with
+_SPILL_JSON_OPTIONS = json_util.JSONOptions(tz_aware=True, tzinfo=timezone.utc)
+
+
+class WriteBehindBuffer:
+    """Buffers expense documents and persists them in the background.
+
+    Args:
+        on_inserted: Awaited with every batch once Mongo has stored it
+            (e.g. Agent.after_insert to update rollups and budgets)
+    """
+
+    def __init__(
+        self,
+        on_inserted: InsertListener | None = None,
+        collection_name: str = "expenses",
+        max_batch_size: int = config.WRITE_BEHIND_BATCH_SIZE,
+        max_wait_ms: float = config.WRITE_BEHIND_MAX_WAIT_MS,
+        flush_timeout: float = config.WRITE_BEHIND_FLUSH_TIMEOUT,
+        spill_path: str = config.WRITE_BEHIND_SPILL_PATH,
+    ):
+        self.on_inserted = on_inserted
+        self.collection_name = collection_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.flush_timeout = flush_timeout
+        self.spill_path = spill_path
+        self._pending: list[dict[str, Any]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self._spill_lock = asyncio.Lock()
+        self._replaying = False
+
+    def submit(self, document: dict[str, Any]) -> ObjectId:
+        """Queue a document for insertion and return its (new) _id."""
+        document.setdefault("_id", ObjectId())
+        self._pending.append(document)
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return document["_id"]
+
+    async def start(self) -> None:
+        """Replay documents spilled by a previous run."""
+        await self.replay_spill()
+
+    async def close(self) -> None:
+        """Flush pending documents and wait for in-flight batches."""
+        self._flush()
+        # Batches spawn follow-ups (late timeouts, replays): wait for those too
+        while self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._spawn(self._write(batch))
+
+    def _spawn(self, coroutine: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _write(self, batch: list[dict[str, Any]], replay: bool = False) -> bool:
+        """Insert a batch; spill whatever Mongo did not confirm.
+
+        Returns:
+            True if Mongo was reachable (the batch was not spilled)
+        """
+        insert = asyncio.ensure_future(
+            core_data.insert_many(batch, self.collection_name, ordered=False)
+        )
+        done, _ = await asyncio.wait({insert}, timeout=self.flush_timeout)
+        if not done:
+            # Giving up does not stop Motor: if the batch is stored after all,
+            # it is announced then, and its spilled copy replays as duplicates
+            self._spawn(self._settle_late(insert, batch))
+            logger.warning(f"Spilling {len(batch)} expenses: insert timed out")
+            await self._spill(batch, self.spill_path)
+            return False
+        try:
+            inserted, rejected, conflicts = self._outcome(insert, batch)
+        except Exception as e:
+            logger.warning(f"Spilling {len(batch)} expenses: {e!r}")
+            await self._spill(batch, self.spill_path)
+            return False
+        if rejected:
+            logger.error(f"Rejected {len(rejected)} expenses: {rejected[0][1]}")
+            await self._spill(
+                [document for document, _ in rejected], f"{self.spill_path}.rejected"
+            )
+        await self._announce(inserted)
+        if conflicts:
+            await self._renumber(conflicts)
+        if not replay and not self._replaying and os.path.exists(self.spill_path):
+            # Mongo is taking writes again: drain what was spilled meanwhile
+            self._spawn(self.replay_spill())
+        return True
+
+    async def _settle_late(
+        self, insert: asyncio.Future, batch: list[dict[str, Any]]
+    ) -> None:
+        """Announce what a timed-out insert stored once it finishes."""
+        await asyncio.wait({insert})
+        try:
+            inserted, _, _ = self._outcome(insert, batch)
+        except Exception:
+            # Not stored: the spilled copy is replayed
+            return
+        if inserted:
+            logger.info(f"Timed-out insert stored {len(inserted)} expenses")
+        await self._announce(inserted)
+
+    async def _renumber(self, conflicts: list[dict[str, Any]]) -> None:
+        """Store expenses whose fingerprint another process took meanwhile.
+
+        The submitters already hold these _ids, so the expenses are stored
+        as the next repeat of the one that got there first, not dropped.
+        """
+        logger.info(f"Renumbering {len(conflicts)} expenses with taken fingerprints")
+        renumbered = []
+        for document in conflicts:
+            holder = await deduplicator.reclaim(document)
+            if holder is None:
+                renumbered.append(document)
+            else:
+                # The same source transaction: there is nothing to renumber
+                logger.info(f"Dropped {document['_id']}, a duplicate of {holder}")
+        if renumbered:
+            await self._write(renumbered, replay=True)
+
+    def _outcome(self, insert: asyncio.Future, batch: list[dict[str, Any]]) -> tuple[
+        list[dict[str, Any]],
+        list[tuple[dict[str, Any], str]],
+        list[dict[str, Any]],
+    ]:
+        """Split a finished insert into stored, refused and conflicting documents.
+
+        Raises:
+            Whatever the insert raised, if not a BulkWriteError
+        """
+        try:
+            insert.result()
+        except BulkWriteError as e:
+            return self._split_errors(batch, e.details["writeErrors"])
+        return batch, [], []
+
+    async def _announce(self, inserted: list[dict[str, Any]]) -> None:
+        if self.on_inserted is None or not inserted:
+            return
+        try:
+            await self.on_inserted(inserted)
+        except Exception as e:
+            logger.error(f"Write-behind insert listener failed: {e}")
+
+    @staticmethod
+    def _split_errors(
+        batch: list[dict[str, Any]], write_errors: list[dict[str, Any]]
+    ) -> tuple[
+        list[dict[str, Any]],
+        list[tuple[dict[str, Any], str]],
+        list[dict[str, Any]],
+    ]:
+        """Stored documents, (document, reason) refused ones and fingerprint conflicts.
+
+        A duplicate _id means an earlier attempt stored the document (e.g. a
+        timed-out insert, or a replay cut short) and announced it then, so
+        it is neither stored again nor announced twice.
+        """
+        refused = {
+            error["index"]: error["errmsg"]
+            for error in write_errors
+            if error["code"] != DUPLICATE_KEY
+        }
+        conflicts = [
+            batch[error["index"]]
+            for error in write_errors
+            if is_fingerprint_conflict(error)
+        ]
+        failed = {error["index"] for error in write_errors}
+        inserted = [doc for i, doc in enumerate(batch) if i not in failed]
+        rejected = [(batch[i], reason) for i, reason in refused.items()]
+        return inserted, rejected, conflicts
+
+    async def _spill(self, documents: list[dict[str, Any]], path: str) -> None:
+        lines = "".join(json_util.dumps(document) + "\n" for document in documents)
+        async with self._spill_lock:
+            await asyncio.to_thread(_append_durably, path, lines)
+
+    async def replay_spill(self) -> int:
+        """Insert spilled documents; those that fail again are re-spilled.
+
+        Returns:
+            Number of documents replayed
+        """
+        if self._replaying or not os.path.exists(self.spill_path):
+            return 0
+        self._replaying = True
+        replay_path = f"{self.spill_path}.replay"
+        try:
+            async with self._spill_lock:
+                # A leftover replay file means the last replay was interrupted
+                if not os.path.exists(replay_path):
+                    os.replace(self.spill_path, replay_path)
+            with open(replay_path, encoding="utf-8") as handle:
+                documents = [
+                    json_util.loads(line, json_options=_SPILL_JSON_OPTIONS)
+                    for line in handle
+                    if line.strip()
+                ]
+            logger.info(f"Replaying {len(documents)} spilled expenses")
+            for start in range(0, len(documents), self.max_batch_size):
+                await self._write(
+                    documents[start : start + self.max_batch_size], replay=True
+                )
+            os.remove(replay_path)
+            return len(documents)
+        finally:
+            self._replaying = False
+
+
+def _append_durably(path: str, text: str) -> None:
+    with open(path, "a", encoding="utf-8") as handle:
+        handle.write(text)
+        handle.flush()
+        os.fsync(handle.fileno())
@@ -13,3 +13,68 @@ class Currencies(Enum):
     EUR = "EUR"
     JPY = "JPY"
     GBP = "GBP"
+
+
+class ParseMode(Enum):
+    LLM = "llm"
+    HYBRID = "hybrid"
+
+
+class LLMProfile(Enum):
+    PARSE = "parse"
+    PARSE_BATCH = "parse_batch"
+    VALIDATE = "validate"
+    QUERY = "query"
+    STRONG = "strong"
+
+
+class RequestPriority(Enum):
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
+class QueryIntent(Enum):
+    TOTAL = "total"
+    BREAKDOWN = "breakdown"
+    LIST = "list"
+
+
+class QueryGroupBy(Enum):
+    CATEGORY = "category"
+    MERCHANT = "merchant"
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class RelativePeriod(Enum):
+    TODAY = "today"
+    YESTERDAY = "yesterday"
+    THIS_WEEK = "this_week"
+    LAST_WEEK = "last_week"
+    THIS_MONTH = "this_month"
+    LAST_MONTH = "last_month"
+    THIS_YEAR = "this_year"
+    LAST_YEAR = "last_year"
+    LAST_7_DAYS = "last_7_days"
+    LAST_30_DAYS = "last_30_days"
+    LAST_90_DAYS = "last_90_days"
+
+
+class RollupGranularity(Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class RollupDimension(Enum):
+    CATEGORY = "category"
+    MERCHANT = "merchant"
+
+
+class AmountSign(Enum):
+    # Debits negative if the import has any negative amount, else unsigned
+    INFER = "infer"
+    UNSIGNED = "unsigned"
+    DEBITS_NEGATIVE = "debits_negative"
+    DEBITS_POSITIVE = "debits_positive"
@@ -0,0 +1,254 @@
+"""In-process counters and histograms rendered in Prometheus text format.
+
+Recording is a dict lookup plus a bisect, cheap enough for every request.
+Metrics whose value lives elsewhere (cache hit counts, ...) are read at
+scrape time through a callback instead of being mirrored on the hot path.
+"""
+
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Iterator, Mapping
+
+# Latency buckets in seconds, from a cache hit to a slow LLM call
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, **extra: str) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _key(self, labels: Mapping[str, Any]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonic count, or a callback returning {label values: count}."""
+
+    type = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        function: Callable[[], Mapping[LabelValues, float]] | None = None,
+    ):
+        self._values: dict[LabelValues, float] = {}
+        self.function = function
+        super().__init__(name, documentation, labelnames)
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        values = self.function() if self.function else self._values
+        for key, value in values.items():
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Current value, usually read through a callback at scrape time."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum, count]
+        self._series: dict[LabelValues, tuple[list[int], list[float]]] = {}
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0, 0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+        series[1][1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, (total, count)) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, le=_format_value(bound))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+DB_OPERATION_SECONDS = Histogram(
+    "db_operation_seconds",
+    "Duration of core_data operations",
+    ("operation", "collection"),
+)
+DB_OPERATION_ERRORS = Counter(
+    "db_operation_errors_total",
+    "core_data operations that raised",
+    ("operation", "collection"),
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds",
+    "Duration of structured LLM calls, cache lookups included",
+    ("schema", "profile", "outcome"),
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens reported by the model",
+    ("schema", "profile", "kind"),
+)
+LLM_ESCALATIONS = Counter(
+    "llm_escalations_total",
+    "Structured calls retried on the strong profile after failing validation",
+    ("schema", "profile"),
+)
+AGENT_STAGE_SECONDS = Histogram(
+    "agent_stage_seconds",
+    "Duration of each expense pipeline stage",
+    ("stage",),
+)
+
+
+def instrument_db(operation: Callable) -> Callable:
+    """Time a core_data function, labelled with its `collection_name` argument.
+
+    Works for coroutines and async generators (timed until exhausted/closed).
+    """
+    name = operation.__name__
+    position = list(inspect.signature(operation).parameters).index("collection_name")
+
+    def collection_of(args: tuple, kwargs: dict[str, Any]) -> str:
+        if "collection_name" in kwargs:
+            return kwargs["collection_name"]
+        return args[position] if len(args) > position else ""
+
+    if inspect.isasyncgenfunction(operation):
+
+        @functools.wraps(operation)
+        async def generator_wrapper(*args, **kwargs) -> AsyncIterator[Any]:
+            collection = collection_of(args, kwargs)
+            started = time.perf_counter()
+            generator = operation(*args, **kwargs)
+            try:
+                async for item in generator:
+                    yield item
+            except Exception:
+                DB_OPERATION_ERRORS.inc(operation=name, collection=collection)
+                raise
+            finally:
+                await generator.aclose()
+                DB_OPERATION_SECONDS.observe(
+                    time.perf_counter() - started, operation=name, collection=collection
+                )
+
+        return generator_wrapper
+
+    @functools.wraps(operation)
+    async def wrapper(*args, **kwargs):
+        collection = collection_of(args, kwargs)
+        started = time.perf_counter()
+        try:
+            return await operation(*args, **kwargs)
+        except Exception:
+            DB_OPERATION_ERRORS.inc(operation=name, collection=collection)
+            raise
+        finally:
+            DB_OPERATION_SECONDS.observe(
+                time.perf_counter() - started, operation=name, collection=collection
+            )
+
+    return wrapper
@@ -1,4 +1,222 @@
-def extract_amount(text: str):
+import re
+from datetime import date as date_type
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from word2number import w2n
+
+from app.models.agent import ExpenseExtraction
+
+DEFAULT_CATEGORY = "Other"
+
+# Mirrors the keyword table in the parse_expense prompt
+CATEGORY_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "Food & Dining": ("restaurant", "cafe", "coffee", "snack", "lunch", "dinner"),
+    "Transportation": ("taxi", "uber", "bus", "train", "parking", "toll"),
+    "Shopping": ("mall", "supermarket", "clothing", "electronics", "online shop"),
+    "Entertainment": ("movie", "concert", "theater", "streaming", "tickets"),
+    "Utilities": ("electricity", "water", "internet", "cable"),
+    "Health & Wellness": ("pharmacy", "medicine", "gym", "doctor", "dental"),
+    "Professional Services": ("lawyer", "accountant", "consultant", "freelancer"),
+    "Travel": ("hotel", "flight", "accommodation", "itinerary"),
+}
+
+# Well known merchants whose names carry no category keyword
+KNOWN_MERCHANTS: dict[str, str] = {
+    "starbucks": "Food & Dining",
+    "mcdonald's": "Food & Dining",
+    "mcdonalds": "Food & Dining",
+    "subway": "Food & Dining",
+    "chipotle": "Food & Dining",
+    "domino's": "Food & Dining",
+    "dominos": "Food & Dining",
+    "kfc": "Food & Dining",
+    "lyft": "Transportation",
+    "uber": "Transportation",
+    "uber eats": "Food & Dining",
+    "shell": "Transportation",
+    "amazon": "Shopping",
+    "walmart": "Shopping",
+    "target": "Shopping",
+    "ikea": "Shopping",
+    "netflix": "Entertainment",
+    "spotify": "Entertainment",
+    "airbnb": "Travel",
+    "cvs": "Health & Wellness",
+    "walgreens": "Health & Wellness",
+}
+
+CURRENCY_SYMBOLS: dict[str, str] = {
+    "$": "USD",
+    "€": "EUR",
+    "£": "GBP",
+    "₹": "INR",
+    "¥": "JPY",
+}
+
+CURRENCY_WORDS: dict[str, str] = {
+    "usd": "USD",
+    "dollar": "USD",
+    "dollars": "USD",
+    "bucks": "USD",
+    "eur": "EUR",
+    "euro": "EUR",
+    "euros": "EUR",
+    "gbp": "GBP",
+    "pound": "GBP",
+    "pounds": "GBP",
+    "quid": "GBP",
+    "inr": "INR",
+    "rs": "INR",
+    "rupee": "INR",
+    "rupees": "INR",
+    "jpy": "JPY",
+    "yen": "JPY",
+}
+
+# Confidence weights of the local parser, summing to 1.0
+_WEIGHT_AMOUNT = 0.35
+_WEIGHT_MERCHANT = 0.25
+_WEIGHT_CATEGORY = 0.2
+_WEIGHT_CURRENCY = 0.1
+_WEIGHT_DATE = 0.1
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_CURRENCY_WORD = "|".join(sorted(CURRENCY_WORDS, key=len, reverse=True))
+_NUMBER_WORDS = (
+    "zero|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|"
+    "thirteen|fourteen|fifteen|sixteen|seventeen|eighteen|nineteen|twenty|"
+    "thirty|forty|fifty|sixty|seventy|eighty|ninety|hundred|thousand|million"
+)
+_WEEKDAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+_MONTHS = {
+    name: index
+    for index, names in enumerate(
+        (
+            ("jan", "january"),
+            ("feb", "february"),
+            ("mar", "march"),
+            ("apr", "april"),
+            ("may",),
+            ("jun", "june"),
+            ("jul", "july"),
+            ("aug", "august"),
+            ("sep", "sept", "september"),
+            ("oct", "october"),
+            ("nov", "november"),
+            ("dec", "december"),
+        ),
+        start=1,
+    )
+    for name in names
+}
+_MONTH = "|".join(sorted(_MONTHS, key=len, reverse=True))
+
+_AMOUNT_RE = re.compile(
+    rf"(?:(?P<symbol>[$€£₹¥])|\b(?P<prefix>usd|eur|gbp|inr|jpy|rs)\.?)?\s?"
+    rf"(?<![\d.,\-/])(?P<number>{_NUMBER})(?![\d\-/]|[.,]\d)"
+    rf"(?:\s?(?P<suffix>{_CURRENCY_WORD})\b)?"
+    rf"(?P<unit>\s?(?:days?|weeks?|months?|years?|st|nd|rd|th|am|pm|ago)\b)?",
+    re.IGNORECASE,
+)
+_WORD_AMOUNT_RE = re.compile(
+    rf"\b(?P<words>(?:(?:{_NUMBER_WORDS})(?:[\s\-]+(?:and[\s\-]+)?)?)+)"
+    rf"\s*(?P<suffix>{_CURRENCY_WORD})\b",
+    re.IGNORECASE,
+)
+_CURRENCY_WORD_RE = re.compile(rf"\b(?:{_CURRENCY_WORD})\b", re.IGNORECASE)
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_MONTH_DAY_RE = re.compile(
+    rf"\b(?P<month>{_MONTH})\.?\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?"
+    rf"(?:,?\s+(?P<year>\d{{4}}))?\b",
+    re.IGNORECASE,
+)
+_DAY_MONTH_RE = re.compile(
+    rf"\b(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<month>{_MONTH})\b"
+    rf"(?:,?\s+(?P<year>\d{{4}}))?",
+    re.IGNORECASE,
+)
+_AGO_RE = re.compile(
+    r"\b(?P<count>\d+|a|an|one|two|three|four|five|six|seven)\s+"
+    r"(?P<unit>days?|weeks?)\s+ago\b",
+    re.IGNORECASE,
+)
+_WEEKDAY_RE = re.compile(
+    rf"\b(?:(?P<last>last|on|this\s+past)\s+|(?P<next>next|this\s+coming)\s+)?"
+    rf"(?P<weekday>{'|'.join(_WEEKDAYS)})\b",
+    re.IGNORECASE,
+)
+_RELATIVE_RE = re.compile(
+    r"\b(?P<phrase>day\s+before\s+yesterday|yesterday|today|tonight|"
+    r"this\s+morning|last\s+night|last\s+week)\b",
+    re.IGNORECASE,
+)
+# Date-like tokens: when parse_date cannot read them, the date is unknown
+_DATE_HINT_RE = re.compile(
+    rf"\b(?:\d{{4}}-\d{{1,2}}-\d{{1,2}}|\d{{1,2}}/\d{{1,2}}(?:/\d{{2,4}})?|"
+    rf"\d{{1,2}}(?:st|nd|rd|th)|tomorrow|next|ago|"
+    rf"(?:last|this|past)\s+(?:month|year|weekend)|"
+    rf"{'|'.join(name for name in _MONTHS if name != 'may')})\b",
+    re.IGNORECASE,
+)
+_MERCHANT_STOPWORDS = (
+    "for|on|yesterday|today|tonight|tomorrow|last|next|this|with|and|in|to|"
+    "via|using|by|ago|at|from|was|is|paid|spent|bought|the"
+)
+_MERCHANT_RE = re.compile(
+    rf"(?:\b(?:at|from)|@)\s+(?:the\s+)?"
+    rf"(?P<merchant>[A-Za-z0-9][\w'&.\-]*"
+    rf"(?:\s+(?!(?:{_MERCHANT_STOPWORDS})\b)[A-Za-z][\w'&.\-]*){{0,3}})"
+)
+_KEYWORD_RE = re.compile(
+    r"\b(?P<keyword>"
+    + "|".join(
+        re.escape(keyword)
+        for keywords in CATEGORY_KEYWORDS.values()
+        for keyword in keywords
+    )
+    + r")s?\b",
+    re.IGNORECASE,
+)
+_KEYWORD_CATEGORY = {
+    keyword: category
+    for category, keywords in CATEGORY_KEYWORDS.items()
+    for keyword in keywords
+}
+_KNOWN_MERCHANT_RE = re.compile(
+    r"\b(?P<merchant>"
+    + "|".join(
+        re.escape(name) for name in sorted(KNOWN_MERCHANTS, key=len, reverse=True)
+    )
+    + r")\b",
+    re.IGNORECASE,
+)
+_WORD_COUNTS = {
+    "a": 1,
+    "an": 1,
+    "one": 1,
+    "two": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+}
+
+
+def _to_float(number: str) -> float:
+    return float(number.replace(",", ""))
+
+
+def extract_amount(text: str) -> float | None:
     """
     Examples to handle:
       - "spent $50 on groceries" → 50.0
@@ -6,10 +224,49 @@ def extract_amount(text: str):
       - "paid fifty dollars" → 50.0 (word to number)
       - "1,250.99 for rent" → 1250.99
     """
-    pass
+    return _find_amount(text)[0]
+
+
+def _find_amount(text: str) -> tuple[float | None, bool]:
+    """The amount and whether a currency marked it (a bare number may be a quantity)."""
+    fallback = None
+    for match in _AMOUNT_RE.finditer(text):
+        if match.group("unit"):
+            continue
+        if match.group("symbol") or match.group("prefix") or match.group("suffix"):
+            return _to_float(match.group("number")), True
+        if fallback is None:
+            fallback = _to_float(match.group("number"))
+    if fallback is not None:
+        return fallback, False
+
+    match = _WORD_AMOUNT_RE.search(text)
+    if match:
+        try:
+            return float(w2n.word_to_num(match.group("words"))), True
+        except ValueError:
+            return None, False
+    return None, False
 
 
-def extract_currency(text: str):
+def count_amounts(text: str) -> int:
+    """Amounts mentioned in the text, e.g. 3 in "lunch $12, uber $8 and coffee $4".
+
+    When some amounts carry a currency, bare numbers are not counted (they
+    are more likely quantities or days).
+    """
+    marked = unmarked = 0
+    for match in _AMOUNT_RE.finditer(text):
+        if match.group("unit"):
+            continue
+        if match.group("symbol") or match.group("prefix") or match.group("suffix"):
+            marked += 1
+        else:
+            unmarked += 1
+    return marked or unmarked
+
+
+def extract_currency(text: str) -> str | None:
     """
     Examples:
       - "$50" → "USD"
@@ -17,10 +274,35 @@ def extract_currency(text: str):
       - "50 rupees" → "INR"
       - "100 yen" → "JPY"
     """
-    pass
+    for char in text:
+        if char in CURRENCY_SYMBOLS:
+            return CURRENCY_SYMBOLS[char]
+    match = _CURRENCY_WORD_RE.search(text)
+    if match:
+        return CURRENCY_WORDS[match.group(0).lower()]
+    return None
+
 
+def _midnight(day: date_type) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
 
-def parse_date(date: str):
+
+def _calendar_date(
+    year: str | None, month: str, day: str, today: date_type
+) -> date_type | None:
+    try:
+        parsed = date_type(
+            int(year) if year else today.year, _MONTHS[month.lower()], int(day)
+        )
+    except ValueError:
+        return None
+    # Expenses are logged after the fact, so a year-less future date means last year
+    if not year and parsed > today:
+        parsed = parsed.replace(year=parsed.year - 1)
+    return parsed
+
+
+def parse_date(date: str, today: date_type | None = None) -> datetime | None:
     """
     Examples:
       - "yesterday" → datetime for yesterday
@@ -28,14 +310,151 @@ def parse_date(date: str):
       - "2024-12-25" → datetime object
       - "3 days ago" → datetime for 3 days back
     """
-    pass
+    today = today or datetime.now(timezone.utc).date()
+
+    match = _ISO_DATE_RE.search(date)
+    if match:
+        try:
+            return _midnight(date_type(*map(int, match.groups())))
+        except ValueError:
+            return None
+
+    match = _RELATIVE_RE.search(date)
+    if match:
+        phrase = " ".join(match.group("phrase").lower().split())
+        if phrase == "day before yesterday":
+            return _midnight(today - timedelta(days=2))
+        if phrase in ("yesterday", "last night"):
+            return _midnight(today - timedelta(days=1))
+        if phrase == "last week":
+            return _midnight(today - timedelta(days=7))
+        return _midnight(today)
+
+    match = _AGO_RE.search(date)
+    if match:
+        count = match.group("count").lower()
+        days = int(count) if count.isdigit() else _WORD_COUNTS[count]
+        if match.group("unit").lower().startswith("week"):
+            days *= 7
+        return _midnight(today - timedelta(days=days))
 
+    match = _MONTH_DAY_RE.search(date) or _DAY_MONTH_RE.search(date)
+    if match:
+        parsed = _calendar_date(
+            match.group("year"), match.group("month"), match.group("day"), today
+        )
+        return _midnight(parsed) if parsed else None
 
-def extract_merchant(text: str):
+    match = _WEEKDAY_RE.search(date)
+    if match:
+        if match.group("next"):
+            # Expenses are logged after the fact: a future day is not read here
+            return None
+        delta = (today.weekday() - _WEEKDAYS.index(match.group("weekday").lower())) % 7
+        # "last Monday" on a Monday is a week ago, not today
+        if delta == 0 and match.group("last"):
+            delta = 7
+        return _midnight(today - timedelta(days=delta))
+
+    return None
+
+
+def extract_merchant(text: str) -> str | None:
     """
     Examples:
       - "spent $50 at Starbucks" → "Starbucks"
       - "bought from Amazon for $100" → "Amazon"
       - "dinner at McDonald's" → "McDonald's"
     """
-    pass
+    match = _MERCHANT_RE.search(text)
+    if match:
+        merchant = match.group("merchant").rstrip(".,'-")
+        if merchant and not merchant[0].isdigit():
+            return merchant
+    match = _KNOWN_MERCHANT_RE.search(text)
+    if match:
+        return match.group("merchant")
+    return None
+
+
+def categorize(merchant: str | None, text: str = "") -> str | None:
+    """Map a merchant (or, failing that, keywords in the text) to a category.
+
+    Args:
+        merchant: Extracted merchant name, if any
+        text: Full input text used for keyword matching
+
+    Returns:
+        The matched category, or None when nothing matched
+    """
+    if merchant:
+        category = KNOWN_MERCHANTS.get(merchant.lower())
+        if category:
+            return category
+        match = _KNOWN_MERCHANT_RE.search(merchant)
+        if match:
+            return KNOWN_MERCHANTS[match.group("merchant").lower()]
+        match = _KEYWORD_RE.search(merchant)
+        if match:
+            return _KEYWORD_CATEGORY[match.group("keyword").lower()]
+    match = _KEYWORD_RE.search(text)
+    if match:
+        return _KEYWORD_CATEGORY[match.group("keyword").lower()]
+    return None
+
+
+def extract_expense(
+    text: str,
+    today: date_type | None = None,
+    known_category: Callable[[str], str | None] | None = None,
+) -> tuple[ExpenseExtraction | None, float]:
+    """Parse an expense locally without calling the LLM.
+
+    Args:
+        text: Raw user input
+        today: Reference date for relative expressions (defaults to UTC today)
+        known_category: Merchant lookup tried before the keyword tables
+
+    Returns:
+        The extracted expense (None if no amount was found, several were, or
+        the text mentions a date that could not be read) and a confidence
+        score between 0 and 1
+    """
+    # "lunch $12, uber $8" is several expenses: the LLM has to split them
+    if count_amounts(text) > 1:
+        return None, 0.0
+    amount, marked = _find_amount(text)
+    if amount is None:
+        return None, 0.0
+
+    today = today or datetime.now(timezone.utc).date()
+    currency = extract_currency(text)
+    merchant = extract_merchant(text)
+    category = None
+    if merchant and known_category is not None:
+        category = known_category(merchant)
+    category = category or categorize(merchant, text)
+    parsed_date = parse_date(text, today)
+    # "on 12/03", "on the 5th": defaulting to today would store a wrong date
+    if parsed_date is None and _DATE_HINT_RE.search(text):
+        return None, 0.0
+
+    # A bare number may be a quantity ("2 coffees"): never enough on its own
+    confidence = _WEIGHT_AMOUNT if marked else _WEIGHT_AMOUNT / 2
+    if merchant:
+        confidence += _WEIGHT_MERCHANT
+    if category:
+        confidence += _WEIGHT_CATEGORY
+    # Defaults for currency and date (no date words at all) are usually right,
+    # so only half the weight is lost
+    confidence += _WEIGHT_CURRENCY if currency else _WEIGHT_CURRENCY / 2
+    confidence += _WEIGHT_DATE if parsed_date else _WEIGHT_DATE / 2
+
+    extraction = ExpenseExtraction(
+        amount=amount,
+        currency=currency or "USD",
+        merchant=merchant or "",
+        category=category or DEFAULT_CATEGORY,
+        date=(parsed_date.date() if parsed_date else today).isoformat(),
+    )
+    return extraction, round(confidence, 4)
@@ -0,0 +1,110 @@
+"""Benchmark of LLM admission control against a rate-limited fake endpoint.
+
+Sends a mix of interactive and bulk extraction calls through the real
+LLMService and Azure client, with FakeAzureEndpoint enforcing the quota.
+Reports throughput, 429s, failures and latency per priority.
+
+Usage:
+    python -m benchmarks.admission [--requests 300] [--bulk-fraction 0.8]
+        [--rpm 600] [--tpm 0] [--latency-ms 500] [--congestion-ms 10]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://benchmark.openai.azure.com")
+os.environ.setdefault("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "benchmark")
+
+import numpy as np  # noqa: E402
+
+from app.models.agent import ExpenseExtraction  # noqa: E402
+from app.services.admission import admission  # noqa: E402
+from app.services.llm_services import LLMService  # noqa: E402
+from app.utils.enums import RequestPriority  # noqa: E402
+from app.utils.log import logger  # noqa: E402
+from benchmarks.fake_azure import FakeAzureEndpoint  # noqa: E402
+from benchmarks.synthetic import SyntheticData  # noqa: E402
+
+
+async def _one(
+    service: LLMService, text: str, priority: RequestPriority
+) -> tuple[RequestPriority, float, bool]:
+    started = time.perf_counter()
+    try:
+        await service.parse_structured(
+            text, "Extract the expense.", ExpenseExtraction, priority
+        )
+        ok = True
+    except Exception:
+        ok = False
+    return priority, (time.perf_counter() - started) * 1000, ok
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--bulk-fraction", type=float, default=0.8)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--congestion-ms", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    logger.setLevel(logging.ERROR)
+
+    endpoint = FakeAzureEndpoint(
+        rpm=args.rpm,
+        tpm=args.tpm,
+        latency_ms=args.latency_ms,
+        congestion_ms=args.congestion_ms,
+        seed=args.seed,
+    )
+    endpoint.install()
+    # Every prompt is distinct, but keep cache hits out of the measurement
+    service = LLMService(cache=None)
+
+    data = SyntheticData(args.seed)
+    texts = data.expense_texts(args.requests)
+    priorities = [
+        (
+            RequestPriority.BULK
+            if data.rng.random() < args.bulk_fraction
+            else RequestPriority.INTERACTIVE
+        )
+        for _ in texts
+    ]
+    print(
+        f"{args.requests} calls ({args.bulk_fraction:.0%} bulk), quota "
+        f"{args.rpm} RPM / {args.tpm or 'unlimited'} TPM, "
+        f"latency {args.latency_ms:.0f}ms + {args.congestion_ms:.0f}ms per call in flight"
+    )
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(_one(service, text, priority) for text, priority in zip(texts, priorities))
+    )
+    elapsed = time.perf_counter() - started
+
+    failures = sum(not ok for _, _, ok in results)
+    print(
+        f"{len(texts) / elapsed:.1f} calls/s, {endpoint.throttled} x 429, "
+        f"{failures}/{len(texts)} failed, {elapsed:.2f}s, "
+        f"final concurrency limit {int(admission.limit)}"
+    )
+    print(f"  {'priority':<13}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for priority in RequestPriority:
+        values = [ms for p, ms, ok in results if p is priority and ok]
+        if not values:
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(
+            f"  {priority.value:<13}{len(values):>6}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""In-process fake of the Azure OpenAI Responses endpoint.
+
+Plugged into LLMRegistry's HTTP client through httpx.MockTransport, so the
+real AzureChatOpenAI client, LLMService and admission control run unchanged
+against it. The fake enforces requests/tokens-per-minute quotas with 429 +
+Retry-After like the real service, adds latency that grows with load, and
+answers structured-output requests with the local parser.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import deque
+
+import httpx
+
+from app.models.agent import (
+    ExpenseExtraction,
+    ExpenseExtractionBatch,
+    ExpenseExtractionList,
+    ExpenseValidation,
+)
+from app.services.llm_services import LLMRegistry
+from benchmarks.fake_llm import FakeLLMService
+
+_SCHEMAS = {
+    schema.__name__: schema
+    for schema in (
+        ExpenseExtraction,
+        ExpenseExtractionBatch,
+        ExpenseExtractionList,
+        ExpenseValidation,
+    )
+}
+
+
+def _text(content: str | list[dict]) -> str:
+    """Message content, sent either as a string or as a list of parts."""
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content)
+
+
+class FakeAzureEndpoint:
+    """Quota-enforcing fake of POST /openai/responses.
+
+    Args:
+        rpm: Requests accepted per rolling minute (0 = unlimited)
+        tpm: Tokens accepted per rolling minute (0 = unlimited)
+        latency_ms: Latency of one call with nothing else in flight
+        congestion_ms: Extra latency per concurrent call
+        seed: Seed for latency jitter
+    """
+
+    def __init__(
+        self,
+        rpm: int = 600,
+        tpm: int = 0,
+        latency_ms: float = 500,
+        congestion_ms: float = 10,
+        seed: int = 0,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.latency_ms = latency_ms
+        self.congestion_ms = congestion_ms
+        self.rng = random.Random(seed)
+        self._requests: deque[float] = deque()
+        self._tokens: deque[tuple[float, int]] = deque()
+        self.inflight = 0
+        self.accepted = 0
+        self.throttled = 0
+        # Answers only; latency is simulated here, per quota and load
+        self._parser = FakeLLMService(latency_ms=0, jitter=0, per_item_ms=0)
+
+    def _window(self, now: float) -> int:
+        while self._requests and now - self._requests[0] >= 60:
+            self._requests.popleft()
+        while self._tokens and now - self._tokens[0][0] >= 60:
+            self._tokens.popleft()
+        return sum(tokens for _, tokens in self._tokens)
+
+    def _throttle(self, now: float) -> float | None:
+        """Seconds until the quota frees up, or None if the call is accepted."""
+        tokens_used = self._window(now)
+        if self.rpm and len(self._requests) >= self.rpm:
+            return 60 - (now - self._requests[0])
+        if self.tpm and tokens_used >= self.tpm:
+            return 60 - (now - self._tokens[0][0])
+        return None
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        prompt = "\n".join(
+            _text(item["content"]) for item in body["input"] if item["role"] == "user"
+        )
+        now = time.monotonic()
+        wait = self._throttle(now)
+        if wait is not None:
+            self.throttled += 1
+            return httpx.Response(
+                429,
+                headers={"retry-after": f"{max(wait, 0.1):.1f}"},
+                json={"error": {"code": "429", "message": "Rate limit exceeded"}},
+            )
+        input_tokens = sum(len(_text(item["content"])) for item in body["input"]) // 4
+        self._requests.append(now)
+        self.accepted += 1
+
+        self.inflight += 1
+        try:
+            latency = self.latency_ms + self.congestion_ms * (self.inflight - 1)
+            await asyncio.sleep(latency * self.rng.lognormvariate(0, 0.2) / 1000)
+        finally:
+            self.inflight -= 1
+
+        text = await self._answer(body, prompt)
+        output_tokens = len(text) // 4
+        self._tokens.append((now, input_tokens + output_tokens))
+        return httpx.Response(
+            200,
+            json={
+                "id": f"resp_{self.accepted}",
+                "object": "response",
+                "created_at": int(time.time()),
+                "model": body.get("model", "fake"),
+                "status": "completed",
+                "output": [
+                    {
+                        "type": "message",
+                        "id": f"msg_{self.accepted}",
+                        "role": "assistant",
+                        "status": "completed",
+                        "content": [
+                            {"type": "output_text", "text": text, "annotations": []}
+                        ],
+                    }
+                ],
+                "parallel_tool_calls": True,
+                "tool_choice": "auto",
+                "tools": [],
+                "usage": {
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                    "total_tokens": input_tokens + output_tokens,
+                    "input_tokens_details": {"cached_tokens": 0},
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                },
+            },
+        )
+
+    async def _answer(self, body: dict, prompt: str) -> str:
+        schema = _SCHEMAS.get(body.get("text", {}).get("format", {}).get("name"))
+        if schema is None:
+            return "ok"
+        parsed = await self._parser.parse_structured(prompt, "", schema)
+        return parsed.model_dump_json()
+
+    def install(self) -> None:
+        """Route LLMRegistry's HTTP client to this fake."""
+        LLMRegistry._chat_models.clear()
+        LLMRegistry._structured.clear()
+        LLMRegistry._http_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(self.handle)
+        )
@@ -0,0 +1,137 @@
+"""Offline stand-in for LLMService with configurable latency and errors.
+
+Answers come from the local rule-based parser, so they are deterministic for
+a given prompt; latency and failures are drawn from a generator seeded with
+the prompt, so a run can be replayed exactly.
+"""
+
+import asyncio
+import hashlib
+import random
+import re
+from typing import Any, Type
+
+from langchain_core.messages import AIMessage
+from pydantic import BaseModel
+
+from app.models.agent import (
+    ExpenseExtraction,
+    ExpenseExtractionBatch,
+    ExpenseExtractionList,
+    ExpenseValidation,
+    IndexedExpenseExtraction,
+)
+from app.utils.enums import LLMProfile, RequestPriority
+from app.utils.nlp_parser import DEFAULT_CATEGORY, extract_amount, extract_expense
+
+_NUMBERED_LINE = re.compile(r"^(\d+)\.\s+(.*)$")
+_EXPENSE_SEPARATOR = re.compile(r"[,;]|\band\b")
+
+
+class SimulatedLLMError(RuntimeError):
+    pass
+
+
+class FakeLLMService:
+    """Drop-in for LLMService in benchmarks (`agent.llm_service = FakeLLMService()`).
+
+    Args:
+        latency_ms: Median latency of one call
+        jitter: Spread of the log-normal latency (0 for constant latency)
+        error_rate: Fraction of calls that raise SimulatedLLMError
+        per_item_ms: Extra latency per message in a batched call
+        seed: Mixed into every per-call generator
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 800,
+        jitter: float = 0.3,
+        error_rate: float = 0.0,
+        per_item_ms: float = 40,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.per_item_ms = per_item_ms
+        self.seed = seed
+        self.calls = 0
+        self.errors = 0
+
+    def _rng(self, user_prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{user_prompt}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    async def _simulate(self, user_prompt: str, items: int = 1) -> None:
+        self.calls += 1
+        rng = self._rng(user_prompt)
+        latency = self.latency_ms * rng.lognormvariate(0, self.jitter)
+        latency += self.per_item_ms * (items - 1)
+        await asyncio.sleep(latency / 1000)
+        if rng.random() < self.error_rate:
+            self.errors += 1
+            raise SimulatedLLMError("Simulated LLM failure")
+
+    @staticmethod
+    def _extract(text: str) -> ExpenseExtraction:
+        extraction, _ = extract_expense(text)
+        if extraction is not None:
+            return extraction
+        # What a model would make of a message the rules cannot read
+        return ExpenseExtraction(
+            amount=0.0,
+            merchant=text[:40] or "Unknown",
+            category=DEFAULT_CATEGORY,
+            date="",
+        )
+
+    async def chat(
+        self,
+        user_messages: str,
+        system_prompt: str,
+        response_format=None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        profile: LLMProfile = LLMProfile.STRONG,
+    ) -> AIMessage:
+        await self._simulate(user_messages)
+        return AIMessage(content="ok")
+
+    async def parse_structured(
+        self,
+        user_prompt: str,
+        system_prompt: str,
+        output_schema: Type[BaseModel],
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        profile: LLMProfile = LLMProfile.STRONG,
+    ) -> Any:
+        if output_schema is ExpenseExtractionBatch:
+            lines = [
+                match.groups()
+                for match in map(_NUMBERED_LINE.match, user_prompt.splitlines())
+                if match
+            ]
+            await self._simulate(user_prompt, items=len(lines))
+            return ExpenseExtractionBatch(
+                expenses=[
+                    IndexedExpenseExtraction(
+                        index=int(index), **self._extract(text).model_dump()
+                    )
+                    for index, text in lines
+                ]
+            )
+        await self._simulate(user_prompt)
+        if output_schema is ExpenseExtractionList:
+            parts = [
+                part
+                for part in _EXPENSE_SEPARATOR.split(user_prompt)
+                if extract_amount(part) is not None
+            ]
+            return ExpenseExtractionList(
+                expenses=[self._extract(part) for part in parts or [user_prompt]]
+            )
+        if output_schema is ExpenseExtraction:
+            return self._extract(user_prompt)
+        if output_schema is ExpenseValidation:
+            return ExpenseValidation(is_valid=True)
+        raise NotImplementedError(f"No fake response for {output_schema.__name__}")
@@ -0,0 +1,305 @@
+"""Check the app's query shapes against its indexes with explain().
+
+Seeds a scratch database on a local mongod with synthetic expenses, budgets,
+preferences and rollups, creates the app's index catalogue, then explains
+every query shape the app issues. Plans that scan the collection, sort in
+memory or examine far more documents than they return are flagged, and an
+index is proposed for them (equality fields, then sort fields, then range
+fields). `--apply` creates the proposals; creating an existing index is a
+no-op, so runs are idempotent.
+
+mongomock has no query planner, so a real mongod is required.
+
+Usage:
+    python -m benchmarks.index_advisor [--uri mongodb://localhost:27017]
+        [--rows 10000] [--no-seed] [--bare] [--apply]
+"""
+
+import argparse
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from pymongo import ASCENDING, DESCENDING, InsertOne, MongoClient
+from pymongo.database import Database as SyncDatabase
+
+from app.config import config
+from app.database.indexes import INDEXES
+from app.services.rollups import _rebuild_pipeline
+from app.utils.enums import BudgetPeriod, RollupDimension, RollupGranularity
+from app.utils.nlp_parser import CATEGORY_KEYWORDS, KNOWN_MERCHANTS
+
+SEED_BATCH = 10_000
+ROWS_PER_USER = 1_000
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+DAYS = 3 * 365
+CURRENCIES = ["USD", "EUR", "GBP", "INR", "JPY"]
+
+# Plans examining more documents than this per returned document are flagged
+MAX_DOCS_PER_RESULT = 10
+
+
+@dataclass
+class QueryShape:
+    """One query the app issues, with representative values."""
+
+    name: str
+    collection: str
+    filter: dict[str, Any]
+    sort: list[tuple[str, int]] = field(default_factory=list)
+    limit: int = 0
+
+
+def query_shapes(user_id: str, budget_id: str) -> list[QueryShape]:
+    month = START + timedelta(days=400)
+    return [
+        QueryShape(
+            "expenses: list page (GET /expenses)",
+            "expenses",
+            {"user_id": user_id},
+            [("date", DESCENDING), ("_id", DESCENDING)],
+            limit=50,
+        ),
+        QueryShape(
+            "expenses: analytics frame load",
+            "expenses",
+            {"user_id": user_id},
+        ),
+        QueryShape(
+            "expenses: category in date range",
+            "expenses",
+            {
+                "user_id": user_id,
+                "category": next(iter(CATEGORY_KEYWORDS)),
+                "date": {"$gte": month, "$lt": month + timedelta(days=90)},
+            },
+            [("date", DESCENDING)],
+        ),
+        QueryShape(
+            "expenses: merchant in date range",
+            "expenses",
+            {
+                "user_id": user_id,
+                "merchant": next(iter(KNOWN_MERCHANTS)),
+                "date": {"$gte": month, "$lt": month + timedelta(days=90)},
+            },
+            [("date", DESCENDING)],
+        ),
+        QueryShape(
+            "budgets: all of a user (user cache load)",
+            "budgets",
+            {"user_id": user_id},
+        ),
+        QueryShape(
+            "budget_usage: status",
+            config.BUDGET_USAGE_COLLECTION,
+            {"budget_id": budget_id, "period_start": month},
+        ),
+        QueryShape(
+            "rollups: monthly categories",
+            config.ROLLUPS_COLLECTION,
+            {
+                "user_id": user_id,
+                "dimension": RollupDimension.CATEGORY.value,
+                "granularity": RollupGranularity.MONTH.value,
+                "period_start": {"$gte": month, "$lt": month + timedelta(days=365)},
+            },
+            [("period_start", ASCENDING)],
+        ),
+        QueryShape(
+            "preferences: by user",
+            "preferences",
+            {"user_id": user_id},
+        ),
+    ]
+
+
+def seed(db: SyncDatabase, rows: int) -> None:
+    """Replace the scratch collections with `rows` synthetic expenses."""
+    rng = random.Random(42)
+    categories = list(CATEGORY_KEYWORDS)
+    merchants = list(KNOWN_MERCHANTS)
+    users = [f"user-{i}" for i in range(max(rows // ROWS_PER_USER, 1))]
+    for name in ["expenses", "budgets", "preferences", config.ROLLUPS_COLLECTION]:
+        db.drop_collection(name)
+
+    started = time.perf_counter()
+    batch: list[InsertOne] = []
+    for _ in range(rows):
+        amount = round(rng.lognormvariate(3, 1), 2)
+        batch.append(
+            InsertOne(
+                {
+                    "user_id": rng.choice(users),
+                    "amount": amount,
+                    "currency": rng.choice(CURRENCIES),
+                    "converted_amount_usd": amount,
+                    "merchant": rng.choice(merchants),
+                    "category": rng.choice(categories),
+                    "date": START + timedelta(minutes=rng.randrange(DAYS * 1440)),
+                    "created_at": datetime.now(timezone.utc),
+                    "tags": [],
+                }
+            )
+        )
+        if len(batch) == SEED_BATCH:
+            db["expenses"].bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        db["expenses"].bulk_write(batch, ordered=False)
+
+    db["budgets"].insert_many(
+        [
+            {
+                "user_id": user,
+                "category": category,
+                "amount": 500.0,
+                "currency": "USD",
+                "period": BudgetPeriod.MONTHLY.value,
+                "start_date": START,
+                "end_date": START + timedelta(days=DAYS),
+            }
+            for user in users
+            for category in categories
+        ]
+    )
+    db["preferences"].insert_many(
+        [
+            {
+                "user_id": user,
+                "default_currency": "USD",
+                "categories_list": categories,
+                "timezone": "UTC",
+            }
+            for user in users
+        ]
+    )
+    for granularity in RollupGranularity:
+        for dimension in RollupDimension:
+            db["expenses"].aggregate(
+                _rebuild_pipeline({}, dimension, granularity), allowDiskUse=True
+            )
+    print(
+        f"Seeded {rows} expenses for {len(users)} users "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+def create_app_indexes(db: SyncDatabase) -> None:
+    for collection_name, models in INDEXES.items():
+        db[collection_name].create_indexes(models)
+
+
+def _stages(plan: dict[str, Any]) -> list[dict[str, Any]]:
+    """Flatten a winning plan tree into its stages."""
+    # Slot-based engine plans nest the classic tree under queryPlan
+    plan = plan.get("queryPlan", plan)
+    stages = [plan]
+    for key in ("inputStage", "outerStage", "innerStage"):
+        if key in plan:
+            stages.extend(_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_stages(child))
+    return stages
+
+
+def analyze(explain: dict[str, Any]) -> dict[str, Any]:
+    stages = _stages(explain["queryPlanner"]["winningPlan"])
+    names = [stage["stage"] for stage in stages]
+    stats = explain.get("executionStats", {})
+    returned = stats.get("nReturned", 0)
+    examined = stats.get("totalDocsExamined", 0)
+    problems = []
+    if "COLLSCAN" in names:
+        problems.append("COLLSCAN")
+    if "SORT" in names:
+        problems.append("in-memory SORT")
+    if examined > MAX_DOCS_PER_RESULT * max(returned, 1):
+        problems.append(f"{examined} docs examined for {returned}")
+    return {
+        "indexes": [s["indexName"] for s in stages if "indexName" in s],
+        "returned": returned,
+        "docs_examined": examined,
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "millis": stats.get("executionTimeMillis", 0),
+        "problems": problems,
+    }
+
+
+def propose_index(shape: QueryShape) -> list[tuple[str, int]]:
+    """Equality fields, then sort fields, then range fields (ESR)."""
+    equality, ranges = [], []
+    for name, value in shape.filter.items():
+        if isinstance(value, dict) and not set(value) <= {"$eq", "$in"}:
+            ranges.append(name)
+        else:
+            equality.append(name)
+    keys = [(name, ASCENDING) for name in equality]
+    sort_fields = [name for name, _ in shape.sort]
+    keys += [(name, direction) for name, direction in shape.sort]
+    keys += [(name, ASCENDING) for name in ranges if name not in sort_fields]
+    return keys
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="index_advisor")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument(
+        "--no-seed", action="store_true", help="Reuse the existing scratch data"
+    )
+    parser.add_argument(
+        "--bare", action="store_true", help="Do not create the app's indexes first"
+    )
+    parser.add_argument(
+        "--apply", action="store_true", help="Create the proposed indexes"
+    )
+    args = parser.parse_args()
+    if args.database == config.DATABASE_NAME and not args.no_seed:
+        parser.error("refusing to seed over the app database; pass --no-seed")
+
+    client = MongoClient(args.uri)
+    db = client[args.database]
+    if not args.no_seed:
+        seed(db, args.rows)
+    if not args.bare:
+        create_app_indexes(db)
+
+    user_id = db["expenses"].find_one({}, {"user_id": 1})["user_id"]
+    budget = db["budgets"].find_one({"user_id": user_id})
+    proposals: dict[tuple[str, tuple], QueryShape] = {}
+
+    print(f"{'query':<40}{'plan':<44}{'ret':>7}{'docs':>9}{'ms':>6}  problems")
+    for shape in query_shapes(user_id, str(budget["_id"])):
+        cursor = db[shape.collection].find(shape.filter)
+        if shape.sort:
+            cursor = cursor.sort(shape.sort)
+        if shape.limit:
+            cursor = cursor.limit(shape.limit)
+        result = analyze(cursor.explain())
+        plan = ",".join(result["indexes"]) or "-"
+        print(
+            f"{shape.name:<40}{plan[:43]:<44}{result['returned']:>7}"
+            f"{result['docs_examined']:>9}{result['millis']:>6}  "
+            f"{'; '.join(result['problems']) or 'ok'}"
+        )
+        if result["problems"]:
+            keys = propose_index(shape)
+            proposals[(shape.collection, tuple(keys))] = shape
+
+    if not proposals:
+        print("\nEvery query shape is served by an index.")
+        return
+    print("\nProposed indexes:")
+    for (collection_name, keys), shape in proposals.items():
+        print(f"  {collection_name}: {list(keys)}  ({shape.name})")
+        if args.apply:
+            name = db[collection_name].create_index(list(keys))
+            print(f"    created {name}")
+
+
+if __name__ == "__main__":
+    main()
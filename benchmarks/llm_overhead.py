@@ -0,0 +1,88 @@
+"""Per-call client overhead of LLMService, before and after the shared registry.
+
+No network calls are made: only client construction and schema binding are
+timed, which is the work the registry removes from the request path.
+
+Usage:
+    python -m benchmarks.llm_overhead [--iterations 200]
+"""
+
+import argparse
+import os
+import time
+from typing import Callable
+
+# Dummy credentials so the clients can be constructed offline
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://benchmark.openai.azure.com")
+os.environ.setdefault("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "benchmark")
+
+from langchain_openai import AzureChatOpenAI  # noqa: E402
+from pydantic import SecretStr  # noqa: E402
+
+from app.config import config  # noqa: E402
+from app.models.agent import ExpenseExtraction, ExpenseValidation  # noqa: E402
+from app.services.llm_services import PROFILES, LLMRegistry, LLMService  # noqa: E402
+from app.utils.enums import LLMProfile  # noqa: E402
+
+
+def _per_client_model() -> AzureChatOpenAI:
+    # What every LLMService() used to build
+    profile = PROFILES[LLMProfile.STRONG]
+    return AzureChatOpenAI(
+        name=profile.deployment,
+        model=profile.deployment,
+        api_key=SecretStr(config.AZURE_OPENAI_API_KEY),
+        azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
+        api_version=config.AZURE_OPENAI_API_VERSION,
+        temperature=profile.temperature,
+        max_retries=2,
+        reasoning=profile.reasoning,
+    )
+
+
+def _timed(fn: Callable[[], object], iterations: int) -> float:
+    """Mean microseconds per call."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    shared_model = _per_client_model()
+    rows = [
+        ("LLMService construction", _per_client_model, LLMService),
+        (
+            "structured binding (ExpenseExtraction)",
+            lambda: shared_model.with_structured_output(
+                ExpenseExtraction, include_raw=True
+            ),
+            lambda: LLMRegistry.get_structured(ExpenseExtraction),
+        ),
+        (
+            "structured binding (ExpenseValidation)",
+            lambda: shared_model.with_structured_output(
+                ExpenseValidation, include_raw=True
+            ),
+            lambda: LLMRegistry.get_structured(ExpenseValidation),
+        ),
+    ]
+
+    print(f"{'operation':<42}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for name, before, after in rows:
+        before_us = _timed(before, args.iterations)
+        after_us = _timed(after, args.iterations)
+        print(
+            f"{name:<42}{before_us:>14.1f}{after_us:>14.2f}"
+            f"{before_us / max(after_us, 1e-9):>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
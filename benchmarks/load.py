@@ -0,0 +1,192 @@
+"""End-to-end load benchmark of the expense pipeline.
+
+Drives synthetic expense messages through Agent (parse, validate, store,
+derived-data updates) at fixed concurrency levels, with FakeLLMService in
+place of the model. Reports throughput and p50/p95/p99 latency per stage.
+
+The store stages need MONGO_URI/DATABASE_NAME (use a scratch database);
+with --no-db only parsing and validation are exercised.
+
+Usage:
+    python -m benchmarks.load [--requests 200] [--concurrency 1,8,32]
+        [--mode llm|hybrid] [--batcher] [--latency-ms 800] [--per-item-ms 40]
+        [--error-rate 0] [--no-db]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+# Dummy credentials so the real clients can be constructed offline
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://benchmark.openai.azure.com")
+os.environ.setdefault("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "benchmark")
+
+import numpy as np  # noqa: E402
+
+from app.agents.agent import Agent  # noqa: E402
+from app.database.db import Database  # noqa: E402
+from app.services.batcher import ExpenseParseBatcher  # noqa: E402
+from app.utils.enums import ParseMode  # noqa: E402
+from app.utils.log import logger  # noqa: E402
+from benchmarks.fake_llm import FakeLLMService  # noqa: E402
+from benchmarks.synthetic import SyntheticData  # noqa: E402
+
+STAGES = ["parse", "validate", "store", "derived", "total"]
+
+# Stage timings (ms) of the request running in the current task
+_timings: contextvars.ContextVar[dict[str, float] | None] = contextvars.ContextVar(
+    "timings", default=None
+)
+
+
+def _timed_method(
+    stage: str, method: Callable[..., Awaitable[Any]]
+) -> Callable[..., Awaitable[Any]]:
+    """Wrap an agent coroutine method so its duration lands in `_timings`."""
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            timings = _timings.get()
+            if timings is not None:
+                timings[stage] = (
+                    timings.get(stage, 0.0) + (time.perf_counter() - started) * 1000
+                )
+
+    return wrapper
+
+
+async def _one(
+    agent: Agent,
+    parse: Callable[[str], Awaitable[Any]],
+    text: str,
+    user_id: str,
+    store: bool,
+) -> tuple[dict[str, float], bool]:
+    timings: dict[str, float] = {}
+    _timings.set(timings)
+    started = time.perf_counter()
+    ok = False
+    try:
+        parsed = await parse(text)
+        timings["parse"] = (time.perf_counter() - started) * 1000
+        if store:
+            before_store = time.perf_counter()
+            response = await agent.process_expense(parsed, user_id=user_id)
+            process_ms = (time.perf_counter() - before_store) * 1000
+            timings["store"] = (
+                process_ms - timings.get("validate", 0.0) - timings.get("derived", 0.0)
+            )
+            ok = response.success
+        else:
+            ok = (await agent.validate_expense(parsed)).is_valid
+    except Exception:
+        ok = False
+    timings["total"] = (time.perf_counter() - started) * 1000
+    return timings, ok
+
+
+async def run_level(
+    agent: Agent,
+    parse: Callable[[str], Awaitable[Any]],
+    texts: list[str],
+    concurrency: int,
+    store: bool,
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index: int, text: str):
+        async with semaphore:
+            return await _one(agent, parse, text, f"load-{index % 100}", store)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(bounded(index, text) for index, text in enumerate(texts))
+    )
+    elapsed = time.perf_counter() - started
+
+    failures = sum(not ok for _, ok in results)
+    print(
+        f"\nconcurrency {concurrency}: {len(texts) / elapsed:.1f} req/s, "
+        f"{failures}/{len(texts)} failed, {elapsed:.2f}s"
+    )
+    print(f"  {'stage':<10}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage in STAGES:
+        values = [timings[stage] for timings, _ in results if stage in timings]
+        if not values:
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(f"  {stage:<10}{len(values):>6}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--mode", choices=[m.value for m in ParseMode], default="llm")
+    parser.add_argument(
+        "--batcher", action="store_true", help="Parse through ExpenseParseBatcher"
+    )
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument(
+        "--per-item-ms", type=float, default=40, help="Extra LLM latency per batch item"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-db", action="store_true")
+    args = parser.parse_args()
+    # Per-expense debug lines would dominate the run time
+    logger.setLevel(logging.INFO)
+
+    store = not args.no_db
+    if store:
+        if Database.get_database() is None:
+            parser.error("MONGO_URI and DATABASE_NAME are required (or --no-db)")
+        await Database.connect()
+
+    agent = Agent()
+    agent.llm_service = FakeLLMService(
+        latency_ms=args.latency_ms,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        per_item_ms=args.per_item_ms,
+        seed=args.seed,
+    )
+    agent.validate_expense = _timed_method("validate", agent.validate_expense)
+    agent.after_insert = _timed_method("derived", agent.after_insert)
+    mode = ParseMode(args.mode)
+    batcher = ExpenseParseBatcher(agent) if args.batcher else None
+
+    async def parse(text: str):
+        if batcher is not None:
+            return await batcher.parse(text, mode)
+        return await agent.parse_expense(text, mode)
+
+    texts = SyntheticData(args.seed).expense_texts(args.requests)
+    print(
+        f"{args.requests} requests, mode={mode.value}, batcher={args.batcher}, "
+        f"LLM {args.latency_ms:.0f}ms (jitter {args.jitter}, "
+        f"errors {args.error_rate:.0%}), store={store}"
+    )
+    try:
+        for level in (int(value) for value in args.concurrency.split(",")):
+            await run_level(agent, parse, texts, level, store)
+    finally:
+        if batcher is not None:
+            await batcher.close()
+        if store:
+            await Database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
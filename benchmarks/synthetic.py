@@ -0,0 +1,224 @@
+"""Deterministic synthetic users, expenses, budgets and expense messages.
+
+Documents are built through the app's models (`Expenses`, `Budgets`,
+`UserPreferences`), so they have exactly the shape the app stores. Merchant
+popularity follows a Zipf-like curve and amounts are log-normal per
+category, which is close enough to real spending for index and cache
+behaviour to be representative.
+
+Usage:
+    python -m benchmarks.synthetic --users 10 --expenses 1000 --out data/
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator
+
+from app.models.collections import Budgets, Expenses, UserPreferences
+from app.utils.enums import BudgetPeriod, Currencies
+from app.utils.nlp_parser import CATEGORY_KEYWORDS, KNOWN_MERCHANTS
+
+# Median amount (USD) of one expense per category
+CATEGORY_MEDIANS = {
+    "Food & Dining": 14,
+    "Transportation": 18,
+    "Shopping": 45,
+    "Entertainment": 25,
+    "Utilities": 80,
+    "Health & Wellness": 35,
+    "Professional Services": 250,
+    "Travel": 220,
+}
+
+# Rough units per USD, so amounts look plausible in each currency
+UNITS_PER_USD = {"USD": 1.0, "EUR": 0.92, "GBP": 0.79, "INR": 83.0, "JPY": 150.0}
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "INR": "₹", "JPY": "¥"}
+
+_PREFIXES = ["Blue", "Corner", "City", "Green", "Golden", "Main Street", "Sunset"]
+
+_TEMPLATES = [
+    "Spent {money} at {merchant} {when}",
+    "{merchant} {money} {when}",
+    "Paid {money} for {keyword} at {merchant} {when}",
+    "{keyword} at {merchant}, {money}, {when}",
+    "{when} {merchant} {code_amount}",
+]
+
+
+def _merchants() -> list[tuple[str, str, str]]:
+    """(display name, category, keyword) for known and long-tail merchants."""
+    merchants = []
+    seen = set()
+    for name, category in KNOWN_MERCHANTS.items():
+        key = name.replace("'", "")
+        if key in seen:
+            continue
+        seen.add(key)
+        merchants.append(
+            (string.capwords(name), category, CATEGORY_KEYWORDS[category][0])
+        )
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        for prefix in _PREFIXES:
+            for keyword in keywords[:2]:
+                merchants.append((f"{prefix} {keyword.title()}", category, keyword))
+    return merchants
+
+
+class SyntheticData:
+    """Generator of realistic documents; the same seed gives the same data."""
+
+    def __init__(
+        self,
+        seed: int = 42,
+        start: datetime = datetime(2023, 1, 1, tzinfo=timezone.utc),
+        days: int = 3 * 365,
+        currencies: list[str] | None = None,
+    ):
+        self.rng = random.Random(seed)
+        self.start = start
+        self.days = days
+        self.currencies = currencies or [currency.value for currency in Currencies]
+        self.merchants = _merchants()
+        # Zipf-like popularity: the i-th merchant is picked ~1/(i+1) as often
+        self._weights = [1 / (i + 1) for i in range(len(self.merchants))]
+        self.rng.shuffle(self.merchants)
+
+    def user_ids(self, count: int) -> list[str]:
+        return [f"user-{i:06d}" for i in range(count)]
+
+    def _date(self) -> datetime:
+        return self.start + timedelta(minutes=self.rng.randrange(self.days * 1440))
+
+    def expense(self, user_id: str, currency: str | None = None) -> dict[str, Any]:
+        merchant, category, keyword = self.rng.choices(
+            self.merchants, weights=self._weights
+        )[0]
+        currency = currency or self.rng.choice(self.currencies)
+        amount_usd = self.rng.lognormvariate(0, 0.8) * CATEGORY_MEDIANS[category]
+        amount = round(amount_usd * UNITS_PER_USD[currency], 2)
+        return Expenses(
+            user_id=user_id,
+            amount=amount,
+            currency=currency,
+            converted_amount_usd=round(amount_usd, 4),
+            description=keyword,
+            merchant=merchant,
+            category=category,
+            date=self._date(),
+        ).model_dump()
+
+    def expenses(self, user_ids: list[str], count: int) -> Iterator[dict[str, Any]]:
+        for _ in range(count):
+            yield self.expense(self.rng.choice(user_ids))
+
+    def budget(self, user_id: str, category: str | None = None) -> dict[str, Any]:
+        category = category or self.rng.choice(list(CATEGORY_MEDIANS))
+        period = self.rng.choice(list(BudgetPeriod))
+        per_month = CATEGORY_MEDIANS[category] * self.rng.randint(5, 30)
+        scale = {"weekly": 0.25, "monthly": 1, "yearly": 12}[period.value]
+        return Budgets(
+            user_id=user_id,
+            category=category,
+            amount=round(per_month * scale, -1),
+            currency="USD",
+            period=period,
+            start_date=self.start,
+            end_date=self.start + timedelta(days=self.days),
+        ).model_dump()
+
+    def preferences(self, user_id: str) -> dict[str, Any]:
+        return UserPreferences(
+            user_id=user_id,
+            default_currency=self.rng.choice(self.currencies),
+            categories_list=list(CATEGORY_MEDIANS),
+            timezone="UTC",
+        ).model_dump()
+
+    def expense_text(
+        self, expense: dict[str, Any] | None = None, today: datetime | None = None
+    ) -> str:
+        """A natural-language message describing an expense."""
+        expense = expense or self.expense("user-000000")
+        today = today or datetime.now(timezone.utc)
+        date = expense["date"]
+        if isinstance(date, str):
+            date = datetime.fromisoformat(date)
+        age = (today.date() - date.date()).days
+        if age == 0:
+            when = "today"
+        elif age == 1:
+            when = "yesterday"
+        else:
+            when = f"on {date.date().isoformat()}"
+        currency = expense["currency"]
+        amount = f"{expense['amount']:.2f}"
+        return self.rng.choice(_TEMPLATES).format(
+            money=f"{CURRENCY_SYMBOLS[currency]}{amount}",
+            code_amount=f"{amount} {currency}",
+            merchant=expense["merchant"],
+            keyword=expense.get("description") or "purchase",
+            when=when,
+        )
+
+    def expense_texts(self, count: int, recent_days: int = 7) -> list[str]:
+        """Messages about recent expenses, as users would type them."""
+        today = datetime.now(timezone.utc)
+        texts = []
+        for _ in range(count):
+            expense = self.expense("user-000000")
+            expense["date"] = today - timedelta(days=self.rng.randrange(recent_days))
+            texts.append(self.expense_text(expense, today))
+        return texts
+
+
+def _write_jsonl(path: str, documents: Iterator[dict[str, Any]]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as handle:
+        for document in documents:
+            handle.write(json.dumps(document, default=str) + "\n")
+            count += 1
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--expenses", type=int, default=1000)
+    parser.add_argument("--texts", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="synthetic")
+    args = parser.parse_args()
+
+    data = SyntheticData(args.seed)
+    users = data.user_ids(args.users)
+    os.makedirs(args.out, exist_ok=True)
+    counts = {
+        "expenses": _write_jsonl(
+            os.path.join(args.out, "expenses.jsonl"),
+            data.expenses(users, args.expenses),
+        ),
+        "budgets": _write_jsonl(
+            os.path.join(args.out, "budgets.jsonl"),
+            (
+                data.budget(user, category)
+                for user in users
+                for category in CATEGORY_MEDIANS
+            ),
+        ),
+        "preferences": _write_jsonl(
+            os.path.join(args.out, "preferences.jsonl"),
+            (data.preferences(user) for user in users),
+        ),
+    }
+    with open(os.path.join(args.out, "texts.txt"), "w", encoding="utf-8") as handle:
+        handle.writelines(text + "\n" for text in data.expense_texts(args.texts))
+    counts["texts"] = args.texts
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import asyncio
+import copy
+import os
+from collections import defaultdict
+from typing import Any, Mapping
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.invalid")
+os.environ.setdefault("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "test")
+
+from app.database import core_data  # noqa: E402
+from app.services import budgets, dedup  # noqa: E402
+from app.services.user_cache import user_cache  # noqa: E402
+
+# Unique indexes enforced by the fake, beyond _id (see app/database/indexes.py)
+UNIQUE_KEYS = {"expenses": ("user_id", "fingerprint")}
+
+
+def _matches(document: Mapping[str, Any], filter: Mapping[str, Any]) -> bool:
+    for field, condition in filter.items():
+        if field == "$or":
+            if not any(_matches(document, branch) for branch in condition):
+                return False
+            continue
+        value = document.get(field)
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            for operator, operand in condition.items():
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                if operator == "$type" and not isinstance(value, str):
+                    return False
+                if operator in ("$gt", "$gte", "$lt", "$lte") and value is None:
+                    return False
+                if operator == "$gt" and not value > operand:
+                    return False
+                if operator == "$gte" and not value >= operand:
+                    return False
+                if operator == "$lt" and not value < operand:
+                    return False
+                if operator == "$lte" and not value <= operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeMongo:
+    """In-memory stand-in for the core_data functions the services call."""
+
+    def __init__(self):
+        self.collections: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        # Seconds insert_many takes, to simulate a slow primary
+        self.insert_delay = 0.0
+
+    def find(self, collection_name: str, filter: Mapping[str, Any] = {}) -> list:
+        return [d for d in self.collections[collection_name] if _matches(d, filter)]
+
+    def _conflict(self, collection_name: str, document: Mapping[str, Any]):
+        for stored in self.collections[collection_name]:
+            if stored["_id"] == document["_id"]:
+                return {"_id": 1}
+            fields = UNIQUE_KEYS.get(collection_name)
+            if (
+                fields
+                and isinstance(document.get(fields[-1]), str)
+                and all(stored.get(f) == document.get(f) for f in fields)
+            ):
+                return {field: 1 for field in fields}
+        return None
+
+    async def insert_many(self, documents, collection_name, ordered=True):
+        # Like Motor, the write carries on when the caller stops waiting
+        await asyncio.shield(
+            asyncio.ensure_future(self._insert_many(documents, collection_name))
+        )
+
+    async def _insert_many(self, documents, collection_name):
+        await asyncio.sleep(self.insert_delay)
+        errors = []
+        for index, document in enumerate(documents):
+            document.setdefault("_id", ObjectId())
+            key_pattern = self._conflict(collection_name, document)
+            if key_pattern is None:
+                self.collections[collection_name].append(copy.deepcopy(document))
+            else:
+                errors.append(
+                    {
+                        "index": index,
+                        "code": 11000,
+                        "errmsg": f"E11000 duplicate key {key_pattern}",
+                        "keyPattern": key_pattern,
+                    }
+                )
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    async def insert_one(self, document, collection_name):
+        try:
+            await self.insert_many([document], collection_name)
+        except BulkWriteError as e:
+            (error,) = e.details["writeErrors"]
+            raise DuplicateKeyError(error["errmsg"], error["code"], error)
+
+    async def read_one(self, collection_name, data_filter, options=None):
+        found = self.find(collection_name, data_filter)
+        return copy.deepcopy(found[0]) if found else {}
+
+    async def iter_read(self, collection_name, data_filter, projection=None, **_):
+        for document in self.find(collection_name, data_filter):
+            yield copy.deepcopy(document)
+
+    async def query_read(self, collection_name, aggregate, hint=None):
+        # Only the single $match pipelines of the user cache
+        (stage,) = aggregate
+        return copy.deepcopy(self.find(collection_name, stage["$match"]))
+
+    def _update(self, collection_name, filter, update, upsert):
+        found = self.find(collection_name, filter)
+        if found:
+            document = found[0]
+        elif upsert:
+            document = {
+                "_id": ObjectId(),
+                **{k: v for k, v in filter.items() if not isinstance(v, dict)},
+                **update.get("$setOnInsert", {}),
+            }
+            self.collections[collection_name].append(document)
+        else:
+            return {}
+        for field, amount in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + amount
+        document.update(update.get("$set", {}))
+        return copy.deepcopy(document)
+
+    async def update_one(self, collection_name, filter, update, upsert=False):
+        self._update(collection_name, filter, update, upsert)
+
+    async def find_one_and_update(
+        self, collection_name, filter, update, upsert=False, projection=None
+    ):
+        return self._update(collection_name, filter, update, upsert)
+
+    async def bulk_write(self, collection_name, requests, ordered=False):
+        for request in requests:
+            self._update(
+                collection_name, request._filter, request._doc, request._upsert
+            )
+
+    async def delete(self, collection_name, filter):
+        self.collections[collection_name] = [
+            d for d in self.collections[collection_name] if not _matches(d, filter)
+        ]
+
+
+@pytest.fixture
+def mongo(monkeypatch) -> FakeMongo:
+    fake = FakeMongo()
+    for name in (
+        "insert_many",
+        "insert_one",
+        "read_one",
+        "iter_read",
+        "query_read",
+        "update_one",
+        "find_one_and_update",
+        "bulk_write",
+        "delete",
+    ):
+        monkeypatch.setattr(core_data, name, getattr(fake, name))
+    # Process-wide state that would otherwise leak between tests
+    user_cache._entries.clear()
+    dedup.deduplicator._users.clear()
+    budgets._seeded.clear()
+    return fake
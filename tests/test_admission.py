@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from app.services.admission import AdmissionController
+from app.utils.enums import RequestPriority
+
+
+def _controller(**limits) -> AdmissionController:
+    return AdmissionController(
+        **{
+            "max_rpm": 0,
+            "max_tpm": 0,
+            "min_concurrency": 1,
+            "max_concurrency": 8,
+            "initial_concurrency": 4,
+            "target_latency": 1.0,
+            **limits,
+        }
+    )
+
+
+def _rate_limit_error(retry_after: str) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://example.invalid")
+    response = httpx.Response(
+        429, headers={"retry-after": retry_after}, request=request
+    )
+    return openai.RateLimitError("throttled", response=response, body=None)
+
+
+def test_limit_grows_additively_up_to_the_maximum():
+    controller = _controller()
+    controller._on_success(0.1)
+    assert controller.limit == 4.25
+    for _ in range(100):
+        controller._on_success(0.1)
+    assert controller.limit == 8
+
+
+def test_slow_call_halves_the_limit_once_per_cooldown():
+    controller = _controller()
+    controller._on_success(2.0)
+    assert controller.limit == 2
+    # Calls already in flight report the same congestion
+    controller._on_success(2.0)
+    assert controller.limit == 2
+
+    controller._last_decrease -= 10
+    controller._on_success(2.0)
+    controller._last_decrease -= 10
+    controller._on_success(2.0)
+    assert controller.limit == 1
+
+
+def test_throttling_pauses_admission_and_backs_off():
+    controller = _controller()
+
+    async def call() -> None:
+        async with controller.slot():
+            raise _rate_limit_error("2")
+
+    started = time.monotonic()
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(call())
+    assert controller.limit == 2
+    assert controller.throttled == 1
+    assert controller._paused_until >= started + 2
+    assert controller.inflight == 0
+
+
+def test_interactive_calls_are_admitted_before_queued_bulk_calls():
+    controller = _controller(initial_concurrency=1)
+    admitted = []
+
+    async def call(name: str, priority: RequestPriority) -> None:
+        async with controller.slot(priority):
+            admitted.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run() -> None:
+        first = asyncio.create_task(call("first", RequestPriority.BULK))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(call("bulk", RequestPriority.BULK)),
+            asyncio.create_task(call("interactive", RequestPriority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert controller.queue_depth() == {
+            RequestPriority.INTERACTIVE: 1,
+            RequestPriority.BULK: 1,
+        }
+        await asyncio.gather(first, *waiting)
+
+    asyncio.run(run())
+    assert admitted == ["first", "interactive", "bulk"]
@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+
+from app.services.analytics import ExpenseFrame
+from app.utils.enums import RollupDimension
+
+
+def _expense(amount: float, merchant: str, day: int = 5) -> dict:
+    return {
+        "amount": amount,
+        "converted_amount_usd": amount,
+        "currency": "USD",
+        "category": "Food & Dining",
+        "merchant": merchant,
+        "date": datetime(2026, 10, day, tzinfo=timezone.utc),
+    }
+
+
+def test_merchant_filter_matches_every_spelling():
+    frame = ExpenseFrame.from_documents(
+        [
+            _expense(8.0, "McDonald's"),
+            _expense(6.0, "MCDONALDS "),
+            _expense(5.0, "Starbucks"),
+        ]
+    )
+    assert frame.filter_mask(merchant="McDonald's").tolist() == [True, True, False]
+    assert frame.filter_mask(merchant="mcdonalds").sum() == 2
+
+
+def test_unconverted_expenses_are_left_out_of_aggregates():
+    yen = {
+        **_expense(1500.0, "Lawson"),
+        "currency": "JPY",
+        "converted_amount_usd": None,
+    }
+    frame = ExpenseFrame.from_documents(
+        [
+            _expense(float(amount), "Starbucks", day)
+            for day, amount in enumerate((5, 6, 5, 6, 5), start=1)
+        ]
+        + [yen]
+    )
+
+    (group,) = frame.group_by(RollupDimension.CATEGORY)
+    assert group == {"key": "Food & Dining", "total": 27.0, "count": 5}
+    assert frame.unconverted() == 1
+    assert frame.percentiles([100]) == {100: 6.0}
+    assert frame.rolling_totals(window_days=30)[-1]["total"] == 27.0
+    assert frame.anomalies(threshold=1.5) == []
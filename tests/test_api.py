@@ -0,0 +1,16 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import expenses
+from app.database.db import Database
+
+
+def test_listing_without_a_database_is_unavailable(monkeypatch):
+    monkeypatch.setattr(Database, "get_database", lambda: None)
+    monkeypatch.setattr(Database, "_collections", {})
+    app = FastAPI()
+    app.include_router(expenses.router)
+
+    response = TestClient(app).get("/expenses", params={"user_id": "user-1"})
+
+    assert response.status_code == 503
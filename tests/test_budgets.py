@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.config import config
+from app.services import budgets
+
+
+def _expense(amount: float, day: int = 5) -> dict:
+    return {
+        "_id": ObjectId(),
+        "user_id": "user-1",
+        "amount": amount,
+        "currency": "USD",
+        "converted_amount_usd": amount,
+        "merchant": "Starbucks",
+        "category": "Food & Dining",
+        "date": datetime(2026, 10, day, tzinfo=timezone.utc),
+    }
+
+
+@pytest.fixture
+def budget(mongo) -> dict:
+    budget = {
+        "_id": ObjectId(),
+        "user_id": "user-1",
+        "category": "Food & Dining",
+        "currency": "USD",
+        "amount": 100.0,
+        "period": "monthly",
+        "start_date": datetime(2026, 1, 1, tzinfo=timezone.utc),
+        "end_date": datetime(2026, 12, 31, tzinfo=timezone.utc),
+    }
+    mongo.collections["budgets"].append(budget)
+    return budget
+
+
+def _record(mongo, *expenses: dict) -> None:
+    mongo.collections["expenses"].extend(expenses)
+    asyncio.run(budgets.record_expenses(expenses))
+
+
+def _alerts(mongo) -> list[float]:
+    return [alert["threshold"] for alert in mongo.find(config.BUDGET_ALERTS_COLLECTION)]
+
+
+def test_each_threshold_fires_once_when_crossed(mongo, budget):
+    _record(mongo, _expense(70.0))
+    assert _alerts(mongo) == []
+    _record(mongo, _expense(15.0))
+    assert _alerts(mongo) == [0.8]
+    _record(mongo, _expense(10.0))
+    assert _alerts(mongo) == [0.8]
+    _record(mongo, _expense(10.0))
+    assert _alerts(mongo) == [0.8, 1.0]
+    (usage,) = mongo.find(config.BUDGET_USAGE_COLLECTION)
+    assert usage["spent"] == 105.0
+
+
+def test_one_batch_crossing_both_thresholds(mongo, budget):
+    _record(mongo, _expense(50.0), _expense(60.0))
+    assert sorted(_alerts(mongo)) == [0.8, 1.0]
+
+
+def test_new_budget_starts_from_the_period_spend_so_far(mongo, budget):
+    # Spent before the usage document existed, e.g. the budget was added today
+    mongo.collections["expenses"].append(_expense(75.0, day=2))
+    _record(mongo, _expense(10.0))
+    assert _alerts(mongo) == [0.8]
+    (usage,) = mongo.find(config.BUDGET_USAGE_COLLECTION)
+    assert usage["spent"] == 85.0
+
+
+def test_expenses_of_another_period_count_separately(mongo, budget):
+    _record(mongo, _expense(90.0))
+    september = {**_expense(20.0), "date": datetime(2026, 9, 30, tzinfo=timezone.utc)}
+    _record(mongo, september)
+    assert _alerts(mongo) == [0.8]
+    assert sorted(u["spent"] for u in mongo.find(config.BUDGET_USAGE_COLLECTION)) == [
+        20.0,
+        90.0,
+    ]
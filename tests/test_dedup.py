@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from app.agents.agent import Agent
+from app.database.db import Database
+from app.models.agent import ExpenseExtraction
+from app.services import dedup
+from app.services.dedup import BloomFilter, deduplicator
+from app.services.ingestion import BulkIngestor
+from app.services.write_behind import WriteBehindBuffer
+
+
+def _expense(amount: float = 2.75, merchant: str = "MTA") -> dict:
+    return {
+        "_id": ObjectId(),
+        "user_id": "user-1",
+        "amount": amount,
+        "currency": "USD",
+        "converted_amount_usd": amount,
+        "merchant": merchant,
+        "category": "Transportation",
+        "date": datetime(2026, 10, 5, tzinfo=timezone.utc),
+    }
+
+
+def _row(amount: str = "-2.75", **columns: str) -> dict:
+    return {
+        "Date": "2026-10-05",
+        "Description": "MTA",
+        "Amount": amount,
+        "Category": "Transportation",
+        **columns,
+    }
+
+
+def _ingest(rows: list[dict]):
+    return asyncio.run(BulkIngestor(Agent(), "user-1", batch_size=2).ingest(rows))
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    values = [hashlib.sha1(str(i).encode()).hexdigest() for i in range(1000)]
+    for value in values:
+        bloom.add(value)
+    assert all(value in bloom for value in values)
+
+
+def test_identical_rows_of_one_import_are_all_stored(mongo):
+    rows = [_row(), _row(), _row("-4.50")]
+    report = _ingest(rows)
+    assert report.inserted == 3
+    assert len({d["fingerprint"] for d in mongo.find("expenses")}) == 3
+
+    # Re-running the import, or an overlapping one, stores nothing new
+    report = _ingest(rows + [_row()])
+    assert report.duplicates == 3
+    assert report.inserted == 1
+    assert len(mongo.find("expenses")) == 4
+
+
+def test_rows_with_transaction_ids_are_matched_by_id(mongo):
+    rows = [_row(**{"Transaction ID": "T1"}), _row(**{"Transaction ID": "T2"})]
+    assert _ingest(rows).inserted == 2
+
+    report = _ingest([_row(**{"Transaction ID": "T2"}), _row()])
+    assert report.duplicates == 1
+    assert report.inserted == 1
+
+
+def test_resubmission_within_the_window_is_a_duplicate(mongo, monkeypatch):
+    first = _expense()
+    assert asyncio.run(deduplicator.claim([first])) == [None]
+    asyncio.run(mongo.insert_one(first, "expenses"))
+    deduplicator.record([first])
+
+    assert asyncio.run(deduplicator.claim([_expense()])) == [str(first["_id"])]
+
+    # The same fare later that day is another expense
+    now = dedup.time.time()
+    monkeypatch.setattr(dedup.time, "time", lambda: now + deduplicator.window + 1)
+    second = _expense()
+    assert asyncio.run(deduplicator.claim([second])) == [None]
+    assert second["fingerprint"] == dedup.fingerprint(second, 1)
+
+
+def test_expenses_of_one_claim_are_distinct(mongo):
+    fares = [_expense(), _expense()]
+    assert asyncio.run(deduplicator.claim(fares)) == [None, None]
+    assert fares[0]["fingerprint"] != fares[1]["fingerprint"]
+
+
+def test_identical_items_of_one_message_are_all_stored(mongo, monkeypatch):
+    monkeypatch.setattr(Database, "get_database", lambda: object())
+    coffee = ExpenseExtraction(
+        amount=4.0, merchant="Starbucks", category="Food & Dining", date="2026-10-05"
+    )
+
+    responses = asyncio.run(
+        Agent().process_expenses([coffee, coffee], llm_fallback=False, user_id="user-1")
+    )
+
+    assert [r.success and not r.duplicate for r in responses] == [True, True]
+    assert len(mongo.find("expenses")) == 2
+
+
+def test_fingerprint_taken_by_another_process_is_renumbered(mongo):
+    announced = []
+
+    async def on_inserted(documents):
+        announced.extend(document["_id"] for document in documents)
+
+    async def run() -> ObjectId:
+        buffer = WriteBehindBuffer(on_inserted=on_inserted)
+        document = _expense()
+        (duplicate_id,) = await deduplicator.claim([document])
+        assert duplicate_id is None
+        # Another process stores the same fare meanwhile
+        await mongo.insert_one(
+            {**_expense(), "fingerprint": document["fingerprint"]}, "expenses"
+        )
+        expense_id = buffer.submit(document)
+        await buffer.close()
+        return expense_id
+
+    expense_id = asyncio.run(run())
+
+    # The _id the submitter was given is stored, as the next repeat
+    (stored,) = mongo.find("expenses", {"_id": ObjectId(expense_id)})
+    assert stored["fingerprint"] == dedup.fingerprint(stored, 1)
+    assert announced == [ObjectId(expense_id)]
+
+
+def _fare_stored_elsewhere(mongo) -> ExpenseExtraction:
+    """A fare another process stored after this one loaded its filter."""
+    fare = ExpenseExtraction(
+        amount=2.75, merchant="MTA", category="Transportation", date="2026-10-05"
+    )
+    asyncio.run(deduplicator.claim([_expense(amount=9.0)]))
+    document = {**Agent().build_expense(fare, "user-1").model_dump(), "_id": ObjectId()}
+    dedup.apply_fingerprints([document])
+    mongo.collections["expenses"].append(document)
+    return fare
+
+
+def test_synchronous_insert_renumbers_a_taken_fingerprint(mongo, monkeypatch):
+    monkeypatch.setattr(Database, "get_database", lambda: object())
+    fare = _fare_stored_elsewhere(mongo)
+
+    response = asyncio.run(
+        Agent().process_expense(fare, llm_fallback=False, user_id="user-1")
+    )
+
+    assert response.success and not response.duplicate
+    (stored,) = mongo.find("expenses", {"_id": ObjectId(response.expense_id)})
+    assert stored["fingerprint"] == dedup.fingerprint(stored, 1)
+
+
+def test_batch_insert_renumbers_a_taken_fingerprint(mongo, monkeypatch):
+    monkeypatch.setattr(Database, "get_database", lambda: object())
+    fare = _fare_stored_elsewhere(mongo)
+
+    responses = asyncio.run(
+        Agent().process_expenses([fare, fare], llm_fallback=False, user_id="user-1")
+    )
+
+    assert [r.success and not r.duplicate for r in responses] == [True, True]
+    assert len({d["fingerprint"] for d in mongo.find("expenses")}) == 3
@@ -0,0 +1,81 @@
+from datetime import date
+
+import pytest
+
+from app.services.expense_validator import ExpenseValidator
+
+TODAY = date(2026, 10, 18)
+
+
+def _expense(**fields) -> dict:
+    return {
+        "amount": 12.0,
+        "currency": "USD",
+        "merchant": "Starbucks",
+        "category": "Food & Dining",
+        "date": "2026-10-17",
+        **fields,
+    }
+
+
+@pytest.fixture
+def validator() -> ExpenseValidator:
+    return ExpenseValidator()
+
+
+def test_valid_expense(validator):
+    result = validator.validate(_expense(), TODAY)
+    assert result.is_valid
+    assert result.errors == []
+    assert result.warnings == []
+
+
+@pytest.mark.parametrize(
+    "amount, error",
+    [
+        (0, "must be greater than zero"),
+        (-5.0, "must be greater than zero"),
+        ("12", "is not a number"),
+        (True, "is not a number"),
+    ],
+)
+def test_invalid_amounts(validator, amount, error):
+    result = validator.validate(_expense(amount=amount), TODAY)
+    assert not result.is_valid
+    assert error in result.errors[0]
+
+
+def test_high_amount_is_only_a_warning(validator):
+    result = validator.validate(_expense(amount=25_000.0), TODAY)
+    assert result.is_valid
+    assert "suspiciously high" in result.warnings[0]
+
+
+@pytest.mark.parametrize("currency", ["", "XYZ", "usd"])
+def test_invalid_currencies(validator, currency):
+    assert not validator.validate(_expense(currency=currency), TODAY).is_valid
+
+
+def test_any_iso_4217_currency_is_valid(validator):
+    assert validator.validate(_expense(currency="CHF"), TODAY).is_valid
+
+
+def test_category_mismatch_is_a_warning(validator):
+    result = validator.validate(_expense(category="Travel"), TODAY)
+    assert result.is_valid
+    assert "does not fit" in result.warnings[0]
+
+
+@pytest.mark.parametrize(
+    "day, valid",
+    [
+        ("2026-10-18", True),
+        # One day of slack for users ahead of UTC
+        ("2026-10-19", True),
+        ("2026-10-20", False),
+        ("2026-13-01", False),
+        ("", False),
+    ],
+)
+def test_dates(validator, day, valid):
+    assert validator.validate(_expense(date=day), TODAY).is_valid is valid
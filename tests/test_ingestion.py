@@ -0,0 +1,64 @@
+import asyncio
+
+from app.agents.agent import Agent
+from app.services.ingestion import BulkIngestor, ingest_csv
+from app.utils.enums import AmountSign, RequestPriority
+
+
+def test_free_text_is_parsed_in_the_bulk_lane(mongo, monkeypatch):
+    priorities = []
+
+    async def parse(self, user_prompt, mode=None, priority=None):
+        priorities.append(priority)
+        return {
+            "amount": 12.0,
+            "merchant": "Starbucks",
+            "category": "Food & Dining",
+            "date": "2026-10-05",
+        }
+
+    monkeypatch.setattr("app.services.batcher.ExpenseParseBatcher.parse", parse)
+    ingestor = BulkIngestor(Agent(), "user-1")
+    report = asyncio.run(ingestor.ingest(["coffee at Starbucks $12"]))
+
+    assert report.inserted == 1
+    assert priorities == [RequestPriority.BULK]
+
+
+def _row(amount: str) -> dict:
+    return {"Date": "2026-10-05", "Description": "Starbucks", "Amount": amount}
+
+
+def test_positive_only_export_is_read_as_spend(mongo):
+    report = asyncio.run(BulkIngestor(Agent(), "user-1").ingest([_row("12.00")] * 2))
+    assert report.inserted == 2
+    assert report.credits == 0
+
+
+def test_export_with_negative_amounts_reads_positives_as_credits(mongo):
+    report = asyncio.run(
+        BulkIngestor(Agent(), "user-1").ingest([_row("-12.00"), _row("500.00")])
+    )
+    assert report.inserted == 1
+    assert report.credits == 1
+    (expense,) = mongo.find("expenses")
+    assert expense["amount"] == 12.0
+
+
+def test_csv_export_sign_is_inferred(mongo, tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_text("Date,Description,Amount\n2026-10-05,Starbucks,4.50\n")
+    report = asyncio.run(ingest_csv(BulkIngestor(Agent(), "user-1"), str(path)))
+    assert report.inserted == 1
+
+
+def test_import_of_only_credits_is_reported(mongo):
+    rows = iter([_row("12.00"), _row("8.00")])
+    report = asyncio.run(
+        BulkIngestor(Agent(), "user-1", amount_sign=AmountSign.DEBITS_NEGATIVE).ingest(
+            rows
+        )
+    )
+    assert report.inserted == 0
+    assert report.credits == 2
+    assert "amount sign" in report.errors[-1]
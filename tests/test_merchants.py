@@ -0,0 +1,44 @@
+import pytest
+
+from app.services.merchants import MerchantIndex
+
+
+@pytest.fixture
+def index() -> MerchantIndex:
+    index = MerchantIndex()
+    index.seed()
+    return index
+
+
+@pytest.mark.parametrize(
+    "merchant",
+    [
+        "Hotel Chocolat",
+        "Water Street Grill",
+        "Coffee Table Books",
+        "Parking Lot Pizza",
+    ],
+)
+def test_category_keywords_are_not_prefixes(index, merchant):
+    assert index.lookup(merchant) is None
+
+
+def test_category_keywords_match_whole_names(index):
+    match = index.lookup("Parking")
+    assert match.category == "Transportation"
+    assert match.method == "exact"
+
+
+def test_longest_known_merchant_wins(index):
+    assert index.category("Uber Eats #12") == "Food & Dining"
+    assert index.category("Uber") == "Transportation"
+
+
+def test_known_merchants_match_by_prefix_and_fuzzily(index):
+    assert index.lookup("Starbucks Reserve Roastery").method == "prefix"
+    assert index.lookup("walmrt").method == "fuzzy"
+
+
+def test_learned_names_match_by_prefix(index):
+    index.learn({"merchant": "Joe's Pizza", "category": "Food & Dining"})
+    assert index.lookup("Joes Pizza Downtown").name == "joes pizza"
@@ -0,0 +1,139 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.config import config
+from app.utils.enums import Currencies
+from app.utils.nlp_parser import (
+    count_amounts,
+    extract_amount,
+    extract_currency,
+    extract_expense,
+    extract_merchant,
+    parse_date,
+)
+
+# A Sunday
+TODAY = date(2026, 10, 18)
+
+
+@pytest.mark.parametrize(
+    "text, amount",
+    [
+        ("spent $50 on groceries", 50.0),
+        ("bought coffee for 4.50", 4.5),
+        ("paid fifty dollars", 50.0),
+        ("1,250.99 for rent", 1250.99),
+        ("3 days ago spent €12 at Lidl", 12.0),
+        ("no amount here", None),
+    ],
+)
+def test_extract_amount(text, amount):
+    assert extract_amount(text) == amount
+
+
+def test_count_amounts_ignores_quantities_next_to_prices():
+    assert count_amounts("lunch $12, uber $8 and coffee $4") == 3
+    assert count_amounts("2 coffees for $9") == 1
+
+
+@pytest.mark.parametrize(
+    "text, currency",
+    [
+        ("$50", "USD"),
+        ("€45", "EUR"),
+        ("50 rupees", "INR"),
+        ("100 yen", "JPY"),
+        ("20 quid at the pub", "GBP"),
+        ("12 for lunch", None),
+    ],
+)
+def test_extract_currency(text, currency):
+    assert extract_currency(text) == currency
+
+
+@pytest.mark.parametrize(
+    "text, merchant",
+    [
+        ("spent $50 at Starbucks", "Starbucks"),
+        ("bought from Amazon for $100", "Amazon"),
+        ("dinner at McDonald's", "McDonald's"),
+        ("$12 at Blue Bottle Coffee yesterday", "Blue Bottle Coffee"),
+        ("$12 at Starbucks next monday", "Starbucks"),
+        ("netflix subscription $15", "netflix"),
+        ("$12 for lunch", None),
+    ],
+)
+def test_extract_merchant(text, merchant):
+    assert extract_merchant(text) == merchant
+
+
+@pytest.mark.parametrize(
+    "text, day",
+    [
+        ("yesterday", date(2026, 10, 17)),
+        ("day before yesterday", date(2026, 10, 16)),
+        ("last week", date(2026, 10, 11)),
+        ("3 days ago", date(2026, 10, 15)),
+        ("two weeks ago", date(2026, 10, 4)),
+        ("2024-12-25", date(2024, 12, 25)),
+        ("on March 3rd", date(2026, 3, 3)),
+        ("the 3rd of December", date(2025, 12, 3)),
+        ("on friday", date(2026, 10, 16)),
+        ("last sunday", date(2026, 10, 11)),
+        ("2024-13-45", None),
+        ("next monday", None),
+        ("no date", None),
+    ],
+)
+def test_parse_date(text, day):
+    parsed = parse_date(text, TODAY)
+    expected = (
+        datetime(day.year, day.month, day.day, tzinfo=timezone.utc) if day else None
+    )
+    assert parsed == expected
+
+
+def test_confident_expense():
+    extraction, confidence = extract_expense(
+        "spent $4.50 at Starbucks yesterday", TODAY
+    )
+    assert confidence >= config.LOCAL_PARSE_CONFIDENCE_THRESHOLD
+    assert extraction.amount == 4.5
+    assert extraction.currency == Currencies.USD
+    assert extraction.merchant == "Starbucks"
+    assert extraction.category == "Food & Dining"
+    assert extraction.date == "2026-10-17"
+
+
+def test_missing_date_defaults_to_today():
+    extraction, confidence = extract_expense("$12 at Starbucks", TODAY)
+    assert confidence >= config.LOCAL_PARSE_CONFIDENCE_THRESHOLD
+    assert extraction.date == "2026-10-18"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "$12 at Starbucks on 12/03",
+        "$20 at Target on the 5th",
+        "$12 at Starbucks on 3rd of last month",
+        "$5 at Starbucks on 2024-13-45",
+        "$12 at Starbucks next monday",
+    ],
+)
+def test_unreadable_dates_are_left_to_the_llm(text):
+    assert extract_expense(text, TODAY) == (None, 0.0)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "bought 2 at the shop",
+        "lunch $12, uber $8",
+        "went to the cinema",
+    ],
+)
+def test_uncertain_expenses_are_below_the_threshold(text):
+    _, confidence = extract_expense(text, TODAY)
+    assert confidence < config.LOCAL_PARSE_CONFIDENCE_THRESHOLD
@@ -0,0 +1,118 @@
+from datetime import date
+
+import pytest
+
+from app.agents.query_agent import fill_template, make_template, question_shape
+from app.config import config
+from app.models.query import SpendingQuery
+from app.services.query_compiler import compile_query, resolve_period
+from app.utils.enums import RelativePeriod
+
+# A Sunday
+TODAY = date(2026, 10, 18)
+
+
+@pytest.mark.parametrize(
+    "period, start, end",
+    [
+        (RelativePeriod.TODAY, date(2026, 10, 18), date(2026, 10, 19)),
+        (RelativePeriod.YESTERDAY, date(2026, 10, 17), date(2026, 10, 18)),
+        (RelativePeriod.THIS_WEEK, date(2026, 10, 12), date(2026, 10, 19)),
+        (RelativePeriod.LAST_WEEK, date(2026, 10, 5), date(2026, 10, 12)),
+        (RelativePeriod.THIS_MONTH, date(2026, 10, 1), date(2026, 10, 19)),
+        (RelativePeriod.LAST_MONTH, date(2026, 9, 1), date(2026, 10, 1)),
+        (RelativePeriod.LAST_YEAR, date(2025, 1, 1), date(2026, 1, 1)),
+        (RelativePeriod.LAST_7_DAYS, date(2026, 10, 12), date(2026, 10, 19)),
+    ],
+)
+def test_resolve_period(period, start, end):
+    assert resolve_period(period, TODAY) == (start, end)
+
+
+def test_last_month_in_january_is_december():
+    assert resolve_period(RelativePeriod.LAST_MONTH, date(2026, 1, 15)) == (
+        date(2025, 12, 1),
+        date(2026, 1, 1),
+    )
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"intent": "total", "period": "last_month"},
+        {"intent": "total", "period": "this_month", "categories": ["Travel"]},
+        {"intent": "breakdown", "period": "this_year", "group_by": "merchant"},
+        {"intent": "breakdown", "period": "last_week", "group_by": "day"},
+    ],
+)
+def test_whole_periods_are_answered_from_rollups(query):
+    plan = compile_query(SpendingQuery.model_validate(query), "user-1", TODAY)
+    assert plan.collection == config.ROLLUPS_COLLECTION
+    assert plan.hint is None
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"intent": "list", "period": "last_month"},
+        {"intent": "total", "period": "last_month", "min_amount": 50},
+        {
+            "intent": "total",
+            "period": "last_month",
+            "categories": ["Travel"],
+            "merchants": ["Airbnb"],
+        },
+        # Rollups are keyed by merchant or by category, not both
+        {
+            "intent": "breakdown",
+            "period": "last_month",
+            "group_by": "category",
+            "merchants": ["Airbnb"],
+        },
+    ],
+)
+def test_other_queries_run_on_expenses_with_the_index_hint(query):
+    plan = compile_query(SpendingQuery.model_validate(query), "user-1", TODAY)
+    assert plan.collection == "expenses"
+    assert plan.hint is not None
+    assert plan.pipeline[0]["$match"]["user_id"] == "user-1"
+
+
+def test_template_round_trip():
+    shape, slots = question_shape("How much did I spend over 50 on coffee last month?")
+    assert shape == "how much did i spend over <number> on <category> last month"
+    query = SpendingQuery(
+        intent="total",
+        period="last_month",
+        min_amount=50,
+        categories=["Food & Dining"],
+    )
+    template = make_template(query, slots)
+
+    assert fill_template(template, slots) == query
+    _, other_slots = question_shape("how much did i spend over 20 on taxis last month")
+    assert fill_template(template, other_slots) == query.model_copy(
+        update={"min_amount": 20.0, "categories": ["Transportation"]}
+    )
+
+
+def test_queries_that_cannot_be_templated():
+    _, slots = question_shape("spent over 50 on coffee last month")
+    unused_slot = SpendingQuery(intent="total", period="last_month", min_amount=50)
+    absolute = SpendingQuery(
+        intent="total",
+        start_date=date(2026, 9, 1),
+        min_amount=50,
+        categories=["Food & Dining"],
+    )
+    assert make_template(unused_slot, slots) is None
+    assert make_template(absolute, slots) is None
+
+
+def test_any_whole_days_fit_the_daily_rollups():
+    query = SpendingQuery(
+        intent="total", start_date=date(2026, 9, 3), end_date=date(2026, 9, 16)
+    )
+    plan = compile_query(query, "user-1", TODAY)
+    assert plan.collection == config.ROLLUPS_COLLECTION
+    assert plan.pipeline[0]["$match"]["granularity"] == "day"
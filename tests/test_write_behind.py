@@ -0,0 +1,114 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from app.agents.agent import Agent
+from app.config import config
+from app.services.write_behind import WriteBehindBuffer
+
+
+def _expense(amount: float) -> dict:
+    return {
+        "user_id": "user-1",
+        "amount": amount,
+        "currency": "USD",
+        "converted_amount_usd": amount,
+        "merchant": "Starbucks",
+        "category": "Food & Dining",
+        "date": datetime(2026, 10, 5, tzinfo=timezone.utc),
+    }
+
+
+def _budget() -> dict:
+    return {
+        "_id": ObjectId(),
+        "user_id": "user-1",
+        "category": "Food & Dining",
+        "currency": "USD",
+        "amount": 100.0,
+        "period": "monthly",
+        "start_date": datetime(2026, 1, 1, tzinfo=timezone.utc),
+        "end_date": datetime(2026, 12, 31, tzinfo=timezone.utc),
+    }
+
+
+def _monthly_category_rollup(mongo) -> dict:
+    (rollup,) = mongo.find(
+        config.ROLLUPS_COLLECTION,
+        {"dimension": "category", "granularity": "month", "key": "Food & Dining"},
+    )
+    return rollup
+
+
+def test_timed_out_batch_is_announced_once_after_replay(mongo, tmp_path):
+    mongo.collections["budgets"].append(_budget())
+    spill_path = str(tmp_path / "spill.jsonl")
+    buffer = WriteBehindBuffer(
+        on_inserted=Agent().after_insert,
+        flush_timeout=0.05,
+        spill_path=spill_path,
+    )
+
+    async def run() -> None:
+        # Mongo stores the batch, but only after the flush gave up on it
+        mongo.insert_delay = 0.2
+        buffer.submit(_expense(12.0))
+        buffer.submit(_expense(8.0))
+        await buffer.close()
+        assert os.path.exists(spill_path)
+        while len(mongo.find("expenses")) < 2:
+            await asyncio.sleep(0.01)
+
+        mongo.insert_delay = 0.0
+        assert await buffer.replay_spill() == 2
+
+    asyncio.run(run())
+
+    assert len(mongo.find("expenses")) == 2
+    assert not os.path.exists(spill_path)
+    rollup = _monthly_category_rollup(mongo)
+    assert rollup["total"] == 20.0
+    assert rollup["count"] == 2
+    (usage,) = mongo.find(config.BUDGET_USAGE_COLLECTION)
+    assert usage["spent"] == 20.0
+
+
+def test_interrupted_replay_does_not_announce_twice(mongo, tmp_path, monkeypatch):
+    mongo.collections["budgets"].append(_budget())
+    spill_path = str(tmp_path / "spill.jsonl")
+    buffer = WriteBehindBuffer(on_inserted=Agent().after_insert, spill_path=spill_path)
+    insert_many = mongo.insert_many
+
+    async def unreachable(*args, **kwargs):
+        raise ConnectionError("primary unreachable")
+
+    async def spill(amount: float) -> None:
+        monkeypatch.setattr("app.database.core_data.insert_many", unreachable)
+        buffer.submit(_expense(amount))
+        await buffer.close()
+        monkeypatch.setattr("app.database.core_data.insert_many", insert_many)
+
+    async def run() -> None:
+        await spill(12.0)
+        with open(spill_path, encoding="utf-8") as handle:
+            spilled = handle.read()
+        assert await buffer.replay_spill() == 1
+
+        # The process died after that replay stored its batch but before it
+        # removed its file; meanwhile another batch was spilled
+        with open(f"{spill_path}.replay", "w", encoding="utf-8") as handle:
+            handle.write(spilled)
+        await spill(8.0)
+        assert await buffer.replay_spill() == 1
+        assert await buffer.replay_spill() == 1
+
+    asyncio.run(run())
+
+    assert len(mongo.find("expenses")) == 2
+    rollup = _monthly_category_rollup(mongo)
+    assert rollup["total"] == 20.0
+    assert rollup["count"] == 2
+    (usage,) = mongo.find(config.BUDGET_USAGE_COLLECTION)
+    assert usage["spent"] == 20.0